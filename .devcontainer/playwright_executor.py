@@ -1,112 +1,268 @@
 import asyncio
 from playwright.async_api import async_playwright
 import argparse
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os
 import json
 from pathlib import Path
+import statistics
 import tempfile
 import base64
+import time
+import uuid
 
-async def execute_playwright_script(url: str, script: str, output_dir: str = ".screenshots", capture_logs: bool = False):
+# Collects Largest Contentful Paint, Cumulative Layout Shift and Interaction to Next Paint
+# into window.__webVitals; installed on every document before any page script runs
+WEB_VITALS_INIT_SCRIPT = """
+(() => {
+  const vitals = window.__webVitals = {lcp: null, cls: 0, inp: null};
+  const observe = (type, callback, options = {}) => {
+    try {
+      new PerformanceObserver(list => list.getEntries().forEach(callback))
+        .observe({type, buffered: true, ...options});
+    } catch (e) {}
+  };
+  observe('largest-contentful-paint', entry => { vitals.lcp = entry.startTime; });
+  observe('layout-shift', entry => { if (!entry.hadRecentInput) vitals.cls += entry.value; });
+  observe('event', entry => {
+    if (entry.interactionId) vitals.inp = Math.max(vitals.inp || 0, entry.duration);
+  }, {durationThreshold: 16});
+})();
+"""
+
+# Navigation timing of the current document, its Web Vitals, and the API calls made since `since`
+COLLECT_TIMINGS_SCRIPT = """
+(since) => {
+  const nav = performance.getEntriesByType('navigation')[0];
+  const paint = Object.fromEntries(performance.getEntriesByType('paint').map(e => [e.name, e.startTime]));
+  const vitals = window.__webVitals || {};
+  const round = value => value == null ? null : Math.round(value * 10) / 10;
+  return {
+    url: location.href,
+    navigation: nav ? {
+      ttfb_ms: round(nav.responseStart - nav.startTime),
+      response_end_ms: round(nav.responseEnd - nav.startTime),
+      dom_content_loaded_ms: round(nav.domContentLoadedEventEnd - nav.startTime),
+      load_ms: round(nav.loadEventEnd - nav.startTime),
+      transfer_bytes: nav.transferSize,
+    } : null,
+    fcp_ms: round(paint['first-contentful-paint']),
+    lcp_ms: round(vitals.lcp),
+    cls: vitals.cls == null ? null : Math.round(vitals.cls * 1000) / 1000,
+    inp_ms: round(vitals.inp),
+    api_calls: performance.getEntriesByType('resource')
+      .filter(e => e.startTime >= since && e.name.includes('/api/'))
+      .map(e => ({url: e.name, start_ms: round(e.startTime), duration_ms: round(e.duration), transfer_bytes: e.transferSize})),
+  };
+}
+"""
+
+
+class BrowserPool:
+    """
+    Keeps warm Chromium instances for many script runs. Each run gets its own browser
+    context (cookies, storage and cache are never shared), spread across the browsers
+    so that no browser hosts more than `contexts_per_browser` runs at once.
+    """
+
+    def __init__(self, browsers: int = 2, contexts_per_browser: int = 4, headless: bool = True):
+        self.size = browsers
+        self.contexts_per_browser = contexts_per_browser
+        self.headless = headless
+        self._playwright = None
+        self._browsers = []
+        self._slots = None
+
+    async def __aenter__(self):
+        self._playwright = await async_playwright().start()
+        self._browsers = [await self._launch() for _ in range(self.size)]
+        self._slots = asyncio.Queue()
+        for _ in range(self.contexts_per_browser):
+            for index in range(self.size):
+                self._slots.put_nowait(index)
+        return self
+
+    async def __aexit__(self, *exc):
+        for browser in self._browsers:
+            if browser.is_connected():
+                await browser.close()
+        await self._playwright.stop()
+
+    async def _launch(self):
+        return await self._playwright.chromium.launch(headless=self.headless)
+
+    @asynccontextmanager
+    async def context(self, **context_options):
+        index = await self._slots.get()
+        try:
+            if not self._browsers[index].is_connected():
+                # A crashed browser is replaced instead of failing every later run
+                self._browsers[index] = await self._launch()
+            context = await self._browsers[index].new_context(**context_options)
+            await context.add_init_script(WEB_VITALS_INIT_SCRIPT)
+            try:
+                yield context
+            finally:
+                await context.close()
+        finally:
+            self._slots.put_nowait(index)
+
+
+class StepRecorder:
+    """Times named steps of a script: wall time plus the page's navigation, Web Vitals and API timings."""
+
+    def __init__(self, page):
+        self.page = page
+        self.steps = []
+
+    async def _mark(self):
+        try:
+            return await self.page.evaluate("() => [performance.timeOrigin, performance.now()]")
+        except Exception:
+            return [None, 0]
+
+    @asynccontextmanager
+    async def step(self, name: str):
+        origin, since = await self._mark()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            entry = {"name": name, "wall_ms": round((time.perf_counter() - start) * 1000, 1), "error": error}
+            try:
+                current_origin, _ = await self._mark()
+                # After a full navigation the timeline restarts, so everything in it belongs to this step
+                timings = await self.page.evaluate(COLLECT_TIMINGS_SCRIPT, since if current_origin == origin else 0)
+                entry.update(timings)
+            except Exception:
+                pass
+            self.steps.append(entry)
+
+
+def load_script(script: str, run_dir: Path):
+    # Decode script if base64 encoded
+    if script.startswith('base64:'):
+        script = base64.b64decode(script[7:]).decode('utf-8')
+
+    # Add proper indentation to the script
+    indented_script = ""
+    for line in script.split('\n'):
+        if line.strip():
+            indented_script += "    " + line + "\n"
+        else:
+            indented_script += "\n"
+
+    # Create test script with proper indentation
+    test_script = f"""async def run_test(page, output_dir):
+{indented_script}"""
+
+    # Write the test script to a file for debugging
+    test_script_path = run_dir / "test_script.py"
+    with open(test_script_path, "w") as f:
+        f.write(test_script)
+
+    # Save script to temp file for execution
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
+        f.write(test_script)
+        script_path = f.name
+
+    # Import the script; each run gets its own module
+    try:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(f"dynamic_script_{run_dir.name}", script_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.unlink(script_path)
+    return module
+
+
+async def save_screenshot(page, path):
+    await page.screenshot(
+        path=str(path),
+        full_page=True,
+        type="jpeg",
+        quality = 50
+    )
+
+
+async def execute_playwright_script(url: str, script: str, output_dir: str = ".screenshots", capture_logs: bool = False, pool: BrowserPool = None):
     """
     Executes a Playwright script and captures outputs.
+
+    Without a pool a single browser is started for this run and closed afterwards.
+    Scripts can time their own steps with `async with step("name"): ...`; the initial
+    navigation is always recorded as the first step.
     """
+    if pool is None:
+        async with BrowserPool(browsers=1, contexts_per_browser=1) as pool:
+            return await execute_playwright_script(url, script, output_dir, capture_logs, pool)
+
     # Create output directory
-    
+
     automation_output_dir = 'automation_output'
 
     os.makedirs(output_dir, exist_ok=True)
     os.makedirs(automation_output_dir, exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    run_dir = Path(automation_output_dir) / timestamp
+    # Parallel runs started in the same second each need their own directory
+    run_dir = Path(automation_output_dir) / f"{timestamp}_{uuid.uuid4().hex[:8]}"
     run_dir.mkdir(exist_ok=True)
 
     screenshot_dir = Path(output_dir)
     screenshot_dir.mkdir(exist_ok=True)
-    
+
     result = {
         "status": "success",
         "data": {
             "screenshots": [],
             "console_logs": [],
+            "timings": [],
+            "duration_ms": None,
             "error": None,
             "output": None
         }
     }
+    started = time.perf_counter()
 
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context()
+        async with pool.context() as context:
             page = await context.new_page()
-            
+            recorder = StepRecorder(page)
+
             # Store console logs if requested
             console_logs = []
             if capture_logs:
                 page.on("console", lambda msg: console_logs.append(f"{msg.type}: {msg.text}"))
-            
+
             try:
                 # Navigate to URL first
-                await page.goto(url, wait_until="networkidle", timeout=30000)
-                
-                # Decode script if base64 encoded
-                if script.startswith('base64:'):
-                    script = base64.b64decode(script[7:]).decode('utf-8')
-                
-                # Add proper indentation to the script
-                indented_script = ""
-                for line in script.split('\n'):
-                    if line.strip():
-                        indented_script += "    " + line + "\n"
-                    else:
-                        indented_script += "\n"
-                
-                # Create test script with proper indentation
-                test_script = f"""async def run_test(page, output_dir):
-{indented_script}"""
+                async with recorder.step(f"goto {url}"):
+                    await page.goto(url, wait_until="networkidle", timeout=30000)
+
+                module = load_script(script, run_dir)
+                module.step = recorder.step
 
-                # Write the test script to a file for debugging
-                test_script_path = run_dir / "test_script.py"
-                with open(test_script_path, "w") as f:
-                    f.write(test_script)
-
-                # Save script to temp file for execution
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-                    f.write(test_script)
-                    script_path = f.name
-
-                # Import and execute the script
-                import importlib.util
-                spec = importlib.util.spec_from_file_location("dynamic_script", script_path)
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-                
                 # Run the test
                 output = await module.run_test(page, str(run_dir))
                 if output is not None:
                     result["data"]["output"] = output
-                
+
                 # Take a screenshot if none were taken
-                screenshot_files = list(run_dir.glob('*.{png,jpg,jpeg}'))
+                screenshot_files = [f for pattern in ('*.png', '*.jpg', '*.jpeg') for f in run_dir.glob(pattern)]
                 if not screenshot_files:
                     final_screenshot = run_dir / f"final_{timestamp}.png"
-                    await page.screenshot(
-                        path=str(final_screenshot),
-                        full_page=True,
-                        type="jpeg",
-                        quality = 50
-                    )
+                    await save_screenshot(page, final_screenshot)
                     result["data"]["screenshots"].append(str(final_screenshot))
 
                     # Save additional screenshot to .screenshot folder
-                    await page.screenshot(
-                        path=str(screenshot_dir / "screenshot.jpeg"),
-                        full_page=True,
-                        type="jpeg",
-                        quality = 50
-                    )
+                    await save_screenshot(page, screenshot_dir / "screenshot.jpeg")
                 else:
                     result["data"]["screenshots"].extend(str(f) for f in screenshot_files)
 
@@ -121,51 +277,109 @@ async def execute_playwright_script(url: str, script: str, output_dir: str = ".s
                 result["status"] = "error"
                 result["data"]["error"] = f"Script error: {str(e)}"
                 error_screenshot = run_dir / f"error_{timestamp}.png"
-                await page.screenshot(
-                        path=str(error_screenshot),
-                        full_page=True,
-                        type="jpeg",
-                        quality = 50
-                    )
+                await save_screenshot(page, error_screenshot)
                 result["data"]["screenshots"].append(str(error_screenshot))
 
                 # Save additional screenshot to .screenshot folder
-                await page.screenshot(
-                        path=str(screenshot_dir / "screenshot.jpeg"),
-                        full_page=True,
-                        type="jpeg",
-                        quality = 50
-                    )
-            
+                await save_screenshot(page, screenshot_dir / "screenshot.jpeg")
+
             finally:
-                if os.path.exists(script_path):
-                    os.unlink(script_path)
-                await browser.close()
+                result["data"]["timings"] = recorder.steps
 
     except Exception as e:
         result["status"] = "error"
         result["data"]["error"] = f"Setup error: {str(e)}"
 
+    result["data"]["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
     return result
 
+
+async def execute_playwright_scripts(url: str, scripts: list, concurrency: int = 4, browsers: int = 2, output_dir: str = ".screenshots", capture_logs: bool = False):
+    """Runs scripts in parallel, at most `concurrency` at a time, over a shared pool of warm browsers."""
+    contexts_per_browser = max(1, -(-concurrency // browsers))
+    async with BrowserPool(browsers=browsers, contexts_per_browser=contexts_per_browser) as pool:
+        limit = asyncio.Semaphore(concurrency)
+
+        async def run(script):
+            async with limit:
+                return await execute_playwright_script(url, script, output_dir, capture_logs, pool)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run(script) for script in scripts))
+        elapsed = time.perf_counter() - started
+    return {"elapsed_s": round(elapsed, 3), "summary": summarize(results, elapsed), "results": results}
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+    if len(values) == 1:
+        return {"p50": values[0], "p95": values[0], "max": values[0]}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": round(cuts[49], 1), "p95": round(cuts[94], 1), "max": values[-1]}
+
+
+def summarize(results: list, elapsed: float) -> dict:
+    steps = {}
+    for result in results:
+        for step in result["data"]["timings"]:
+            steps.setdefault(step["name"], []).append(step)
+    return {
+        "runs": len(results),
+        "errors": sum(result["status"] != "success" for result in results),
+        "runs_per_s": round(len(results) / elapsed, 2) if elapsed else None,
+        "run_ms": percentiles([result["data"]["duration_ms"] for result in results]),
+        "steps": {
+            name: {
+                "count": len(entries),
+                "wall_ms": percentiles([entry["wall_ms"] for entry in entries]),
+                "lcp_ms": percentiles([entry["lcp_ms"] for entry in entries if entry.get("lcp_ms") is not None]),
+                "ttfb_ms": percentiles([
+                    entry["navigation"]["ttfb_ms"] for entry in entries if entry.get("navigation")
+                ]),
+                "api_ms": percentiles([
+                    call["duration_ms"] for entry in entries for call in entry.get("api_calls", [])
+                ]),
+            }
+            for name, entries in steps.items()
+        },
+    }
+
+
 def main():
     parser = argparse.ArgumentParser(description="Execute Playwright automation script")
     parser.add_argument("url", help="URL to automate")
-    parser.add_argument("--script", required=True, help="Playwright script to execute (plain text or base64 encoded with 'base64:' prefix)")
+    parser.add_argument("--script", required=True, action="append",
+                        help="Playwright script to execute (plain text or base64 encoded with 'base64:' prefix); repeat to run several")
     parser.add_argument("--output", "-o", default=".screenshots",
                         help="Output directory for screenshots and logs")
     parser.add_argument("--capture-logs", action="store_true", help="Capture console logs")
-    
+    parser.add_argument("--repeat", type=int, default=1, help="Run every script this many times")
+    parser.add_argument("--concurrency", type=int, default=1, help="Scripts running at the same time")
+    parser.add_argument("--browsers", type=int, default=1, help="Warm browsers shared by all runs")
+
     args = parser.parse_args()
-    
-    result = asyncio.run(execute_playwright_script(
-        args.url,
-        args.script,
-        args.output,
-        args.capture_logs
-    ))
-    
+
+    scripts = args.script * args.repeat
+    if len(scripts) == 1:
+        result = asyncio.run(execute_playwright_script(
+            args.url,
+            scripts[0],
+            args.output,
+            args.capture_logs
+        ))
+    else:
+        result = asyncio.run(execute_playwright_scripts(
+            args.url,
+            scripts,
+            args.concurrency,
+            args.browsers,
+            args.output,
+            args.capture_logs
+        ))
+
     print(json.dumps(result))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
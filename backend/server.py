@@ -1,20 +1,60 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Header
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Match
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference, ReplaceOne, ReturnDocument, UpdateOne, WriteConcern, monitoring
+from pymongo.errors import OperationFailure, PyMongoError
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, create_model
+from typing import List, Optional, Dict, Any, Callable, Tuple
 import uuid
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import bcrypt
 import jwt
 from emergentintegrations.llm.chat import LlmChat, UserMessage
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from contextlib import contextmanager
 import stripe
 import asyncio
+import numpy as np
+import gzip
+import math
+import threading
+import time
+import json
+import sys
+import tempfile
+import queue
+import random
+import re
+import atexit
+import bisect
+import heapq
+import unicodedata
+from logging.handlers import QueueHandler, QueueListener
+from collections import Counter as CallCounter, OrderedDict, deque
+from contextvars import Context, ContextVar
+from functools import lru_cache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; without it bookings are never archived
+    pa = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -22,10 +62,699 @@ load_dotenv(ROOT_DIR / '.env')
 # Initialize Stripe
 stripe.api_key = os.environ['STRIPE_SECRET_KEY']
 
+# Request Tracing
+REQUEST_TRACING_ENABLED = os.environ.get('REQUEST_TRACING_ENABLED', 'false').lower() == 'true'
+SLOW_REQUEST_THRESHOLD_MS = float(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', 500))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 3))
+
+class RequestTrace:
+    """Spans collected while serving a single request."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.mongo: List[Dict[str, Any]] = []
+        self.models: List[Dict[str, Any]] = []
+        self.outbound: List[Dict[str, Any]] = []
+
+    def add_span(self, kind: str, name: str, started: float, **extra):
+        getattr(self, kind).append({
+            "name": name,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            **extra,
+        })
+
+    def repeated_queries(self) -> List[Dict[str, Any]]:
+        counts = CallCounter(span["shape"] for span in self.mongo)
+        return [
+            {"shape": shape, "count": count}
+            for shape, count in counts.items()
+            if count >= N_PLUS_ONE_THRESHOLD
+        ]
+
+    def report(self, route: str, status: int) -> Dict[str, Any]:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        mongo_ms = sum(span["duration_ms"] for span in self.mongo)
+        models_ms = sum(span["duration_ms"] for span in self.models)
+        outbound_ms = sum(span["duration_ms"] for span in self.outbound)
+        return {
+            "method": self.method,
+            "path": self.path,
+            "route": route,
+            "status": status,
+            "total_ms": round(total_ms, 3),
+            "mongo_ms": round(mongo_ms, 3),
+            "models_ms": round(models_ms, 3),
+            "outbound_ms": round(outbound_ms, 3),
+            "other_ms": round(total_ms - mongo_ms - models_ms - outbound_ms, 3),
+            "mongo": self.mongo,
+            "models": self.models,
+            "outbound": self.outbound,
+            "n_plus_one": self.repeated_queries(),
+        }
+
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+
+def _query_shape(value):
+    # Replace literal values so queries differing only by id collapse to one shape
+    if isinstance(value, dict):
+        return {key: _query_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_query_shape(item) for item in value[:1]]
+    return "?"
+
+class CommandTracer(monitoring.CommandListener):
+    """Attributes Mongo commands to the trace of the request that issued them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Any, tuple] = {}
+
+    def started(self, event):
+        # Motor copies the caller's context into its executor, so the trace is visible here
+        trace = current_trace.get()
+        if trace is None:
+            return
+        command = event.command
+        collection = command.get(event.command_name)
+        query = command.get("filter", command.get("q", command.get("pipeline", {})))
+        shape = json.dumps(
+            [event.command_name, collection if isinstance(collection, str) else "-", _query_shape(query)],
+            sort_keys=True,
+            default=str,
+        )
+        with self._lock:
+            self._inflight[(event.connection_id, event.request_id)] = (trace, shape)
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            pending = self._inflight.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        trace, shape = pending
+        trace.mongo.append({
+            "name": event.command_name,
+            "shape": shape,
+            "duration_ms": round(event.duration_micros / 1000, 3),
+            "failed": failed,
+        })
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+command_tracer = CommandTracer()
+
+def build_models(model, documents: List[Dict[str, Any]]) -> list:
+    start = time.perf_counter()
+    result = [model(**document) for document in documents]
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_span("models", model.__name__, start, count=len(result))
+    return result
+
+class TracingMiddleware:
+    """Opt-in ASGI middleware emitting structured reports for slow or N+1 requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope["method"], scope["path"])
+        token = current_trace.set(trace)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_trace.reset(token)
+            route = scope.get("route")
+            report = trace.report(route.path if route is not None else "unmatched", status["code"])
+            if report["total_ms"] >= SLOW_REQUEST_THRESHOLD_MS:
+                logger.warning("slow_request", extra={"report": report})
+            elif report["n_plus_one"]:
+                logger.warning("n_plus_one", extra={"report": report})
+
+class SamplingProfiler:
+    """Samples the stacks of every thread and aggregates them in folded flame graph format."""
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: CallCounter = CallCounter()
+        self.interval = 0.005
+        self.samples = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = 5.0):
+        if self.running:
+            return
+        self.interval = interval_ms / 1000
+        self.samples = 0
+        self._stacks = CallCounter()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> str:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+
+profiler = SamplingProfiler()
+
+# Prometheus Metrics
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status",
+    ["method", "route", "status"],
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency by collection and operation",
+    ["collection", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total",
+    "Failed MongoDB commands by collection and operation",
+    ["collection", "command"],
+)
+MONGO_POOL_CHECKOUT_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+MONGO_POOL_IN_USE = Gauge(
+    "mongo_pool_connections_in_use",
+    "Connections currently checked out of the pool",
+    ["address"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Outbound call latency by service and operation",
+    ["service", "operation"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+LIFECYCLE_DOCUMENTS = Counter(
+    "lifecycle_documents_total",
+    "Documents expired or purged by the lifecycle sweeper",
+    ["collection", "action"],
+)
+LIFECYCLE_RECLAIMED_BYTES = Counter(
+    "lifecycle_reclaimed_bytes_total",
+    "Approximate bytes reclaimed by lifecycle purges",
+    ["collection"],
+)
+RATE_LIMITED_REQUESTS = Counter(
+    "rate_limited_requests_total",
+    "Requests rejected by the rate limiter",
+    ["route", "key"],
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_request_errors_total",
+    "Failed outbound calls by service and operation",
+    ["service", "operation"],
+)
+LLM_CALLS = Counter(
+    "llm_calls_total",
+    "LLM completions by model and outcome (success, error, timeout, rejected by an open breaker)",
+    ["model", "outcome"],
+)
+LLM_HEDGES = Counter(
+    "llm_hedged_requests_total",
+    "Duplicate LLM requests sent after the hedge delay, and how many of them answered first",
+    ["model", "result"],
+)
+LLM_CIRCUIT_OPEN = Gauge(
+    "llm_circuit_open",
+    "1 while the circuit breaker for a model is open",
+    ["model"],
+)
+TRIP_PLANS_GENERATED = Counter(
+    "trip_plans_generated_total",
+    "Trip plans by where the itinerary came from (llm, cache, catalog)",
+    ["source"],
+)
+
+@contextmanager
+def track_upstream(service: str, operation: str):
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        UPSTREAM_ERRORS.labels(service, operation).inc()
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(service, operation).observe(time.perf_counter() - start)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add_span("outbound", f"{service}.{operation}", start, failed=failed)
+
+class CommandMetrics(monitoring.CommandListener):
+    """Command monitoring listener feeding per-collection Mongo latency histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Any, tuple] = {}
+
+    @staticmethod
+    def _collection(event) -> str:
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        else:
+            target = event.command.get(event.command_name)
+        return target if isinstance(target, str) else "-"
+
+    def started(self, event):
+        with self._lock:
+            self._inflight[(event.connection_id, event.request_id)] = (
+                self._collection(event),
+                event.command_name,
+            )
+
+    def _finish(self, event):
+        with self._lock:
+            labels = self._inflight.pop((event.connection_id, event.request_id), None)
+        return labels or ("-", event.command_name)
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.labels(*self._finish(event)).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        labels = self._finish(event)
+        MONGO_COMMAND_LATENCY.labels(*labels).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(*labels).inc()
+
+command_metrics = CommandMetrics()
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request latency labelled by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status["code"]),
+            ).observe(time.perf_counter() - start)
+
+# Structured Logging
+# Records are rendered as JSON lines; in the default "async" mode the caller only builds
+# the record and enqueues it, and a listener thread does the formatting and the write.
+# "sync" writes on the calling thread, "off" drops everything (a benchmarking baseline).
+LOG_MODE = os.environ.get('LOG_MODE', 'async')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_ACCESS_SAMPLE_RATE = float(os.environ.get('LOG_ACCESS_SAMPLE_RATE', 1.0))
+LOG_SLOW_REQUEST_MS = float(os.environ.get('LOG_SLOW_REQUEST_MS', 1000))
+# High-volume anonymous reads; errors and slow requests are always logged regardless
+DEFAULT_LOG_SAMPLE_RATES = {
+    "/api/home": 0.05,
+    "/api/hotels": 0.1,
+    "/api/cars": 0.1,
+    "/api/events": 0.1,
+    "/api/tours": 0.1,
+    "/api/real-estate": 0.1,
+    "/api/{catalog}/facets": 0.1,
+    "/api/map/tiles/{z}/{x}/{y}": 0.02,
+    "/api/trending": 0.05,
+    "/api/autocomplete": 0.01,
+    "/metrics": 0.0,
+}
+
+def load_log_sample_rates() -> Dict[str, float]:
+    # LOG_SAMPLE_RATES="/api/hotels=0.01,/api/listings/batch=0.2" overrides per route template
+    rates = dict(DEFAULT_LOG_SAMPLE_RATES)
+    for entry in os.environ.get('LOG_SAMPLE_RATES', '').split(","):
+        if "=" in entry:
+            route, rate = entry.rsplit("=", 1)
+            rates[route.strip()] = float(rate)
+    return rates
+
+LOG_SAMPLE_RATES = load_log_sample_rates()
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+current_request_id: ContextVar[Optional[str]] = ContextVar("current_request_id", default=None)
+
+_STANDARD_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class RequestIdFilter(logging.Filter):
+    # Runs on the emitting thread, where the request's context is still current
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id.get()
+        return True
+
+class AsyncLogHandler(QueueHandler):
+    """Enqueues records for the listener thread after doing only the work that must happen now."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments and tracebacks are resolved eagerly since they may not outlive the call;
+        # JSON encoding and the write are left to the listener
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def configure_logging() -> Optional[QueueListener]:
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    if LOG_MODE == "off":
+        logging.disable(logging.CRITICAL)
+        return None
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    if LOG_MODE == "sync":
+        stream.addFilter(RequestIdFilter())
+        root.addHandler(stream)
+        return None
+
+    handler = AsyncLogHandler(queue.SimpleQueue())
+    handler.addFilter(RequestIdFilter())
+    root.addHandler(handler)
+    listener = QueueListener(handler.queue, stream)
+    listener.start()
+    # Drain whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
+
+def should_log_access(route: str, status: int, duration_ms: float) -> bool:
+    if status >= 400 or duration_ms >= LOG_SLOW_REQUEST_MS:
+        return True
+    rate = LOG_SAMPLE_RATES.get(route, LOG_ACCESS_SAMPLE_RATE)
+    return rate >= 1.0 or random.random() < rate
+
+class RequestContextMiddleware:
+    """Outermost ASGI middleware: gives each request a correlation id and writes a sampled access log."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # A well-formed upstream X-Request-ID (e.g. from a load balancer) is kept
+        incoming = Headers(scope=scope).get("x-request-id")
+        request_id = incoming if incoming and REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+        token = current_request_id.set(request_id)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            route = scope.get("route")
+            template = route.path if route is not None else "unmatched"
+            if access_logger.isEnabledFor(logging.INFO) and should_log_access(template, status["code"], duration_ms):
+                access_logger.info("request", extra={
+                    "method": scope["method"],
+                    "route": template,
+                    "path": scope["path"],
+                    "status": status["code"],
+                    "duration_ms": round(duration_ms, 3),
+                })
+            current_request_id.reset(token)
+
+access_logger = logging.getLogger("sierra_explore.access")
+
+# MongoDB Pool Telemetry
+class PoolTelemetry(monitoring.ConnectionPoolListener):
+    """CMAP listener tracking connection checkout waits and in-use counts per server."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = threading.local()
+        self.servers: Dict[str, Dict[str, Any]] = {}
+
+    def _server(self, address) -> Dict[str, Any]:
+        key = f"{address[0]}:{address[1]}"
+        if key not in self.servers:
+            self.servers[key] = {
+                "open": 0,
+                "in_use": 0,
+                "max_in_use": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "wait_ms_total": 0.0,
+                "wait_ms_max": 0.0,
+                "pool_clears": 0,
+            }
+        return self.servers[key]
+
+    def _end_wait(self) -> float:
+        started = getattr(self._pending, "started", None)
+        self._pending.started = None
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    def pool_created(self, event):
+        with self._lock:
+            self._server(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._server(event.address)["pool_clears"] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self._server(event.address)["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._server(event.address)["open"] -= 1
+
+    def connection_check_out_started(self, event):
+        # Checkout start and completion are published on the same thread
+        self._pending.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        waited = self._end_wait()
+        with self._lock:
+            stats = self._server(event.address)
+            stats["checkout_failures"] += 1
+            stats["wait_ms_total"] += waited
+            stats["wait_ms_max"] = max(stats["wait_ms_max"], waited)
+
+    def connection_checked_out(self, event):
+        waited = self._end_wait()
+        MONGO_POOL_CHECKOUT_WAIT.observe(waited / 1000)
+        MONGO_POOL_IN_USE.labels(f"{event.address[0]}:{event.address[1]}").inc()
+        with self._lock:
+            stats = self._server(event.address)
+            stats["checkouts"] += 1
+            stats["in_use"] += 1
+            stats["max_in_use"] = max(stats["max_in_use"], stats["in_use"])
+            stats["wait_ms_total"] += waited
+            stats["wait_ms_max"] = max(stats["wait_ms_max"], waited)
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_IN_USE.labels(f"{event.address[0]}:{event.address[1]}").dec()
+        with self._lock:
+            self._server(event.address)["in_use"] -= 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for address, stats in self.servers.items():
+                checkouts = stats["checkouts"] or 1
+                result[address] = {
+                    **stats,
+                    "wait_ms_avg": round(stats["wait_ms_total"] / checkouts, 3),
+                    "wait_ms_total": round(stats["wait_ms_total"], 3),
+                    "wait_ms_max": round(stats["wait_ms_max"], 3),
+                }
+            return result
+
+pool_telemetry = PoolTelemetry()
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 60000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 10000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 30000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000))
+MONGO_WRITE_CONCERN_W = os.environ.get('MONGO_WRITE_CONCERN_W')  # e.g. "majority" or "1"
+MONGO_WRITE_CONCERN_J = os.environ.get('MONGO_WRITE_CONCERN_J')  # "true" / "false"
+# Catalog browsing can be served by secondaries; bookings and payments always read the primary
+MONGO_CATALOG_READ_PREFERENCE = os.environ.get('MONGO_CATALOG_READ_PREFERENCE', 'secondaryPreferred')
+# "string" keeps uuid4 strings in an `id` field; "binary" stores them as BSON UUIDs in `_id`
+ID_STORAGE = os.environ.get('ID_STORAGE', 'string')
+
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    event_listeners=[pool_telemetry, command_metrics] + ([command_tracer] if REQUEST_TRACING_ENABLED else []),
+    uuidRepresentation="standard",
+)
+write_concern_options: Dict[str, Any] = {}
+if MONGO_WRITE_CONCERN_W:
+    write_concern_options["w"] = int(MONGO_WRITE_CONCERN_W) if MONGO_WRITE_CONCERN_W.isdigit() else MONGO_WRITE_CONCERN_W
+if MONGO_WRITE_CONCERN_J:
+    write_concern_options["j"] = MONGO_WRITE_CONCERN_J.lower() == "true"
+write_concern = WriteConcern(**write_concern_options)
+db = client.get_database(
+    os.environ['DB_NAME'],
+    read_preference=ReadPreference.PRIMARY,
+    write_concern=write_concern,
+)
+catalog_db = client.get_database(
+    os.environ['DB_NAME'],
+    read_preference=make_read_preference(read_pref_mode_from_name(MONGO_CATALOG_READ_PREFERENCE), None),
+    write_concern=write_concern,
+)
+
+# Identifier Storage
+# The API always speaks uuid4 strings; these helpers translate at the document boundary so
+# ID_STORAGE=binary can keep a single 16-byte `_id` instead of `_id` plus a 36-character `id`
+BINARY_IDS = ID_STORAGE == "binary"
+ID_FIELD = "_id" if BINARY_IDS else "id"
+ID_REFERENCE_FIELDS = ("user_id", "service_id")
+
+def stored_id(value: str):
+    if not BINARY_IDS:
+        return value
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        # Ids that are not UUIDs are kept as strings and can still be looked up
+        return value
+
+def id_filter(value: str) -> Dict[str, Any]:
+    return {ID_FIELD: stored_id(value)}
+
+def ids_filter(values: List[str]) -> Dict[str, Any]:
+    return {ID_FIELD: {"$in": [stored_id(value) for value in values]}}
+
+def to_document(data: Dict[str, Any]) -> Dict[str, Any]:
+    if not BINARY_IDS:
+        return data
+    document = dict(data)
+    if "id" in document:
+        document["_id"] = stored_id(document.pop("id"))
+    for field in ID_REFERENCE_FIELDS:
+        if isinstance(document.get(field), str):
+            document[field] = stored_id(document[field])
+    return document
+
+def to_update(data: Dict[str, Any]) -> Dict[str, Any]:
+    document = to_document(data)
+    # The path parameter addresses the document; an id in the body must not rename it
+    document.pop("_id", None)
+    document.pop("id", None)
+    return document
+
+def from_document(document: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not BINARY_IDS or document is None:
+        return document
+    if "_id" in document and "id" not in document:
+        document["id"] = str(document.pop("_id"))
+    for field in ID_REFERENCE_FIELDS:
+        if isinstance(document.get(field), uuid.UUID):
+            document[field] = str(document[field])
+    return document
+
+def from_documents(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [from_document(document) for document in documents]
 
 # JWT Configuration
 JWT_SECRET = "sierra_explore_secret_key_2025"
@@ -40,6 +769,7 @@ api_router = APIRouter(prefix="/api")
 
 # Security
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Enhanced Models
 class User(BaseModel):
@@ -84,179 +814,3108 @@ class Hotel(BaseModel):
     contact_info: Dict[str, str] = {}
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-class Car(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    brand: str
-    model: str
-    year: int
-    description: str
-    location: Location
-    images: List[str]
-    features: List[str]
-    price_per_day: float
-    transmission: str  # "Manual", "Automatic"
-    fuel_type: str  # "Petrol", "Diesel"
-    seats: int
-    available: bool = True
-    rating: float = 0.0
-    reviews_count: int = 0
-    reviews: List[Dict[str, Any]] = []
-    contact_info: Dict[str, str] = {}
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+class Car(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    brand: str
+    model: str
+    year: int
+    description: str
+    location: Location
+    images: List[str]
+    features: List[str]
+    price_per_day: float
+    transmission: str  # "Manual", "Automatic"
+    fuel_type: str  # "Petrol", "Diesel"
+    seats: int
+    available: bool = True
+    rating: float = 0.0
+    reviews_count: int = 0
+    reviews: List[Dict[str, Any]] = []
+    contact_info: Dict[str, str] = {}
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Event(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    description: str
+    location: Location
+    date: datetime
+    end_date: Optional[datetime] = None
+    images: List[str]
+    category: str  # "Cultural", "Music", "Festival", "Sports"
+    price: float
+    max_attendees: int
+    current_attendees: int = 0
+    organizer: str
+    available: bool = True
+    rating: float = 0.0
+    reviews_count: int = 0
+    reviews: List[Dict[str, Any]] = []
+    contact_info: Dict[str, str] = {}
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Tour(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    description: str
+    destinations: List[Location]
+    duration_days: int
+    images: List[str]
+    included: List[str]
+    price_per_person: float
+    max_group_size: int
+    difficulty_level: str  # "Easy", "Moderate", "Challenging"
+    tour_type: str  # "Cultural", "Adventure", "Beach", "Historical"
+    available: bool = True
+    rating: float = 0.0
+    reviews_count: int = 0
+    reviews: List[Dict[str, Any]] = []
+    contact_info: Dict[str, str] = {}
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class RealEstate(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    title: str
+    description: str
+    location: Location
+    property_type: str  # "House", "Apartment", "Land", "Commercial"
+    listing_type: str  # "Sale", "Rent"
+    price: float
+    bedrooms: Optional[int] = None
+    bathrooms: Optional[int] = None
+    area_sqm: Optional[float] = None
+    images: List[str]
+    features: List[str]
+    available: bool = True
+    contact_info: Dict[str, str]
+    rating: float = 0.0
+    reviews_count: int = 0
+    reviews: List[Dict[str, Any]] = []
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class BookingRequest(BaseModel):
+    service_type: str  # "hotel", "car", "event", "tour"
+    service_id: str
+    start_date: str
+    end_date: Optional[str] = None
+    guests: int = 1
+    room_type: Optional[str] = None  # hotels only, e.g. "Ocean View Suite"
+    special_requests: Optional[str] = None
+
+class Booking(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    service_type: str  # "hotel", "car", "event", "tour"
+    service_id: str
+    service_name: str
+    booking_date: datetime = Field(default_factory=datetime.utcnow)
+    start_date: datetime
+    end_date: Optional[datetime] = None
+    guests: int = 1
+    total_price: float
+    payment_status: str = "pending"  # "pending", "paid", "refunded", "expired"
+    payment_intent_id: Optional[str] = None
+    stripe_payment_id: Optional[str] = None
+    status: str = "confirmed"  # "confirmed", "cancelled"
+    special_requests: Optional[str] = None
+    expired_at: Optional[datetime] = None  # set when an unpaid hold is released
+
+class BookingServiceSummary(BaseModel):
+    id: str
+    name: str
+    thumbnail: Optional[str] = None
+    location: Optional[Location] = None
+    rating: float = 0.0
+    contact_info: Dict[str, str] = {}
+
+class BookingWithService(Booking):
+    service: Optional[BookingServiceSummary] = None
+
+class PaymentRequest(BaseModel):
+    booking_id: str
+    amount: float
+    currency: str = "usd"
+
+class TripPlan(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_query: str
+    destinations: List[str]
+    duration_days: int
+    budget: Optional[float] = None
+    preferences: List[str]
+    suggested_hotels: List[str]
+    suggested_cars: List[str]
+    suggested_tours: List[str]
+    suggested_events: List[str]
+    total_estimated_cost: float
+    itinerary: Dict[str, Any]
+    user_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: Optional[datetime] = None  # anonymous plans only
+
+class RouteRequest(BaseModel):
+    destinations: List[str]  # place names, or listing refs like "hotel:<id>"
+    duration_days: int
+    keep_order: bool = False
+
+class RouteLeg(BaseModel):
+    origin: str
+    destination: str
+    km: float  # estimated road distance
+    hours: float
+
+class RouteDay(BaseModel):
+    day: int
+    stops: List[str]
+    legs: List[RouteLeg]
+    travel_km: float
+    travel_hours: float
+
+class RoutePlan(BaseModel):
+    stops: List[str]  # in visiting order
+    total_km: float
+    total_hours: float
+    days: List[RouteDay]
+    unresolved: List[str] = []
+
+class PricingRule(BaseModel):
+    name: str
+    multiplier: float
+    service_types: List[str]
+    start: Optional[str] = None  # "MM-DD", inclusive; ranges may wrap the new year
+    end: Optional[str] = None
+    weekdays: Optional[List[int]] = None  # 0 = Monday; e.g. [4, 5] for Friday and Saturday nights
+
+class QuoteItem(BaseModel):
+    service_type: str
+    service_id: str
+    room_type: Optional[str] = None
+
+class QuoteRequest(BaseModel):
+    items: List[QuoteItem]
+    start_date: str
+    end_date: Optional[str] = None
+    guests: int = Field(1, ge=1)
+
+class Quote(BaseModel):
+    service_type: str
+    service_id: str
+    room_type: Optional[str] = None
+    units: int  # nights or days priced; 1 for flat-priced services
+    base_rate: float
+    total_price: float
+
+class ListingRef(BaseModel):
+    service_type: str  # "hotel", "car", "event", "tour", "real-estate"
+    id: str
+
+class ListingBatchRequest(BaseModel):
+    items: List[ListingRef]
+
+class ListingBatchResponse(BaseModel):
+    listings: Dict[str, Dict[str, Any]]  # keyed by listing id, each with its service_type
+    missing: List[ListingRef]
+
+class QuoteResponse(BaseModel):
+    start_date: datetime
+    end_date: datetime
+    guests: int
+    quotes: List[Quote]
+    missing: List[ListingRef]
+
+class MapCluster(BaseModel):
+    geohash: str
+    count: int
+    centroid: Dict[str, float]  # {"lat": ..., "lng": ...}
+    types: Dict[str, int]  # listings per service type
+    min_price: Dict[str, float]  # per service type, since nightly and ticket prices do not compare
+
+class MapTile(BaseModel):
+    z: int
+    x: int
+    y: int
+    precision: int
+    clusters: List[MapCluster]
+
+class ListingCard(BaseModel):
+    id: str
+    service_type: str
+    name: str
+    price: float
+    price_unit: Optional[str] = None  # "night", "day", "ticket", "person"
+    rating: float = 0.0
+    reviews_count: int = 0
+    city: Optional[str] = None
+    district: Optional[str] = None
+    thumbnail: Optional[str] = None
+    summary: str = ""
+
+class SimilarListing(ListingCard):
+    score: float  # 1 for an identical feature vector, falling towards 0 with distance
+
+class AutocompleteSuggestion(BaseModel):
+    kind: str  # "listing" or "place"
+    label: str
+    detail: Optional[str] = None  # where a listing is, or the place enclosing a place
+    service_type: Optional[str] = None  # listings only
+    id: Optional[str] = None  # listings only
+    place_type: Optional[str] = None  # "city", "area" or "district"; places only
+
+class TrendingListing(ListingCard):
+    trending_score: float  # decayed booking-equivalents as of now
+    bookings: int
+    payments: int
+
+# Service type -> (collection name, model)
+SERVICE_TYPES = {
+    "hotel": ("hotels", Hotel),
+    "car": ("cars", Car),
+    "event": ("events", Event),
+    "tour": ("tours", Tour),
+    "real-estate": ("real_estate", RealEstate),
+}
+
+LISTING_BATCH_MAX_ITEMS = 200
+
+# Utility Functions
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def verify_password(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+def create_access_token(data: dict) -> str:
+    to_encode = data.copy()
+    expire = datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    try:
+        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        user_id = payload.get("sub")
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Invalid authentication")
+        
+        user = from_document(await db.users.find_one(id_filter(user_id)))
+        if user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        
+        return user
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid authentication")
+
+async def verify_admin(user = Depends(verify_token)):
+    if user.get("user_type") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+async def optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    if credentials is None:
+        return None
+    return await verify_token(credentials)
+
+# Rate Limiting
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # "memory" or "mongo"
+TRUSTED_PROXIES = set(os.environ.get('TRUSTED_PROXIES', '127.0.0.1').split(','))
+
+class RateLimitRule(BaseModel):
+    capacity: int = Field(ge=1)  # burst size
+    refill_per_second: float = Field(gt=0)
+    key: str = "ip"  # "ip" or "user"; user-keyed rules fall back to the client IP when anonymous
+
+DEFAULT_RATE_LIMIT_RULES = {
+    "POST /api/auth/login": [
+        RateLimitRule(capacity=10, refill_per_second=10 / 60),
+    ],
+    "POST /api/auth/signup": [
+        RateLimitRule(capacity=5, refill_per_second=5 / 300),
+    ],
+    "POST /api/ai-trip-planner": [
+        RateLimitRule(capacity=3, refill_per_second=3 / 60, key="ip"),
+        RateLimitRule(capacity=20, refill_per_second=20 / 86400, key="user"),
+    ],
+}
+
+def load_rate_limit_rules() -> Dict[str, List[RateLimitRule]]:
+    # RATE_LIMIT_RULES='{"POST /api/auth/login": [{"capacity": 5, "refill_per_second": 0.1}]}'
+    raw = os.environ.get('RATE_LIMIT_RULES')
+    if not raw:
+        return DEFAULT_RATE_LIMIT_RULES
+    return {
+        route: [RateLimitRule(**rule) for rule in rules]
+        for route, rules in json.loads(raw).items()
+    }
+
+RATE_LIMIT_RULES = load_rate_limit_rules()
+
+class RateLimitResult(BaseModel):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # seconds until the bucket is full again
+    retry_after: float  # seconds until the next token, when rejected
+
+def _bucket_result(rule: RateLimitRule, tokens: float, allowed: bool) -> RateLimitResult:
+    return RateLimitResult(
+        allowed=allowed,
+        limit=rule.capacity,
+        remaining=int(tokens),
+        reset_after=(rule.capacity - tokens) / rule.refill_per_second,
+        retry_after=0.0 if allowed else (1 - tokens) / rule.refill_per_second,
+    )
+
+class InMemoryRateLimitBackend:
+    """Token buckets held in process memory; suitable for a single worker."""
+
+    def __init__(self, sweep_interval: float = 60.0):
+        # key -> (tokens, updated, full_at); a bucket that has refilled is the same as no bucket
+        self.buckets: Dict[str, tuple] = {}
+        self.sweep_interval = sweep_interval
+        self.next_sweep = time.monotonic() + sweep_interval
+
+    def sweep(self, now: float):
+        # Drops full buckets so clients that rotate addresses cannot grow the map without bound
+        for key in [key for key, (_, _, full_at) in self.buckets.items() if full_at <= now]:
+            del self.buckets[key]
+        self.next_sweep = now + self.sweep_interval
+
+    async def consume(self, key: str, rule: RateLimitRule) -> RateLimitResult:
+        now = time.monotonic()
+        if now >= self.next_sweep:
+            self.sweep(now)
+        tokens, updated, _ = self.buckets.get(key, (float(rule.capacity), now, now))
+        tokens = min(rule.capacity, tokens + (now - updated) * rule.refill_per_second)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.buckets[key] = (tokens, now, now + (rule.capacity - tokens) / rule.refill_per_second)
+        return _bucket_result(rule, tokens, allowed)
+
+class MongoRateLimitBackend:
+    """Token buckets shared by every worker, refilled atomically by a pipeline update."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def consume(self, key: str, rule: RateLimitRule) -> RateLimitResult:
+        elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        refilled = {"$min": [
+            rule.capacity,
+            {"$add": [{"$ifNull": ["$tokens", rule.capacity]}, {"$multiply": [elapsed, rule.refill_per_second]}]},
+        ]}
+        idle_ms = int(rule.capacity / rule.refill_per_second * 1000)
+        bucket = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": "$$NOW"}},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    "expires_at": {"$add": ["$$NOW", idle_ms]},
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return _bucket_result(rule, bucket["tokens"], bucket["allowed"])
+
+if RATE_LIMIT_BACKEND == "mongo":
+    rate_limit_backend = MongoRateLimitBackend(db.rate_limits)
+else:
+    rate_limit_backend = InMemoryRateLimitBackend()
+
+def client_ip(scope) -> str:
+    peer = scope["client"][0] if scope.get("client") else "unknown"
+    if peer in TRUSTED_PROXIES:
+        headers = dict(scope["headers"])
+        forwarded = headers.get(b"x-real-ip") or headers.get(b"x-forwarded-for", b"").split(b",")[0]
+        if forwarded:
+            return forwarded.decode().strip()
+    return peer
+
+def token_subject(scope) -> Optional[str]:
+    # Only the signature is checked here; the route's own auth dependency still validates the user
+    authorization = dict(scope["headers"]).get(b"authorization", b"").decode()
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return jwt.decode(authorization[7:], JWT_SECRET, algorithms=[JWT_ALGORITHM]).get("sub")
+    except jwt.PyJWTError:
+        return None
+
+class RateLimitMiddleware:
+    """Per-route token buckets keyed by client IP or authenticated user."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _route_rules(self, scope) -> tuple:
+        for route in app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                key = f"{scope['method']} {route.path}"
+                return key, RATE_LIMIT_RULES.get(key, [])
+        return None, []
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route_key, rules = self._route_rules(scope)
+        if not rules:
+            await self.app(scope, receive, send)
+            return
+
+        ip = client_ip(scope)
+        user_id = None
+        tightest: Optional[RateLimitResult] = None
+        for index, rule in enumerate(rules):
+            if rule.key == "user":
+                user_id = user_id or token_subject(scope)
+                subject = f"user:{user_id}" if user_id else f"ip:{ip}"
+            else:
+                subject = f"ip:{ip}"
+            result = await rate_limit_backend.consume(f"{route_key}#{index}|{subject}", rule)
+            if not result.allowed:
+                RATE_LIMITED_REQUESTS.labels(route_key, rule.key).inc()
+                tightest = result
+                break
+            if tightest is None or result.remaining < tightest.remaining:
+                tightest = result
+
+        headers = {
+            "RateLimit-Limit": str(tightest.limit),
+            "RateLimit-Remaining": str(tightest.remaining),
+            "RateLimit-Reset": str(math.ceil(tightest.reset_after)),
+        }
+        if not tightest.allowed:
+            headers["Retry-After"] = str(math.ceil(tightest.retry_after))
+            response = JSONResponse({"detail": "Rate limit exceeded"}, status_code=429, headers=headers)
+            await response(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response_headers = MutableHeaders(scope=message)
+                for name, value in headers.items():
+                    response_headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+# Sparse Fieldsets
+def parse_fields(model, fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - set(model.model_fields))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [field for field in requested if field != "id"]
+
+def projection_for(selected: Optional[List[str]]) -> Optional[Dict[str, int]]:
+    if selected is None:
+        return None
+    if BINARY_IDS:
+        return {"_id": 1, **{field: 1 for field in selected if field != "id"}}
+    return {"_id": 0, **{field: 1 for field in selected}}
+
+@lru_cache(maxsize=256)
+def sparse_model(model, fields: tuple):
+    return create_model(
+        f"{model.__name__}Fields",
+        **{field: (model.model_fields[field].annotation, model.model_fields[field]) for field in fields},
+    )
+
+def sparse_response(model, selected: List[str], documents) -> JSONResponse:
+    trimmed = sparse_model(model, tuple(selected))
+    if isinstance(documents, list):
+        return JSONResponse(jsonable_encoder(build_models(trimmed, documents)))
+    return JSONResponse(jsonable_encoder(trimmed(**documents)))
+
+# Response Compression
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=5)
+
+class CompressionMiddleware:
+    """Negotiates brotli/gzip for buffered responses above a size threshold; streams pass through."""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(message)
+                    return
+                # Whether or not this one is compressed, a cache must key it on Accept-Encoding
+                MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                if encoding is None:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming or small responses are sent unchanged
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress_body(body, encoding)
+            headers = MutableHeaders(scope=start_message)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+# Pricing
+DEFAULT_PRICING_RULES = [
+    PricingRule(name="Festive peak", multiplier=1.25, service_types=["hotel", "car", "tour"], start="12-15", end="01-10"),
+    PricingRule(name="Dry season", multiplier=1.1, service_types=["hotel", "car", "tour"], start="11-01", end="04-30"),
+    PricingRule(name="Rainy season", multiplier=0.85, service_types=["hotel", "car", "tour"], start="07-01", end="09-30"),
+    PricingRule(name="Weekend", multiplier=1.1, service_types=["hotel", "car"], weekdays=[4, 5]),
+]
+
+def load_pricing_rules() -> List[PricingRule]:
+    raw = os.environ.get('PRICING_RULES')
+    if not raw:
+        return DEFAULT_PRICING_RULES
+    return [PricingRule(**rule) for rule in json.loads(raw)]
+
+PRICING_RULES = load_pricing_rules()
+QUOTE_MAX_ITEMS = 500
+# Longest stay that can be quoted or booked; the rate table is built per day of the stay
+QUOTE_MAX_NIGHTS = 365
+
+# Price field per service type, and whether the price is per night/day and per guest
+PRICE_FIELDS = {
+    "hotel": ("price_per_night", True, True),
+    "car": ("price_per_day", True, False),
+    "event": ("price", False, True),
+    "tour": ("price_per_person", False, True),
+    "real-estate": ("price", False, False),
+}
+
+def _month_day(value: date) -> str:
+    return value.strftime("%m-%d")
+
+def _rule_applies(rule: PricingRule, day: date) -> bool:
+    if rule.weekdays is not None and day.weekday() not in rule.weekdays:
+        return False
+    if rule.start and rule.end:
+        month_day = _month_day(day)
+        if rule.start <= rule.end:
+            return rule.start <= month_day <= rule.end
+        return month_day >= rule.start or month_day <= rule.end
+    return True
+
+@lru_cache(maxsize=4096)
+def rate_table(service_type: str, start: date, units: int) -> np.ndarray:
+    """Per-unit price multipliers for a service type; nightly types get one entry per night."""
+    per_unit = PRICE_FIELDS[service_type][1]
+    days = [start + timedelta(days=offset) for offset in range(units)] if per_unit else [start]
+    table = np.ones(len(days))
+    for rule in PRICING_RULES:
+        if service_type in rule.service_types:
+            table *= np.array([rule.multiplier if _rule_applies(rule, day) else 1.0 for day in days])
+    table.setflags(write=False)
+    return table
+
+def booking_units(service_type: str, start_date: datetime, end_date: datetime) -> int:
+    if PRICE_FIELDS[service_type][1]:
+        return (end_date - start_date).days or 1
+    return 1
+
+def base_rates(service_type: str, services: List[Dict[str, Any]], room_types: List[Optional[str]]) -> np.ndarray:
+    field = PRICE_FIELDS[service_type][0]
+    rates = np.empty(len(services))
+    for index, (service, room_type) in enumerate(zip(services, room_types)):
+        if room_type is None:
+            rates[index] = service[field]
+            continue
+        room = next((room for room in service.get("room_types", []) if room.get("type") == room_type), None)
+        if room is None:
+            raise HTTPException(status_code=400, detail=f"Unknown room type: {room_type}")
+        rates[index] = room["price"]
+    return rates
+
+def price_services(
+    service_type: str,
+    services: List[Dict[str, Any]],
+    room_types: List[Optional[str]],
+    start_date: datetime,
+    end_date: datetime,
+    guests: int,
+) -> tuple:
+    """Vectorized pricing of many services of one type for the same stay."""
+    units = booking_units(service_type, start_date, end_date)
+    rates = base_rates(service_type, services, room_types)
+    multipliers = rate_table(service_type, start_date.date(), units)
+    # (services x units) nightly price matrix, summed per service
+    totals = (rates[:, None] * multipliers[None, :]).sum(axis=1)
+    if PRICE_FIELDS[service_type][2]:
+        totals = totals * guests
+    return units, rates, np.round(totals, 2)
+
+def parse_stay(start_date: str, end_date: Optional[str]) -> tuple:
+    try:
+        start = datetime.fromisoformat(start_date)
+        end = datetime.fromisoformat(end_date) if end_date else start
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (end - start).days > QUOTE_MAX_NIGHTS:
+        raise HTTPException(status_code=400, detail=f"Stays are limited to {QUOTE_MAX_NIGHTS} nights")
+    return start, end
+
+# Catalog Change Hooks
+# Handlers are called as handler(service_type, listing_id, document) after every admin
+# catalog write; listing_id and document are None when a whole catalog was rewritten
+catalog_change_handlers: List[Callable] = []
+
+def on_catalog_change(handler: Callable) -> Callable:
+    catalog_change_handlers.append(handler)
+    return handler
+
+async def notify_catalog_change(service_type: str, listing_id: Optional[str] = None, document: Optional[Dict[str, Any]] = None):
+    for handler in catalog_change_handlers:
+        try:
+            result = handler(service_type, listing_id, document)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception:
+            logger.exception("Catalog change handler %s failed", handler.__name__)
+
+# Catalog Filters and Facets
+CATALOG_PATHS = {
+    "hotels": "hotel",
+    "cars": "car",
+    "events": "event",
+    "tours": "tour",
+    "real-estate": "real-estate",
+}
+
+# Array field used for the "amenity" filter/facet per service type
+AMENITY_FIELDS = {
+    "hotel": "amenities",
+    "car": "features",
+    "real-estate": "features",
+}
+
+# Single-valued categorical fields per service type
+CATEGORY_FIELDS = {
+    "event": ["category"],
+    "tour": ["tour_type", "difficulty_level"],
+    "real-estate": ["property_type", "listing_type"],
+    "car": ["transmission", "fuel_type"],
+}
+
+PRICE_BUCKETS = {
+    "hotel": [0, 50, 100, 200, 400],
+    "car": [0, 30, 60, 100],
+    "event": [0, 10, 25, 50],
+    "tour": [0, 100, 250, 500],
+    "real-estate": [0, 1000, 50000, 150000, 500000],
+}
+
+FACET_CACHE_TTL_SECONDS = float(os.environ.get('FACET_CACHE_TTL_SECONDS', 300))
+FACET_CACHE_SIZE = 2048
+
+def location_field(service_type: str) -> str:
+    # Tours span several destinations; every other listing has a single location
+    return "destinations" if service_type == "tour" else "location"
+
+class CatalogFilters:
+    """Query-string filters shared by the catalog list and facet endpoints."""
+
+    def __init__(
+        self,
+        district: Optional[str] = None,
+        city: Optional[str] = None,
+        amenity: Optional[List[str]] = Query(None),
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        category: Optional[str] = None,
+        tour_type: Optional[str] = None,
+        difficulty_level: Optional[str] = None,
+        property_type: Optional[str] = None,
+        listing_type: Optional[str] = None,
+        transmission: Optional[str] = None,
+        fuel_type: Optional[str] = None,
+        geohash: Optional[str] = None,
+    ):
+        if geohash is not None and not GEOHASH_PATTERN.match(geohash):
+            raise HTTPException(status_code=400, detail="Invalid geohash")
+        self.district = district
+        self.city = city
+        self.geohash = geohash
+        self.amenity = amenity
+        self.min_price = min_price
+        self.max_price = max_price
+        self.categories = {
+            "category": category,
+            "tour_type": tour_type,
+            "difficulty_level": difficulty_level,
+            "property_type": property_type,
+            "listing_type": listing_type,
+            "transmission": transmission,
+            "fuel_type": fuel_type,
+        }
+
+    def clauses(self, service_type: str) -> Dict[str, Dict[str, Any]]:
+        """Mongo clauses keyed by facet name; filters that do not apply to the type are ignored."""
+        location = location_field(service_type)
+        clauses: Dict[str, Dict[str, Any]] = {}
+        if self.district:
+            clauses["district"] = {f"{location}.district": self.district}
+        if self.city:
+            clauses["city"] = {f"{location}.city": self.city}
+        if self.geohash:
+            # Listings inside a map cluster; an anchored prefix match walks the geohash index
+            clauses["geohash"] = {"geohash": {"$regex": f"^{self.geohash}"}}
+        if self.amenity and service_type in AMENITY_FIELDS:
+            clauses["amenity"] = {AMENITY_FIELDS[service_type]: {"$all": self.amenity}}
+        if self.min_price is not None or self.max_price is not None:
+            price_range: Dict[str, float] = {}
+            if self.min_price is not None:
+                price_range["$gte"] = self.min_price
+            if self.max_price is not None:
+                price_range["$lte"] = self.max_price
+            clauses["price"] = {PRICE_FIELDS[service_type][0]: price_range}
+        for field in CATEGORY_FIELDS.get(service_type, []):
+            if self.categories[field]:
+                clauses[field] = {field: self.categories[field]}
+        return clauses
+
+    def query(self, service_type: str, exclude: Optional[str] = None) -> Dict[str, Any]:
+        query: Dict[str, Any] = {}
+        for name, clause in self.clauses(service_type).items():
+            if name != exclude:
+                query.update(clause)
+        return query
+
+    def signature(self, service_type: str) -> str:
+        return json.dumps(self.clauses(service_type), sort_keys=True, default=str)
+
+def _facet_counts(path: str, match: Dict[str, Any], is_array: bool) -> List[Dict[str, Any]]:
+    stages: List[Dict[str, Any]] = [{"$match": match}] if match else []
+    if is_array:
+        # Count each listing once per distinct value, even if it repeats in the array
+        stages += [
+            {"$project": {"value": {"$setUnion": [{"$ifNull": [f"${path}", []]}, []]}}},
+            {"$unwind": "$value"},
+        ]
+    else:
+        stages.append({"$project": {"value": f"${path}"}})
+    return stages + [
+        {"$group": {"_id": "$value", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": 50},
+    ]
+
+def facet_pipeline(service_type: str, filters: CatalogFilters) -> List[Dict[str, Any]]:
+    # Each facet applies every active filter except its own, so selecting a district
+    # still shows the counts of the other districts
+    location = location_field(service_type)
+    is_tour = service_type == "tour"
+    facets: Dict[str, List[Dict[str, Any]]] = {
+        "total": ([{"$match": filters.query(service_type)}] if filters.query(service_type) else []) + [{"$count": "count"}],
+        "district": _facet_counts(f"{location}.district", filters.query(service_type, "district"), is_tour),
+        "city": _facet_counts(f"{location}.city", filters.query(service_type, "city"), is_tour),
+    }
+    if service_type in AMENITY_FIELDS:
+        facets["amenity"] = _facet_counts(AMENITY_FIELDS[service_type], filters.query(service_type, "amenity"), True)
+    for field in CATEGORY_FIELDS.get(service_type, []):
+        facets[field] = _facet_counts(field, filters.query(service_type, field), False)
+    price_match = filters.query(service_type, "price")
+    facets["price"] = ([{"$match": price_match}] if price_match else []) + [{"$bucket": {
+        "groupBy": f"${PRICE_FIELDS[service_type][0]}",
+        "boundaries": PRICE_BUCKETS[service_type] + [float("inf")],
+        "default": "other",
+        "output": {"count": {"$sum": 1}},
+    }}]
+    return [{"$match": {"available": True}}, {"$facet": facets}]
+
+def format_facets(service_type: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    boundaries = PRICE_BUCKETS[service_type] + [None]
+    formatted: Dict[str, Any] = {
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "facets": {},
+    }
+    for name, buckets in result.items():
+        if name in ("total", "price"):
+            continue
+        formatted["facets"][name] = [{"value": bucket["_id"], "count": bucket["count"]} for bucket in buckets]
+    formatted["facets"]["price"] = [
+        {
+            "min": bucket["_id"],
+            "max": boundaries[boundaries.index(bucket["_id"]) + 1] if bucket["_id"] in boundaries else None,
+            "count": bucket["count"],
+        }
+        for bucket in result["price"]
+        if bucket["_id"] != "other"
+    ]
+    return formatted
+
+class FacetCache:
+    """Facet results per (service type, filter signature), dropped on catalog writes or after a TTL.
+
+    At most `size` entries are kept, least recently used evicted first, since the filter
+    values come straight from anonymous requests.
+    """
+
+    def __init__(self, ttl: float, size: int = FACET_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.entries: OrderedDict = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: tuple, value: Dict[str, Any]):
+        # Only on a miss, after a facet aggregation, so a pass over the entries is cheap by comparison
+        now = time.monotonic()
+        for expired in [key for key, (stored, _) in self.entries.items() if now - stored > self.ttl]:
+            del self.entries[expired]
+        self.entries.pop(key, None)
+        self.entries[key] = (now, value)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, service_type: str):
+        for key in [key for key in self.entries if key[0] == service_type]:
+            del self.entries[key]
+
+facet_cache = FacetCache(FACET_CACHE_TTL_SECONDS, FACET_CACHE_SIZE)
+
+@on_catalog_change
+def invalidate_facets(service_type: str, listing_id: Optional[str], document: Optional[Dict[str, Any]]):
+    facet_cache.invalidate(service_type)
+
+# Listing Cards
+# Denormalized copy of every listing trimmed to what a card shows, kept in step with the
+# catalogs by the change hooks so the homepage can be served from one small collection
+PRICE_UNITS = {
+    "hotel": "night",
+    "car": "day",
+    "event": "ticket",
+    "tour": "person",
+    "real-estate": None,
+}
+CARD_SUMMARY_LENGTH = 160
+HOME_CARDS_PER_TYPE = int(os.environ.get('HOME_CARDS_PER_TYPE', 3))
+# Documents per cursor batch and bulk write when a whole catalog is read
+CATALOG_BATCH_SIZE = 1000
+
+CARD_SOURCE_PROJECTION = {
+    "id": 1,
+    "name": 1,
+    "title": 1,
+    "description": 1,
+    "images": {"$slice": 1},
+    "location": 1,
+    "destinations": {"$slice": 1},
+    "rating": 1,
+    "reviews_count": 1,
+    "available": 1,
+    **{field: 1 for field, _, _ in PRICE_FIELDS.values()},
+}
+
+def listing_card(service_type: str, listing_id: str, document: Dict[str, Any]) -> Dict[str, Any]:
+    location = document.get("location") or (document.get("destinations") or [{}])[0]
+    images = document.get("images") or []
+    position = listing_position(document)
+    return {
+        "id": listing_id,
+        "service_type": service_type,
+        "name": document.get("name") or document.get("title"),
+        "price": document.get(PRICE_FIELDS[service_type][0], 0.0),
+        "price_unit": PRICE_UNITS[service_type],
+        "rating": document.get("rating", 0.0),
+        "reviews_count": document.get("reviews_count", 0),
+        "city": location.get("city"),
+        "district": location.get("district"),
+        "thumbnail": images[0] if images else None,
+        "summary": (document.get("description") or "")[:CARD_SUMMARY_LENGTH],
+        "available": document.get("available", True),
+        # Position for the map clusters; not part of the ListingCard response
+        "geohash": geohash_encode(*position) if position else None,
+        "lat": position[0] if position else None,
+        "lng": position[1] if position else None,
+    }
+
+async def rebuild_listing_cards(service_type: str):
+    # Streamed in batches, so only ids are held for the whole catalog
+    collection = SERVICE_TYPES[service_type][0]
+    seen = set()
+    writes = []
+    async for document in db[collection].find({}, CARD_SOURCE_PROJECTION).batch_size(CATALOG_BATCH_SIZE):
+        document = from_document(document)
+        card = listing_card(service_type, document["id"], document)
+        seen.add(card["id"])
+        writes.append(ReplaceOne({"service_type": service_type, "id": card["id"]}, card, upsert=True))
+        if len(writes) == CATALOG_BATCH_SIZE:
+            await db.listing_cards.bulk_write(writes, ordered=False)
+            writes = []
+    if writes:
+        await db.listing_cards.bulk_write(writes, ordered=False)
+    stale = [
+        card["id"]
+        async for card in db.listing_cards.find({"service_type": service_type}, {"_id": 0, "id": 1})
+        if card["id"] not in seen
+    ]
+    for offset in range(0, len(stale), CATALOG_BATCH_SIZE):
+        await db.listing_cards.delete_many({"service_type": service_type, "id": {"$in": stale[offset:offset + CATALOG_BATCH_SIZE]}})
+
+@on_catalog_change
+async def sync_listing_card(service_type: str, listing_id: Optional[str], document: Optional[Dict[str, Any]]):
+    # The card swapped out is the listing's previous map position, so the clusters move with it
+    if listing_id is None:
+        await rebuild_listing_cards(service_type)
+        await rebuild_map_clusters(service_type)
+    elif document is None:
+        previous = await db.listing_cards.find_one_and_delete({"service_type": service_type, "id": listing_id})
+        await move_map_point(previous, None)
+    else:
+        card = listing_card(service_type, listing_id, document)
+        previous = await db.listing_cards.find_one_and_replace(
+            {"service_type": service_type, "id": listing_id},
+            card,
+            upsert=True,
+        )
+        await move_map_point(previous, card)
+
+def home_pipeline(limit: int) -> List[Dict[str, Any]]:
+    # One aggregation: the top-rated cards of each type, every branch walking the
+    # (service_type, available, rating) index and stopping after `limit` entries
+    def featured(service_type: str) -> List[Dict[str, Any]]:
+        return [
+            {"$match": {"service_type": service_type, "available": True}},
+            {"$sort": {"rating": -1, "id": 1}},
+            {"$limit": limit},
+            {"$project": {"_id": 0, "available": 0}},
+        ]
+
+    first, *rest = SERVICE_TYPES
+    pipeline = featured(first)
+    for service_type in rest:
+        pipeline.append({"$unionWith": {"coll": "listing_cards", "pipeline": featured(service_type)}})
+    return pipeline
+
+async def featured_cards(limit: int) -> Dict[str, List[Dict[str, Any]]]:
+    cards = await catalog_db.listing_cards.aggregate(home_pipeline(limit)).to_list(None)
+    featured: Dict[str, List[Dict[str, Any]]] = {service_type: [] for service_type in SERVICE_TYPES}
+    for card in cards:
+        featured[card["service_type"]].append(card)
+    return featured
+
+# Trending
+# Popularity is an exponentially decayed count of booking events per listing with a half-life
+# of TRENDING_HALF_LIFE_HOURS. Each event adds w * e^((t - epoch) / tau) to the listing's sum,
+# so nothing has to be rewritten as time passes: sums only grow, and their order is the order
+# of the decayed scores at any moment. They are kept as natural logs (folded in with a
+# log-add-exp in the update pipeline) so the exponent never overflows; subtracting
+# (now - epoch) / tau turns one back into booking-equivalents as of now.
+TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 72))
+TRENDING_TAU_SECONDS = TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+TRENDING_EPOCH = datetime(2025, 1, 1)
+TRENDING_WEIGHTS = {"booking": 1.0, "payment": 2.0}
+# Listings whose decayed score drops below this are removed by the lifecycle sweeper
+TRENDING_MIN_SCORE = float(os.environ.get('TRENDING_MIN_SCORE', 0.01))
+# Most popular listings of a type considered for sort=trending before falling back to rating
+TRENDING_CANDIDATES = 300
+CATALOG_PAGE_SIZE = 100
+
+def trending_exponent(at: datetime) -> float:
+    return (at - TRENDING_EPOCH).total_seconds() / TRENDING_TAU_SECONDS
+
+def trending_score(log_score: float, now: datetime) -> float:
+    return round(math.exp(log_score - trending_exponent(now)), 3)
+
+async def record_popularity(service_type: str, service_id: str, event: str):
+    now = datetime.utcnow()
+    added = math.log(TRENDING_WEIGHTS[event]) + trending_exponent(now)
+    # ln(e^a + e^b) = max(a, b) + ln(1 + e^(min(a, b) - max(a, b)))
+    log_score = {"$cond": [
+        {"$eq": [{"$type": "$log_score"}, "missing"]},
+        added,
+        {"$let": {
+            "vars": {"high": {"$max": ["$log_score", added]}, "low": {"$min": ["$log_score", added]}},
+            "in": {"$add": ["$$high", {"$ln": {"$add": [1, {"$exp": {"$subtract": ["$$low", "$$high"]}}]}}]},
+        }},
+    ]}
+    counter = f"{event}s"
+    await db.popularity.update_one(
+        {"service_type": service_type, "service_id": stored_id(service_id)},
+        [{"$set": {
+            "log_score": log_score,
+            counter: {"$add": [{"$ifNull": [f"${counter}", 0]}, 1]},
+            "last_event_at": now,
+        }}],
+        upsert=True,
+    )
+
+def popularity_pipeline(now: datetime) -> List[Dict[str, Any]]:
+    # Seeds popularity from the bookings already on file; every booking counts as created
+    # on its booking_date, and paid ones also as paid then. Terms are taken relative to now
+    # so they cannot overflow, and listings that have decayed away are left out.
+    paid = {"$eq": ["$payment_status", "paid"]}
+    weight = {"$cond": [paid, TRENDING_WEIGHTS["booking"] + TRENDING_WEIGHTS["payment"], TRENDING_WEIGHTS["booking"]]}
+    decay = {"$exp": {"$divide": [{"$subtract": ["$booking_date", now]}, TRENDING_TAU_SECONDS * 1000]}}
+    return [
+        {"$group": {
+            "_id": {"service_type": "$service_type", "service_id": "$service_id"},
+            "score": {"$sum": {"$multiply": [weight, decay]}},
+            "bookings": {"$sum": 1},
+            "payments": {"$sum": {"$cond": [paid, 1, 0]}},
+            "last_event_at": {"$max": "$booking_date"},
+        }},
+        {"$match": {"score": {"$gte": TRENDING_MIN_SCORE}}},
+        {"$project": {
+            "_id": 0,
+            "service_type": "$_id.service_type",
+            "service_id": "$_id.service_id",
+            "log_score": {"$add": [{"$ln": "$score"}, trending_exponent(now)]},
+            "bookings": 1,
+            "payments": 1,
+            "last_event_at": 1,
+        }},
+        {"$merge": {"into": "popularity", "on": ["service_type", "service_id"], "whenMatched": "replace"}},
+    ]
+
+async def find_listings(service_type: str, query: Dict[str, Any], projection: Optional[Dict[str, int]], sort: Optional[str]) -> List[Dict[str, Any]]:
+    collection = catalog_db[SERVICE_TYPES[service_type][0]]
+    if sort is None:
+        return from_documents(await collection.find(query, projection).to_list(CATALOG_PAGE_SIZE))
+    if sort != "trending":
+        raise HTTPException(status_code=400, detail=f"Unknown sort: {sort}")
+
+    # The most popular listings of the type that pass the filters, then the best rated of the rest
+    ranked = from_documents(await catalog_db.popularity.find(
+        {"service_type": service_type}, {"_id": 0, "service_id": 1}
+    ).sort("log_score", -1).to_list(TRENDING_CANDIDATES))
+    rank = {entry["service_id"]: position for position, entry in enumerate(ranked)}
+    listings: List[Dict[str, Any]] = []
+    if rank:
+        listings = from_documents(await collection.find({**query, **ids_filter(list(rank))}, projection).to_list(None))
+        listings.sort(key=lambda listing: rank[listing["id"]])
+        listings = listings[:CATALOG_PAGE_SIZE]
+    if len(listings) < CATALOG_PAGE_SIZE:
+        rest = {**query, ID_FIELD: {"$nin": [stored_id(listing_id) for listing_id in rank]}}
+        listings += from_documents(
+            await collection.find(rest, projection).sort("rating", -1).to_list(CATALOG_PAGE_SIZE - len(listings))
+        )
+    return listings
+
+@on_catalog_change
+async def drop_popularity(service_type: str, listing_id: Optional[str], document: Optional[Dict[str, Any]]):
+    # A deleted listing leaves the trending feed at once instead of decaying out of it
+    if listing_id is not None and document is None:
+        await db.popularity.delete_one({"service_type": service_type, "service_id": stored_id(listing_id)})
+
+# Map Clusters
+# Every catalog document stores the geohash of its position (tours: the first destination)
+# and so does its listing card. map_clusters holds one document per geohash cell for every
+# precision up to MAP_MAX_PRECISION, with a running count, coordinate sums and minimum price
+# per service type. Card writes move a listing between cells incrementally; a tile is then
+# answered from the cells whose centres fall inside it, so its size depends on the zoom
+# level and not on how many listings are on the map.
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PATTERN = re.compile(r"^[0-9b-hjkmnp-z]{1,12}$")
+GEOHASH_PRECISION = 9
+MAP_MAX_PRECISION = int(os.environ.get('MAP_MAX_PRECISION', 8))
+MAP_MAX_ZOOM = 22
+# Cells across one tile at the chosen precision (rows can be up to twice as many)
+MAP_CELLS_PER_TILE = 16
+
+def geohash_encode(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        bounds, value = (lng_range, lng) if even else (lat_range, lat)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits, bounds[0] = bits * 2 + 1, middle
+        else:
+            bits, bounds[1] = bits * 2, middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    # (height, width) in degrees; odd precisions spend the extra bit on longitude
+    lng_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision // 2
+    return 180 / 2 ** lat_bits, 360 / 2 ** lng_bits
+
+def listing_position(document: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    location = document.get("location") or (document.get("destinations") or [{}])[0]
+    coordinates = location.get("coordinates") or {}
+    if coordinates.get("lat") is None or coordinates.get("lng") is None:
+        return None
+    return coordinates["lat"], coordinates["lng"]
+
+def with_geohash(data: Dict[str, Any]) -> Dict[str, Any]:
+    position = listing_position(data)
+    return {**data, "geohash": geohash_encode(*position) if position else None}
+
+def tile_precision(z: int) -> int:
+    # Finest precision whose cells are still at least 1/MAP_CELLS_PER_TILE of the tile width
+    precision = 1
+    while precision < MAP_MAX_PRECISION and math.ceil(5 * (precision + 1) / 2) <= z + math.log2(MAP_CELLS_PER_TILE):
+        precision += 1
+    return precision
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    # (south, west, north, east) of a Web Mercator tile
+    n = 2 ** z
+    west, east = x / n * 360 - 180, (x + 1) / n * 360 - 180
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+def tile_cells(bounds: Tuple[float, float, float, float], precision: int) -> List[str]:
+    # Every cell overlapping the tile; past MAP_MAX_PRECISION that can be a single cell
+    south, west, north, east = bounds
+    height, width = geohash_cell_size(precision)
+    return [
+        geohash_encode(-90 + (row + 0.5) * height, -180 + (column + 0.5) * width, precision)
+        for row in range(math.floor((south + 90) / height), math.ceil((north + 90) / height))
+        for column in range(math.floor((west + 180) / width), math.ceil((east + 180) / width))
+    ]
+
+def map_point(card: Optional[Dict[str, Any]]) -> Optional[tuple]:
+    # What a card contributes to the clusters; unavailable and unplaced listings are left off the map
+    if not card or not card.get("available", True) or not card.get("geohash"):
+        return None
+    return card["geohash"], card["lat"], card["lng"], card["service_type"], card["price"]
+
+async def move_map_point(previous: Optional[Dict[str, Any]], card: Optional[Dict[str, Any]]):
+    old, new = map_point(previous), map_point(card)
+    if old == new:
+        return
+    updates = []
+    if old is not None:
+        geohash, lat, lng, service_type, _ = old
+        for precision in range(1, MAP_MAX_PRECISION + 1):
+            updates.append(UpdateOne({"_id": geohash[:precision]}, {"$inc": {
+                f"types.{service_type}.count": -1,
+                f"types.{service_type}.lat_sum": -lat,
+                f"types.{service_type}.lng_sum": -lng,
+            }}))
+    if new is not None:
+        geohash, lat, lng, service_type, price = new
+        for precision in range(1, MAP_MAX_PRECISION + 1):
+            updates.append(UpdateOne({"_id": geohash[:precision]}, {
+                "$inc": {
+                    f"types.{service_type}.count": 1,
+                    f"types.{service_type}.lat_sum": lat,
+                    f"types.{service_type}.lng_sum": lng,
+                },
+                "$min": {f"types.{service_type}.min_price": price},
+            }, upsert=True))
+    # Ordered, so a listing that stays in a cell is removed before it is added back
+    await db.map_clusters.bulk_write(updates)
+    if old is not None:
+        await settle_map_cells(*old)
+
+async def settle_map_cells(geohash: str, lat: float, lng: float, service_type: str, price: float):
+    cells = [geohash[:precision] for precision in range(1, MAP_MAX_PRECISION + 1)]
+    field = f"types.{service_type}"
+    clusters = {cluster["_id"]: cluster async for cluster in db.map_clusters.find({"_id": {"$in": cells}})}
+    # Finest cell first: only it re-reads the listings, every coarser cell takes the least of its children
+    for cell in reversed(cells):
+        entry = clusters.get(cell, {}).get("types", {}).get(service_type, {})
+        if entry.get("count", 0) <= 0:
+            if cell in clusters:
+                await db.map_clusters.update_one({"_id": cell}, {"$unset": {field: ""}})
+        elif price <= entry.get("min_price", price):
+            # A minimum cannot be decremented; it is recomputed only when the cheapest listing moved
+            if cell == cells[-1]:
+                cheapest = await db.listing_cards.find_one(
+                    {"service_type": service_type, "available": True, "geohash": {"$regex": f"^{cell}"}},
+                    {"price": 1},
+                    sort=[("price", 1)],
+                )
+                min_price = cheapest["price"] if cheapest is not None else None
+            else:
+                children = await db.map_clusters.find(
+                    {"_id": {"$regex": f"^{cell}.$"}, f"{field}.count": {"$gt": 0}},
+                    {f"{field}.min_price": 1},
+                ).to_list(None)
+                min_price = min((child["types"][service_type]["min_price"] for child in children), default=None)
+            if min_price is not None:
+                await db.map_clusters.update_one({"_id": cell}, {"$set": {f"{field}.min_price": min_price}})
+    await db.map_clusters.delete_many({"_id": {"$in": cells}, "types": {}})
+
+async def rebuild_map_clusters(service_type: str):
+    field = f"types.{service_type}"
+    build = uuid.uuid4().hex
+    for precision in range(1, MAP_MAX_PRECISION + 1):
+        pipeline = [
+            {"$match": {"service_type": service_type, "available": True, "geohash": {"$type": "string"}}},
+            {"$group": {
+                "_id": {"$substrCP": ["$geohash", 0, precision]},
+                "count": {"$sum": 1},
+                "lat_sum": {"$sum": "$lat"},
+                "lng_sum": {"$sum": "$lng"},
+                "min_price": {"$min": "$price"},
+            }},
+        ]
+        updates = []
+        async for group in db.listing_cards.aggregate(pipeline, allowDiskUse=True):
+            cell = group.pop("_id")
+            updates.append(UpdateOne({"_id": cell}, {"$set": {field: {**group, "build": build}}}, upsert=True))
+            if len(updates) == 1000:
+                await db.map_clusters.bulk_write(updates, ordered=False)
+                updates = []
+        if updates:
+            await db.map_clusters.bulk_write(updates, ordered=False)
+    # Cells this type no longer occupies
+    await db.map_clusters.update_many({field: {"$exists": True}, f"{field}.build": {"$ne": build}}, {"$unset": {field: ""}})
+    await db.map_clusters.delete_many({"types": {}})
+
+async def backfill_geohashes(collection: str):
+    # Catalog documents written before geohashes were stored
+    updates = []
+    async for document in db[collection].find({"geohash": {"$exists": False}}, {"location.coordinates": 1, "destinations": {"$slice": 1}}):
+        position = listing_position(document)
+        updates.append(UpdateOne({"_id": document["_id"]}, {"$set": {"geohash": geohash_encode(*position) if position else None}}))
+        if len(updates) == 1000:
+            await db[collection].bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db[collection].bulk_write(updates, ordered=False)
+
+def map_cluster(cluster: Dict[str, Any]) -> Optional[MapCluster]:
+    types = {service_type: entry for service_type, entry in cluster.get("types", {}).items() if entry.get("count", 0) > 0}
+    count = sum(entry["count"] for entry in types.values())
+    if count == 0:
+        return None
+    return MapCluster(
+        geohash=cluster["_id"],
+        count=count,
+        centroid={
+            "lat": round(sum(entry["lat_sum"] for entry in types.values()) / count, 6),
+            "lng": round(sum(entry["lng_sum"] for entry in types.values()) / count, 6),
+        },
+        types={service_type: entry["count"] for service_type, entry in types.items()},
+        min_price={service_type: entry["min_price"] for service_type, entry in types.items() if "min_price" in entry},
+    )
+
+# Similar Listings
+# Every available listing gets a feature vector: its amenities/features as a multi-hot over
+# the type's most common values, its categorical fields one-hot, log price standardised
+# within the type, rating, and position in units of SIMILAR_DISTANCE_SCALE_KM. Neighbours
+# are the nearest vectors by Euclidean distance within the same type. Each listing's top
+# SIMILAR_NEIGHBOURS are precomputed in a background thread after each build (and computed
+# on demand for anything not reached yet), so a lookup is an array read; a catalog write
+# re-scores only the changed listing against the rest of its type.
+SIMILAR_NEIGHBOURS = int(os.environ.get('SIMILAR_NEIGHBOURS', 12))
+SIMILAR_PRECOMPUTE = os.environ.get('SIMILAR_PRECOMPUTE', 'true').lower() == 'true'
+SIMILAR_PRECOMPUTE_BLOCK = 32
+SIMILAR_VOCABULARY_SIZE = 64
+SIMILAR_DISTANCE_SCALE_KM = float(os.environ.get('SIMILAR_DISTANCE_SCALE_KM', 50))
+SIMILAR_WEIGHTS = {"tag": 0.5, "category": 1.0, "price": 1.0, "rating": 2.0, "position": 1.0}
+KM_PER_DEGREE = 111.32
+
+SIMILAR_SOURCE_PROJECTION = {
+    "id": 1,
+    "rating": 1,
+    "available": 1,
+    "location.coordinates": 1,
+    "destinations": {"$slice": 1},
+    **{field: 1 for field in AMENITY_FIELDS.values()},
+    **{field: 1 for fields in CATEGORY_FIELDS.values() for field in fields},
+    **{field: 1 for field, _, _ in PRICE_FIELDS.values()},
+}
+
+async def catalog_batches(collection: str, query: Dict[str, Any], projection: Dict[str, Any]):
+    # A whole catalog, CATALOG_BATCH_SIZE documents at a time
+    batch = []
+    async for document in db[collection].find(query, projection).batch_size(CATALOG_BATCH_SIZE):
+        batch.append(from_document(document))
+        if len(batch) == CATALOG_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class SimilarityScale:
+    """Tag counts, category values and price/position statistics of one type, a batch at a time."""
+
+    def __init__(self, service_type: str):
+        self.service_type = service_type
+        self.tag_field = AMENITY_FIELDS.get(service_type)
+        self.price_field = PRICE_FIELDS[service_type][0]
+        self.listings = 0
+        self.tag_counts: CallCounter = CallCounter()
+        self.category_values: Dict[str, set] = {field: set() for field in CATEGORY_FIELDS.get(service_type, [])}
+        self.log_price_sum = 0.0
+        self.log_price_squares = 0.0
+        self.position_sum = np.zeros(2)
+        self.positions = 0
+
+    def update(self, documents: List[Dict[str, Any]]):
+        for document in documents:
+            self.listings += 1
+            if self.tag_field:
+                self.tag_counts.update(set(document.get(self.tag_field) or []))
+            for field, values in self.category_values.items():
+                if document.get(field) is not None:
+                    values.add(str(document[field]))
+            log_price = math.log1p(max(float(document.get(self.price_field) or 0.0), 0.0))
+            self.log_price_sum += log_price
+            self.log_price_squares += log_price * log_price
+            position = listing_position(document)
+            if position:
+                self.position_sum += position
+                self.positions += 1
+
+class SimilarityIndex:
+    """Feature vectors and cached nearest neighbours for the listings of one service type."""
+
+    def __init__(self, service_type: str, documents: List[Dict[str, Any]] = (), scale: Optional[SimilarityScale] = None):
+        # Either the documents themselves, or a scale gathered from them (the documents are
+        # then streamed in with extend)
+        if scale is None:
+            scale = SimilarityScale(service_type)
+            scale.update(documents)
+        self.service_type = service_type
+        self.tag_field = scale.tag_field
+        self.price_field = scale.price_field
+
+        # The vocabulary and scaling are fixed when the index is built; a later full
+        # rebuild picks up tags and price levels introduced since
+        self.tags = {tag: column for column, (tag, _) in enumerate(scale.tag_counts.most_common(SIMILAR_VOCABULARY_SIZE))}
+        self.categories: Dict[tuple, int] = {}
+        for field, values in scale.category_values.items():
+            for value in sorted(values):
+                self.categories[(field, value)] = len(self.tags) + len(self.categories)
+        listings = max(scale.listings, 1)
+        self.price_mean = scale.log_price_sum / listings
+        self.price_std = math.sqrt(max(scale.log_price_squares / listings - self.price_mean ** 2, 0.0)) or 1.0
+        # Listings without coordinates sit at the centre of the others rather than at (0, 0)
+        self.center = tuple(scale.position_sum / scale.positions) if scale.positions else (0.0, 0.0)
+        self.dimensions = len(self.tags) + len(self.categories) + 4
+
+        capacity = max(scale.listings, 16)
+        self.ids: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.free: List[int] = []
+        self.vectors = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        self.norms = np.zeros(capacity, dtype=np.float32)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.cached = np.zeros(capacity, dtype=bool)
+        self.neighbour_rows = np.full((capacity, SIMILAR_NEIGHBOURS), -1, dtype=np.int32)
+        self.neighbour_distances = np.full((capacity, SIMILAR_NEIGHBOURS), np.inf, dtype=np.float32)
+        # Held by every lookup, write and precompute block, all of which run in worker threads
+        self.lock = threading.Lock()
+        self.retired = False
+        self.extend(documents)
+
+    def extend(self, documents: List[Dict[str, Any]]):
+        with self.lock:
+            for document in documents:
+                self._store(document["id"], self.vector(document))
+
+    def vector(self, document: Dict[str, Any]) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for tag in set(document.get(self.tag_field) or []) if self.tag_field else ():
+            if tag in self.tags:
+                vector[self.tags[tag]] = SIMILAR_WEIGHTS["tag"]
+        for field in CATEGORY_FIELDS.get(self.service_type, []):
+            column = self.categories.get((field, str(document.get(field))))
+            if column is not None:
+                vector[column] = SIMILAR_WEIGHTS["category"]
+        base = len(self.tags) + len(self.categories)
+        price = max(float(document.get(self.price_field) or 0.0), 0.0)
+        vector[base] = SIMILAR_WEIGHTS["price"] * (math.log1p(price) - self.price_mean) / self.price_std
+        vector[base + 1] = SIMILAR_WEIGHTS["rating"] * float(document.get("rating") or 0.0) / 5
+        lat, lng = listing_position(document) or self.center
+        vector[base + 2] = SIMILAR_WEIGHTS["position"] * lat * KM_PER_DEGREE / SIMILAR_DISTANCE_SCALE_KM
+        vector[base + 3] = SIMILAR_WEIGHTS["position"] * lng * KM_PER_DEGREE * math.cos(math.radians(lat)) / SIMILAR_DISTANCE_SCALE_KM
+        return vector
+
+    def _store(self, listing_id: str, vector: np.ndarray) -> int:
+        row = self.rows.get(listing_id)
+        if row is None:
+            if self.free:
+                row = self.free.pop()
+                self.ids[row] = listing_id
+            else:
+                row = len(self.ids)
+                self.ids.append(listing_id)
+                if row == len(self.vectors):
+                    self._grow()
+            self.rows[listing_id] = row
+        self.vectors[row] = vector
+        self.norms[row] = vector @ vector
+        self.active[row] = True
+        self.cached[row] = False
+        return row
+
+    def _grow(self):
+        extra = len(self.vectors)
+        self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+        self.norms = np.concatenate([self.norms, np.zeros(extra, dtype=np.float32)])
+        self.active = np.concatenate([self.active, np.zeros(extra, dtype=bool)])
+        self.cached = np.concatenate([self.cached, np.zeros(extra, dtype=bool)])
+        self.neighbour_rows = np.concatenate([self.neighbour_rows, np.full((extra, SIMILAR_NEIGHBOURS), -1, dtype=np.int32)])
+        self.neighbour_distances = np.concatenate([self.neighbour_distances, np.full((extra, SIMILAR_NEIGHBOURS), np.inf, dtype=np.float32)])
+
+    def _distances(self, rows: np.ndarray) -> np.ndarray:
+        # Squared distances from some rows to every row, as |a|^2 + |b|^2 - 2ab in one product
+        count = len(self.ids)
+        distances = np.maximum(
+            self.norms[rows, None] + self.norms[None, :count] - 2 * (self.vectors[rows] @ self.vectors[:count].T), 0
+        )
+        distances[:, ~self.active[:count]] = np.inf
+        distances[np.arange(len(rows)), rows] = np.inf
+        return distances
+
+    def _keep_nearest(self, rows: np.ndarray, distances: np.ndarray):
+        k = min(SIMILAR_NEIGHBOURS, distances.shape[1])
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        nearest = np.take_along_axis(nearest, np.take_along_axis(distances, nearest, axis=1).argsort(axis=1), axis=1)
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+        nearest[~np.isfinite(nearest_distances)] = -1
+        self.neighbour_rows[rows] = -1
+        self.neighbour_distances[rows] = np.inf
+        self.neighbour_rows[rows, :k] = nearest
+        self.neighbour_distances[rows, :k] = nearest_distances
+        self.cached[rows] = True
+
+    def precompute(self):
+        # Runs in a worker thread; NumPy releases the GIL for the products
+        start = 0
+        while start < len(self.ids) and not self.retired:
+            with self.lock:
+                rows = np.arange(start, min(start + SIMILAR_PRECOMPUTE_BLOCK, len(self.ids)))
+                rows = rows[self.active[rows] & ~self.cached[rows]]
+                if len(rows):
+                    self._keep_nearest(rows, self._distances(rows))
+            start += SIMILAR_PRECOMPUTE_BLOCK
+
+    def _holders(self, row: int) -> np.ndarray:
+        count = len(self.ids)
+        return np.flatnonzero(self.cached[:count] & (self.neighbour_rows[:count] == row).any(axis=1))
+
+    def similar(self, listing_id: str, limit: int) -> Optional[List[Tuple[str, float]]]:
+        with self.lock:
+            row = self.rows.get(listing_id)
+            if row is None:
+                return None
+            if not self.cached[row]:
+                rows = np.array([row])
+                self._keep_nearest(rows, self._distances(rows))
+            return [
+                (self.ids[neighbour], round(1 / (1 + math.sqrt(distance)), 4))
+                for neighbour, distance in zip(self.neighbour_rows[row, :limit], self.neighbour_distances[row, :limit])
+                if neighbour >= 0
+            ]
+
+    def upsert(self, document: Dict[str, Any]):
+        with self.lock:
+            row = self._store(document["id"], self.vector(document))
+            # Lists that held the listing are recomputed on their next lookup; lists whose
+            # farthest neighbour it now beats take it in place of that neighbour
+            self.cached[self._holders(row)] = False
+            distances = self._distances(np.array([row]))[0]
+            count = len(self.ids)
+            for other in np.flatnonzero(self.cached[:count] & (distances < self.neighbour_distances[:count, -1])):
+                position = int(np.searchsorted(self.neighbour_distances[other], distances[other]))
+                self.neighbour_rows[other, position + 1:] = self.neighbour_rows[other, position:-1].copy()
+                self.neighbour_distances[other, position + 1:] = self.neighbour_distances[other, position:-1].copy()
+                self.neighbour_rows[other, position] = row
+                self.neighbour_distances[other, position] = distances[other]
+
+    def remove(self, listing_id: str):
+        with self.lock:
+            row = self.rows.pop(listing_id, None)
+            if row is None:
+                return
+            self.cached[self._holders(row)] = False
+            self.ids[row] = None
+            self.active[row] = False
+            self.cached[row] = False
+            self.norms[row] = 0
+            self.free.append(row)
+
+    def stats(self) -> Dict[str, Any]:
+        arrays = (self.vectors, self.norms, self.active, self.cached, self.neighbour_rows, self.neighbour_distances)
+        memory = sum(array.nbytes for array in arrays) + sys.getsizeof(self.ids) + sys.getsizeof(self.rows)
+        memory += sum(sys.getsizeof(listing_id) for listing_id in self.rows)
+        listings = len(self.rows)
+        return {
+            "listings": listings,
+            "dimensions": self.dimensions,
+            "cached_neighbour_lists": int(self.cached.sum()),
+            "memory_bytes": memory,
+            "memory_bytes_per_100k": round(memory * 100000 / listings) if listings else None,
+        }
+
+similarity_indexes: Dict[str, SimilarityIndex] = {}
+similarity_tasks: Dict[str, asyncio.Task] = {}
+
+async def build_similarity_index(service_type: str):
+    # Two passes over the catalog, so neither holds more than a batch of documents: the
+    # vocabulary and scaling first, then the vectors
+    collection = SERVICE_TYPES[service_type][0]
+    query = {"available": True}
+    scale = SimilarityScale(service_type)
+    async for batch in catalog_batches(collection, query, SIMILAR_SOURCE_PROJECTION):
+        scale.update(batch)
+    index = SimilarityIndex(service_type, scale=scale)
+    async for batch in catalog_batches(collection, query, SIMILAR_SOURCE_PROJECTION):
+        await asyncio.to_thread(index.extend, batch)
+    previous = similarity_indexes.get(service_type)
+    if previous is not None:
+        previous.retired = True
+    similarity_indexes[service_type] = index
+    if SIMILAR_PRECOMPUTE:
+        similarity_tasks[service_type] = asyncio.create_task(asyncio.to_thread(index.precompute))
+
+@on_catalog_change
+async def sync_similarity_index(service_type: str, listing_id: Optional[str], document: Optional[Dict[str, Any]]):
+    index = similarity_indexes.get(service_type)
+    if listing_id is None or index is None:
+        await build_similarity_index(service_type)
+    elif document is None or not document.get("available", True):
+        await asyncio.to_thread(index.remove, listing_id)
+    else:
+        await asyncio.to_thread(index.upsert, {**document, "id": listing_id})
+
+# Autocomplete
+# Search-as-you-type over listing names and the places listings are in (city, area and
+# district), served from memory. Text is folded like place_key (case, accents and
+# punctuation ignored) and split into words. A trie over the distinct words finds the ones
+# each typed word starts; when that leaves the page short, a Levenshtein row carried down
+# the trie also admits words a typo or two away (one from 4 characters, two from 8; the
+# first letter is taken as typed). Every word keeps the entries containing it in weight
+# order, so suggestions are the heads of a few lists merged. Weight is popularity: reviews
+# and trending bookings for a listing, the number of listings for a place. Trending scores
+# move without catalog changes, so the lifecycle sweep reweights listings from them.
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
+AUTOCOMPLETE_TRENDING_WEIGHT = 2.0
+AUTOCOMPLETE_PLACE_BONUS = 2.0
+AUTOCOMPLETE_TYPO_PENALTY = 1.5
+AUTOCOMPLETE_CACHE_SIZE = 4096
+# Smaller weight changes on a sweep are not worth re-sorting postings for
+AUTOCOMPLETE_WEIGHT_TOLERANCE = 0.01
+AUTOCOMPLETE_KINDS = ("listing", "place")
+# A place's detail names the place enclosing it
+PLACE_FIELDS = {"area": "city", "city": "district", "district": None}
+
+AUTOCOMPLETE_SOURCE_PROJECTION = {
+    "id": 1,
+    "name": 1,
+    "title": 1,
+    "location": 1,
+    "destinations": 1,
+    "reviews_count": 1,
+    "available": 1,
+}
+
+def allowed_typos(word: str) -> int:
+    return 0 if len(word) < 4 else 1 if len(word) < 8 else 2
+
+class AutocompleteIndex:
+    """Word trie and weight-ordered postings over listing names and places, for all service types."""
+
+    def __init__(self):
+        self.trie: Dict[str, Any] = {}
+        self.words: List[str] = []  # sorted, so the words under a prefix are one slice
+        self.postings: Dict[str, List[Tuple[float, str]]] = {}  # word -> [(-weight, key)] ascending
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.place_counts: Dict[str, int] = CallCounter()
+        self.place_labels: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        self.dirty_places: set = set()
+        self.cache: Dict[tuple, List[Dict[str, Any]]] = {}
+        self.bulk = False
+
+    @classmethod
+    def build(cls, listings: List[Tuple[str, Dict[str, Any], float]]) -> "AutocompleteIndex":
+        index = cls()
+        index.bulk = True
+        index.extend(listings)
+        index.finish_bulk()
+        return index
+
+    def extend(self, listings: List[Tuple[str, Dict[str, Any], float]]):
+        for service_type, document, trending in listings:
+            self.upsert_listing(service_type, document["id"], document, trending)
+
+    def finish_bulk(self):
+        # While bulk loading, postings are appended unsorted and sorted once at the end
+        self.bulk = False
+        for postings in self.postings.values():
+            postings.sort()
+        self._settle_places()
+
+    # Vocabulary
+    def _add_word(self, word: str):
+        node = self.trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = word
+        bisect.insort(self.words, word)
+        self.postings[word] = []
+
+    def _remove_word(self, word: str):
+        path = [self.trie]
+        for char in word:
+            path.append(path[-1][char])
+        del path[-1][""]
+        for depth in range(len(word) - 1, -1, -1):
+            if path[depth + 1]:
+                break
+            del path[depth][word[depth]]
+        del self.words[bisect.bisect_left(self.words, word)]
+        del self.postings[word]
+
+    def _prefixed(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self.words, prefix)
+        return self.words[start:bisect.bisect_left(self.words, prefix + "\uffff", start)]
+
+    # Entries
+    def _put(self, key: str, label: str, weight: float, **fields):
+        self._drop(key)
+        words = set(place_key(label).split())
+        self.entries[key] = {"label": label, "weight": weight, "words": words, **fields}
+        for word in words:
+            if word not in self.postings:
+                self._add_word(word)
+            if self.bulk:
+                self.postings[word].append((-weight, key))
+            else:
+                bisect.insort(self.postings[word], (-weight, key))
+
+    def _drop(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        for word in entry["words"]:
+            postings = self.postings[word]
+            del postings[bisect.bisect_left(postings, (-entry["weight"], key))]
+            if not postings:
+                self._remove_word(word)
+        return entry
+
+    def _count_place(self, key: str, delta: int):
+        self.place_counts[key] += delta
+        self.dirty_places.add(key)
+
+    def _settle_places(self):
+        for key in self.dirty_places:
+            count = self.place_counts[key]
+            if count <= 0:
+                del self.place_counts[key]
+                self._drop(key)
+                continue
+            place_type, label, detail = self.place_labels[key]
+            weight = AUTOCOMPLETE_PLACE_BONUS + math.log1p(count)
+            entry = self.entries.get(key)
+            if entry is None or entry["weight"] != weight:
+                self._put(key, label, weight, kind="place", place_type=place_type, detail=detail)
+        self.dirty_places.clear()
+
+    def upsert_listing(self, service_type: str, listing_id: str, document: Dict[str, Any], trending: float = 0.0):
+        self.remove_listing(service_type, listing_id)
+        if not document.get("available", True):
+            return
+        locations = [document["location"]] if document.get("location") else document.get("destinations") or []
+        places = []
+        for location in locations:
+            for field, enclosing in PLACE_FIELDS.items():
+                name = location.get(field)
+                if name and place_key(name):
+                    # A city and its district often share a name; they are one suggestion
+                    key = f"place:{place_key(name)}"
+                    detail = location.get(enclosing) if enclosing else None
+                    self.place_labels.setdefault(key, (field, name, detail if detail != name else None))
+                    places.append(key)
+        places = list(dict.fromkeys(places))
+        for key in places:
+            self._count_place(key, 1)
+
+        first = locations[0] if locations else {}
+        reviews = math.log1p(document.get("reviews_count") or 0)
+        self._put(
+            f"listing:{service_type}:{listing_id}",
+            document.get("name") or document.get("title") or "",
+            reviews + AUTOCOMPLETE_TRENDING_WEIGHT * math.log1p(trending),
+            kind="listing",
+            reviews=reviews,
+            trending=trending,
+            service_type=service_type,
+            id=listing_id,
+            detail=", ".join(dict.fromkeys(filter(None, [first.get("city"), first.get("district")]))) or None,
+            places=places,
+        )
+        if not self.bulk:
+            self._settle_places()
+            self.cache.clear()
+
+    def remove_listing(self, service_type: str, listing_id: str):
+        entry = self._drop(f"listing:{service_type}:{listing_id}")
+        if entry is None:
+            return
+        for key in entry["places"]:
+            self._count_place(key, -1)
+        if not self.bulk:
+            self._settle_places()
+            self.cache.clear()
+
+    def refresh_trending(self, trending: Dict[str, float]) -> int:
+        """Reweights listings from current trending scores (listing key -> score; absent means 0)."""
+        changed = 0
+        for key, entry in list(self.entries.items()):
+            if entry["kind"] != "listing":
+                continue
+            score = trending.get(key, 0.0)
+            weight = entry["reviews"] + AUTOCOMPLETE_TRENDING_WEIGHT * math.log1p(score)
+            if abs(weight - entry["weight"]) < AUTOCOMPLETE_WEIGHT_TOLERANCE:
+                continue
+            fields = {field: value for field, value in entry.items() if field not in ("label", "weight", "words")}
+            self._put(key, entry["label"], weight, **{**fields, "trending": score})
+            changed += 1
+        if changed:
+            self.cache.clear()
+        return changed
+
+    # Lookup
+    def _matches(self, typed: str, fuzzy: bool) -> Dict[str, int]:
+        # Vocabulary words starting with `typed` (0 edits) or, if fuzzy, within a few edits of doing so
+        matches = {word: 0 for word in self._prefixed(typed)}
+        typos = allowed_typos(typed)
+        if not fuzzy or not typos or typed[0] not in self.trie:
+            return matches
+        stack = [(self.trie[typed[0]], typed[0], [1] + list(range(len(typed))))]
+        while stack:
+            node, prefix, row = stack.pop()
+            if row[-1] <= typos:
+                # Every word under this prefix starts within `row[-1]` edits of the typed word
+                for word in self._prefixed(prefix):
+                    matches.setdefault(word, row[-1])
+                continue
+            for char, child in node.items():
+                if not char:
+                    continue
+                next_row = [row[0] + 1]
+                for column in range(1, len(typed) + 1):
+                    next_row.append(min(
+                        next_row[column - 1] + 1,
+                        row[column] + 1,
+                        row[column - 1] + (typed[column - 1] != char),
+                    ))
+                if min(next_row) <= typos:
+                    stack.append((child, prefix + char, next_row))
+        return matches
+
+    def _suggest(self, typed: List[str], limit: int, kind: Optional[str], service_type: Optional[str], fuzzy: bool) -> List[Dict[str, Any]]:
+        matches = [self._matches(word, fuzzy) for word in typed]
+        if not all(matches):
+            return []
+        # Candidates come from the typed word with the fewest postings, best weight first;
+        # the other typed words only have to match one word of each candidate
+        lead = min(range(len(typed)), key=lambda i: sum(len(self.postings[word]) for word in matches[i]))
+        penalties = {word: AUTOCOMPLETE_TYPO_PENALTY * typos for word, typos in matches[lead].items()}
+        heap = [(self.postings[word][0][0] + penalty, self.postings[word][0][1], word, 0) for word, penalty in penalties.items()]
+        heapq.heapify(heap)
+        wanted = limit if len(typed) == 1 else limit * 3
+        seen = set()
+        scored = []
+        while heap:
+            _, key, word, position = heap[0]
+            postings = self.postings[word]
+            if position + 1 < len(postings):
+                negative, next_key = postings[position + 1]
+                heapq.heapreplace(heap, (negative + penalties[word], next_key, word, position + 1))
+            else:
+                heapq.heappop(heap)
+            if key in seen:
+                continue
+            seen.add(key)
+            entry = self.entries[key]
+            if (kind and entry["kind"] != kind) or (service_type and entry.get("service_type") != service_type):
+                continue
+            typos = 0
+            for i, found in enumerate(matches):
+                common = [found[word] for word in entry["words"] if word in found]
+                if not common:
+                    break
+                typos += min(common)
+            else:
+                scored.append((entry["weight"] - AUTOCOMPLETE_TYPO_PENALTY * typos, key))
+                if len(scored) == wanted:
+                    break
+        scored.sort(key=lambda item: (-item[0], self.entries[item[1]]["label"]))
+        return [self.suggestion(key) for _, key in scored[:limit]]
+
+    def suggest(self, query: str, limit: int, kind: Optional[str] = None, service_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        typed = place_key(query).split()
+        if not typed:
+            return []
+        cache_key = (tuple(typed), limit, kind, service_type)
+        suggestions = self.cache.get(cache_key)
+        if suggestions is None:
+            suggestions = self._suggest(typed, limit, kind, service_type, fuzzy=False)
+            if len(suggestions) < limit:
+                suggestions = self._suggest(typed, limit, kind, service_type, fuzzy=True)
+            if len(self.cache) >= AUTOCOMPLETE_CACHE_SIZE:
+                del self.cache[next(iter(self.cache))]
+            self.cache[cache_key] = suggestions
+        return suggestions
+
+    def suggestion(self, key: str) -> Dict[str, Any]:
+        entry = self.entries[key]
+        return {
+            "kind": entry["kind"],
+            "label": entry["label"],
+            "detail": entry.get("detail"),
+            "service_type": entry.get("service_type"),
+            "id": entry.get("id"),
+            "place_type": entry.get("place_type"),
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "places": len(self.place_counts),
+            "words": len(self.words),
+            "postings": sum(len(postings) for postings in self.postings.values()),
+        }
+
+autocomplete_index = AutocompleteIndex()
+
+async def autocomplete_batches(service_type: str):
+    # The available listings of a type with their trending scores, CATALOG_BATCH_SIZE at a time
+    collection = SERVICE_TYPES[service_type][0]
+    async for documents in catalog_batches(collection, {"available": True}, AUTOCOMPLETE_SOURCE_PROJECTION):
+        popularity = from_documents(await db.popularity.find(
+            {"service_type": service_type, "service_id": {"$in": [stored_id(document["id"]) for document in documents]}},
+            {"_id": 0, "service_id": 1, "log_score": 1},
+        ).to_list(None))
+        now = datetime.utcnow()
+        trending = {entry["service_id"]: trending_score(entry["log_score"], now) for entry in popularity}
+        yield [(service_type, document, trending.get(document["id"], 0.0)) for document in documents]
+
+async def build_autocomplete_index():
+    # Built aside and swapped in, so lookups never see a half-loaded index
+    global autocomplete_index
+    index = AutocompleteIndex()
+    index.bulk = True
+    for service_type in SERVICE_TYPES:
+        async for listings in autocomplete_batches(service_type):
+            await asyncio.to_thread(index.extend, listings)
+    await asyncio.to_thread(index.finish_bulk)
+    autocomplete_index = index
+
+async def refresh_autocomplete_trending() -> int:
+    # Trending scores grow with bookings and decay with time, neither of which is a catalog change
+    now = datetime.utcnow()
+    trending = {}
+    async for entry in db.popularity.find({}, {"_id": 0, "service_type": 1, "service_id": 1, "log_score": 1}).batch_size(CATALOG_BATCH_SIZE):
+        entry = from_document(entry)
+        trending[f"listing:{entry['service_type']}:{entry['service_id']}"] = trending_score(entry["log_score"], now)
+    return autocomplete_index.refresh_trending(trending)
+
+@on_catalog_change
+async def sync_autocomplete_index(service_type: str, listing_id: Optional[str], document: Optional[Dict[str, Any]]):
+    if listing_id is None:
+        await build_autocomplete_index()
+    elif document is None:
+        autocomplete_index.remove_listing(service_type, listing_id)
+    else:
+        entry = await db.popularity.find_one({"service_type": service_type, "service_id": stored_id(listing_id)})
+        trending = trending_score(entry["log_score"], datetime.utcnow()) if entry else 0.0
+        autocomplete_index.upsert_listing(service_type, listing_id, document, trending)
+
+# Catalog Snapshots
+# Pre-serialized, pre-gzipped copies of the anonymous catalog responses, laid out as
+# <catalog>/index.json and <catalog>/<id>.json for nginx to serve with gzip_static.
+# Publishing is off unless SNAPSHOT_DIR is set.
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR')
+SNAPSHOT_CATALOGS = {service_type: catalog for catalog, service_type in CATALOG_PATHS.items()}
+snapshot_task: Optional[asyncio.Task] = None
+
+def write_snapshot(path: Path, body: bytes, fsync: bool = True):
+    # Each file is written beside its target and renamed over it, so nginx only ever
+    # sees a complete old or new version; the .gz goes first so it is never older
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for target, data in (
+        (path.with_name(path.name + ".gz"), gzip.compress(body, compresslevel=9, mtime=0)),
+        (path, body),
+    ):
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".snapshot-")
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(data)
+            if fsync:
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, target)
+
+def write_snapshots(snapshots: List[Tuple[Path, bytes]]):
+    # Bulk republishes skip fsync: a detail file lost in a crash is rewritten on the next start
+    for path, body in snapshots:
+        write_snapshot(path, body, fsync=False)
+
+def remove_snapshot(path: Path):
+    for target in (path, path.with_name(path.name + ".gz")):
+        try:
+            target.unlink()
+        except FileNotFoundError:
+            pass
+
+def snapshot_body(content) -> bytes:
+    # Rendered exactly as the API would render it
+    return JSONResponse(jsonable_encoder(content)).body
+
+async def publish_list_snapshot(service_type: str):
+    collection, model = SERVICE_TYPES[service_type]
+    documents = from_documents(await db[collection].find({"available": True}).to_list(100))
+    body = snapshot_body(build_models(model, documents))
+    path = Path(SNAPSHOT_DIR) / SNAPSHOT_CATALOGS[service_type] / "index.json"
+    await asyncio.to_thread(write_snapshot, path, body)
+
+async def publish_detail_snapshot(service_type: str, listing_id: str):
+    collection, model = SERVICE_TYPES[service_type]
+    path = Path(SNAPSHOT_DIR) / SNAPSHOT_CATALOGS[service_type] / f"{listing_id}.json"
+    document = from_document(await db[collection].find_one(id_filter(listing_id)))
+    if document is None:
+        await asyncio.to_thread(remove_snapshot, path)
+    else:
+        await asyncio.to_thread(write_snapshot, path, snapshot_body(model(**document)))
+
+async def publish_all_detail_snapshots(service_type: str):
+    collection, model = SERVICE_TYPES[service_type]
+    directory = Path(SNAPSHOT_DIR) / SNAPSHOT_CATALOGS[service_type]
+    published = set()
+    async for documents in catalog_batches(collection, {}, None):
+        snapshots = [(directory / f"{listing.id}.json", snapshot_body(listing)) for listing in build_models(model, documents)]
+        await asyncio.to_thread(write_snapshots, snapshots)
+        published.update(path.name for path, _ in snapshots)
+
+    def remove_stale():
+        for path in directory.glob("*.json"):
+            if path.name != "index.json" and path.name not in published:
+                remove_snapshot(path)
+
+    await asyncio.to_thread(remove_stale)
+
+async def publish_home_snapshot():
+    featured = await featured_cards(HOME_CARDS_PER_TYPE)
+    body = snapshot_body({
+        service_type: [ListingCard(**card) for card in cards]
+        for service_type, cards in featured.items()
+    })
+    await asyncio.to_thread(write_snapshot, Path(SNAPSHOT_DIR) / "home" / "index.json", body)
+
+# Registered after sync_listing_card, so the home snapshot sees the updated cards
+@on_catalog_change
+async def publish_snapshots(service_type: str, listing_id: Optional[str], document: Optional[Dict[str, Any]]):
+    if SNAPSHOT_DIR is None:
+        return
+    await publish_list_snapshot(service_type)
+    if listing_id is None:
+        await publish_all_detail_snapshots(service_type)
+    else:
+        await publish_detail_snapshot(service_type, listing_id)
+    await publish_home_snapshot()
+
+# Catalog Change Streams
+STREAM_COLLECTIONS = {
+    "hotels": "hotel",
+    "cars": "car",
+    "events": "event",
+    "tours": "tour",
+    "real_estate": "real-estate",
+    "bookings": "booking",
+}
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_QUEUE_SIZE = 1000
+
+# Only the fields needed to describe a change are shipped; images and reviews stay behind
+STREAM_DOCUMENT_FIELDS = [
+    "_id", "id", "name", "title", "available", "rating",
+    "price_per_night", "price_per_day", "price", "price_per_person",
+    "current_attendees", "max_attendees",
+    "location.district", "destinations.district",
+    "service_type", "service_id", "status",
+]
+CHANGE_STREAM_PIPELINE = [
+    # drop, rename and invalidate events carry no documentKey and end the stream anyway
+    {"$match": {
+        "ns.coll": {"$in": list(STREAM_COLLECTIONS)},
+        "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+    }},
+    {"$project": {
+        "operationType": 1,
+        "ns": 1,
+        "documentKey": 1,
+        **{f"fullDocument.{field}": 1 for field in STREAM_DOCUMENT_FIELDS},
+    }},
+]
+
+def change_event(change: Dict[str, Any]) -> Dict[str, Any]:
+    event_type = STREAM_COLLECTIONS[change["ns"]["coll"]]
+    document = from_document(change.get("fullDocument") or {})
+    location = document.get("location") or (document.get("destinations") or [{}])[0]
+    event = {
+        "token": change["_id"]["_data"],
+        "type": event_type,
+        "operation": change["operationType"],
+        "id": document.get("id"),
+        "document_key": str(change["documentKey"]["_id"]),  # deletes carry no fullDocument
+        "district": location.get("district"),
+    }
+    if event_type == "booking":
+        # Bookings are private; subscribers only learn that a service's availability moved
+        event["service_type"] = document.get("service_type")
+        event["service_id"] = document.get("service_id")
+        event["status"] = document.get("status")
+    else:
+        event["listing"] = {
+            key: value for key, value in document.items()
+            if key not in ("_id", "location", "destinations")
+        }
+    return event
+
+class CatalogChangeBroadcaster:
+    """One shared change stream per process, fanned out to every live subscriber."""
+
+    def __init__(self):
+        self.subscribers: set = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        subscriber: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self.subscribers.add(subscriber)
+        if self.task is None or self.task.done():
+            # A fresh context keeps the stream's getMores out of the first subscriber's trace
+            self.task = asyncio.create_task(self._run(), context=Context())
+        return subscriber
+
+    def unsubscribe(self, subscriber: asyncio.Queue):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def _publish(self, event: Optional[Dict[str, Any]]):
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.put_nowait(event)
+            except asyncio.QueueFull:
+                # A lagging client is disconnected and resumes from its last token
+                self.subscribers.discard(subscriber)
+                while not subscriber.empty():
+                    subscriber.get_nowait()
+                subscriber.put_nowait(None)
+
+    async def _run(self):
+        try:
+            async with db.watch(CHANGE_STREAM_PIPELINE, full_document="updateLookup") as stream:
+                async for change in stream:
+                    self._publish(change_event(change))
+        except PyMongoError:
+            logger.exception("Catalog change stream failed")
+        finally:
+            # Subscribers are told the stream ended however it ended, so they reconnect
+            self._publish(None)
+
+catalog_broadcaster = CatalogChangeBroadcaster()
+lifecycle_task: Optional[asyncio.Task] = None
+change_streams_supported: Optional[bool] = None
+
+async def supports_change_streams() -> bool:
+    # The deployment topology does not change under a running process, so ask once
+    global change_streams_supported
+    if change_streams_supported is None:
+        hello = await client.admin.command("hello")
+        change_streams_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return change_streams_supported
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"id: {event['token']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+async def shared_change_events(subscriber: Optional[asyncio.Queue] = None):
+    if subscriber is None:
+        subscriber = catalog_broadcaster.subscribe()
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if event is None:
+                return
+            yield event
+    finally:
+        catalog_broadcaster.unsubscribe(subscriber)
+
+async def resumed_change_events(resume_token: str):
+    # Resuming clients catch up on their own cursor from the older position, then hand over to
+    # the shared stream at the first event both have seen so reconnects don't each hold a cursor
+    subscriber: Optional[asyncio.Queue] = catalog_broadcaster.subscribe()
+    handoff: Optional[str] = None
+    try:
+        async with db.watch(
+            CHANGE_STREAM_PIPELINE,
+            full_document="updateLookup",
+            resume_after={"_data": resume_token},
+            max_await_time_ms=STREAM_HEARTBEAT_SECONDS * 1000,
+        ) as stream:
+            while stream.alive:
+                if handoff is None and subscriber is not None and not subscriber.empty():
+                    first = subscriber.get_nowait()
+                    if first is None:
+                        # Dropped while catching up, or the shared stream ended; stay on our own cursor
+                        catalog_broadcaster.unsubscribe(subscriber)
+                        subscriber = None
+                    else:
+                        handoff = first["token"]
+                change = await stream.try_next()
+                if change is None:
+                    yield None
+                    continue
+                event = change_event(change)
+                yield event
+                if event["token"] == handoff:
+                    break
+            else:
+                return
+        async for event in shared_change_events(subscriber):
+            yield event
+    finally:
+        if subscriber is not None:
+            catalog_broadcaster.unsubscribe(subscriber)
+
+# Data Lifecycle
+BOOKING_HOLD_MINUTES = float(os.environ.get('BOOKING_HOLD_MINUTES', 30))
+EXPIRED_BOOKING_RETENTION_DAYS = float(os.environ.get('EXPIRED_BOOKING_RETENTION_DAYS', 30))
+TRIP_PLAN_TTL_HOURS = float(os.environ.get('TRIP_PLAN_TTL_HOURS', 72))
+LIFECYCLE_SWEEP_INTERVAL_SECONDS = float(os.environ.get('LIFECYCLE_SWEEP_INTERVAL_SECONDS', 60))
+
+lifecycle_stats: Dict[str, Any] = {
+    "bookings_expired": 0,
+    "bookings_purged": 0,
+    "trip_plans_purged": 0,
+    "popularity_purged": 0,
+    "autocomplete_reweighted": 0,
+    "reclaimed_bytes": {"bookings": 0, "trip_plans": 0, "popularity": 0},
+    "last_sweep_at": None,
+}
+
+async def _average_document_size(collection: str) -> int:
+    try:
+        stats = await db.command("collStats", collection)
+    except OperationFailure:
+        # The collection has not been created yet
+        return 0
+    return int(stats.get("avgObjSize", 0))
+
+async def _purge(collection: str, query: Dict[str, Any]) -> int:
+    average_size = await _average_document_size(collection)
+    result = await db[collection].delete_many(query)
+    reclaimed = result.deleted_count * average_size
+    LIFECYCLE_DOCUMENTS.labels(collection, "purged").inc(result.deleted_count)
+    LIFECYCLE_RECLAIMED_BYTES.labels(collection).inc(reclaimed)
+    lifecycle_stats["reclaimed_bytes"][collection] += reclaimed
+    return result.deleted_count
+
+async def sweep_expired_data():
+    now = datetime.utcnow()
+
+    # Release unpaid holds; the documents stay around for EXPIRED_BOOKING_RETENTION_DAYS
+    released = await db.bookings.update_many(
+        {
+            "payment_status": "pending",
+            "status": "confirmed",
+            "booking_date": {"$lt": now - timedelta(minutes=BOOKING_HOLD_MINUTES)},
+        },
+        {"$set": {"payment_status": "expired", "status": "cancelled", "expired_at": now}},
+    )
+    LIFECYCLE_DOCUMENTS.labels("bookings", "expired").inc(released.modified_count)
+    lifecycle_stats["bookings_expired"] += released.modified_count
+
+    lifecycle_stats["bookings_purged"] += await _purge(
+        "bookings",
+        {"expired_at": {"$lt": now - timedelta(days=EXPIRED_BOOKING_RETENTION_DAYS)}},
+    )
+    lifecycle_stats["trip_plans_purged"] += await _purge("trip_plans", {"expires_at": {"$lt": now}})
+    lifecycle_stats["popularity_purged"] += await _purge(
+        "popularity",
+        {"log_score": {"$lt": math.log(TRENDING_MIN_SCORE) + trending_exponent(now)}},
+    )
+    lifecycle_stats["autocomplete_reweighted"] += await refresh_autocomplete_trending()
+    lifecycle_stats["last_sweep_at"] = now
+
+async def lifecycle_sweeper():
+    while True:
+        try:
+            await sweep_expired_data()
+        except Exception:
+            # One bad sweep must not stop the loop for the rest of the process
+            logger.exception("Lifecycle sweep failed")
+        await asyncio.sleep(LIFECYCLE_SWEEP_INTERVAL_SECONDS)
+
+async def backfill_trip_plan_expiry():
+    # Plans stored before expiry existed get the same TTL, counted from their creation
+    await db.trip_plans.update_many(
+        {"expires_at": {"$exists": False}, "user_id": None},
+        [{"$set": {"expires_at": {"$add": ["$created_at", int(TRIP_PLAN_TTL_HOURS * 3600 * 1000)]}}}],
+    )
+
+# Booking Archive
+# Bookings whose trip ended more than BOOKING_ARCHIVE_AFTER_DAYS ago move out of MongoDB into
+# zstd-compressed Parquet files under BOOKING_ARCHIVE_DIR, one directory per booking month
+# (booking_month=YYYY-MM/part-*.parquet), sorted by user so row-group statistics can skip
+# most of a file for a per-user query. Part files are written beside their target and
+# renamed into place before the bookings are deleted, so a crash leaves a booking in both
+# places at worst, and readers prefer the hot copy. Archiving is off unless
+# BOOKING_ARCHIVE_DIR is set and pyarrow is installed.
+BOOKING_ARCHIVE_DIR = os.environ.get('BOOKING_ARCHIVE_DIR')
+BOOKING_ARCHIVE_AFTER_DAYS = float(os.environ.get('BOOKING_ARCHIVE_AFTER_DAYS', 365))
+BOOKING_ARCHIVE_INTERVAL_HOURS = float(os.environ.get('BOOKING_ARCHIVE_INTERVAL_HOURS', 24))
+BOOKING_ARCHIVE_BATCH = int(os.environ.get('BOOKING_ARCHIVE_BATCH', 20000))
+BOOKING_ARCHIVE_ROW_GROUP = 65536
+BOOKING_ARCHIVE_ENABLED = BOOKING_ARCHIVE_DIR is not None and pa is not None
+
+if pa is not None:
+    BOOKING_ARCHIVE_SCHEMA = pa.schema([
+        ("id", pa.string()),
+        ("user_id", pa.string()),
+        ("service_type", pa.string()),
+        ("service_id", pa.string()),
+        ("service_name", pa.string()),
+        ("booking_date", pa.timestamp("ms")),
+        ("start_date", pa.timestamp("ms")),
+        ("end_date", pa.timestamp("ms")),
+        ("guests", pa.int32()),
+        ("total_price", pa.float64()),
+        ("payment_status", pa.string()),
+        ("payment_intent_id", pa.string()),
+        ("stripe_payment_id", pa.string()),
+        ("status", pa.string()),
+        ("special_requests", pa.string()),
+        ("expired_at", pa.timestamp("ms")),
+    ])
+    BOOKING_ARCHIVE_PARTITIONING = pads.partitioning(pa.schema([("booking_month", pa.string())]), flavor="hive")
+
+archive_stats: Dict[str, Any] = {
+    "runs": 0,
+    "bookings_archived": 0,
+    "last_run_at": None,
+    "last_report": None,
+    "archive": None,
+}
+archive_lock = asyncio.Lock()
+archive_task: Optional[asyncio.Task] = None
+
+class BookingFilters:
+    """Query-string filters for the admin booking search, applied to hot and archived bookings alike."""
+
+    def __init__(
+        self,
+        user_id: Optional[str] = None,
+        service_type: Optional[str] = None,
+        service_id: Optional[str] = None,
+        status: Optional[str] = None,
+        payment_status: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ):
+        self.equal = {
+            "user_id": user_id,
+            "service_type": service_type,
+            "service_id": service_id,
+            "status": status,
+            "payment_status": payment_status,
+        }
+        self.since = since
+        self.until = until
+
+    def query(self) -> Dict[str, Any]:
+        query: Dict[str, Any] = {
+            field: stored_id(value) if field in ID_REFERENCE_FIELDS else value
+            for field, value in self.equal.items() if value is not None
+        }
+        if self.since or self.until:
+            query["booking_date"] = {
+                **({"$gte": self.since} if self.since else {}),
+                **({"$lt": self.until} if self.until else {}),
+            }
+        return query
+
+    def expression(self, since: Optional[datetime] = None):
+        # booking_month bounds let the dataset skip whole partitions before opening a file
+        since = max(filter(None, [self.since, since]), default=None)
+        clauses = [pads.field(field) == value for field, value in self.equal.items() if value is not None]
+        if since:
+            clauses.append(pads.field("booking_month") >= since.strftime("%Y-%m"))
+            clauses.append(pads.field("booking_date") >= pa.scalar(since, pa.timestamp("ms")))
+        if self.until:
+            clauses.append(pads.field("booking_month") <= self.until.strftime("%Y-%m"))
+            clauses.append(pads.field("booking_date") < pa.scalar(self.until, pa.timestamp("ms")))
+        expression = None
+        for clause in clauses:
+            expression = clause if expression is None else expression & clause
+        return expression
+
+def write_archive_parts(directory: Path, bookings: List[Dict[str, Any]]) -> int:
+    months: Dict[str, List[Dict[str, Any]]] = {}
+    for booking in bookings:
+        months.setdefault(booking["booking_date"].strftime("%Y-%m"), []).append(booking)
+    written = 0
+    for month, rows in months.items():
+        partition = directory / f"booking_month={month}"
+        if any(partition.glob("part-*.parquet")):
+            # A run that stopped between the rename and delete_many left these bookings in both places
+            ids = [row["id"] for row in rows]
+            existing = pads.dataset(partition, format="parquet").to_table(columns=["id"], filter=pads.field("id").isin(ids))
+            archived = set(existing.column("id").to_pylist())
+            rows = [row for row in rows if row["id"] not in archived]
+            if not rows:
+                continue
+        rows.sort(key=lambda row: (row["user_id"], row["booking_date"]))
+        table = pa.Table.from_pylist(
+            [{field: row.get(field) for field in BOOKING_ARCHIVE_SCHEMA.names} for row in rows],
+            schema=BOOKING_ARCHIVE_SCHEMA,
+        )
+        partition.mkdir(parents=True, exist_ok=True)
+        # Dot-prefixed files are ignored by dataset discovery until the rename
+        fd, temp_path = tempfile.mkstemp(dir=partition, prefix=".part-", suffix=".parquet")
+        with os.fdopen(fd, "wb") as temp_file:
+            pq.write_table(table, temp_file, compression="zstd", row_group_size=BOOKING_ARCHIVE_ROW_GROUP)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        target = partition / f"part-{uuid.uuid4().hex}.parquet"
+        os.replace(temp_path, target)
+        written += target.stat().st_size
+    return written
+
+def query_archive(directory: Path, filters: BookingFilters, limit: int, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    if not directory.exists():
+        return []
+    dataset = pads.dataset(directory, format="parquet", partitioning=BOOKING_ARCHIVE_PARTITIONING)
+    table = dataset.to_table(columns=BOOKING_ARCHIVE_SCHEMA.names, filter=filters.expression(since))
+    return table.sort_by([("booking_date", "descending")]).slice(0, limit).to_pylist()
+
+def archive_summary(directory: Path) -> Dict[str, Any]:
+    # Row counts come from the Parquet footers; no data pages are read
+    months: Dict[str, int] = {}
+    files = 0
+    size = 0
+    for path in directory.glob("booking_month=*/part-*.parquet"):
+        month = path.parent.name.split("=", 1)[1]
+        months[month] = months.get(month, 0) + pq.ParquetFile(path).metadata.num_rows
+        files += 1
+        size += path.stat().st_size
+    return {"bookings": sum(months.values()), "files": files, "bytes": size, "months": dict(sorted(months.items()))}
+
+async def collection_sizes(collection: str) -> Dict[str, Any]:
+    try:
+        stats = await db.command("collStats", collection)
+    except OperationFailure:
+        return {"count": 0, "size": 0, "storage_size": 0, "index_size": 0, "index_sizes": {}}
+    return {
+        "count": stats.get("count", 0),
+        "size": stats.get("size", 0),
+        "storage_size": stats.get("storageSize", 0),
+        "index_size": stats.get("totalIndexSize", 0),
+        "index_sizes": stats.get("indexSizes", {}),
+    }
+
+async def find_bookings(filters: BookingFilters, limit: int, include_archived: bool = True) -> List[Dict[str, Any]]:
+    hot = from_documents(await db.bookings.find(filters.query()).sort("booking_date", -1).to_list(limit))
+    if not include_archived or not BOOKING_ARCHIVE_ENABLED:
+        return hot
+    # With a full page of hot bookings only archived ones at least as new can still make the cut
+    since = hot[-1]["booking_date"] if len(hot) == limit else None
+    archived = await asyncio.to_thread(query_archive, Path(BOOKING_ARCHIVE_DIR), filters, limit, since)
+    seen = {booking["id"] for booking in hot}
+    bookings = hot + [booking for booking in archived if booking["id"] not in seen]
+    bookings.sort(key=lambda booking: booking["booking_date"], reverse=True)
+    return bookings[:limit]
+
+async def archive_bookings(compact: bool = False) -> Dict[str, Any]:
+    async with archive_lock:
+        now = datetime.utcnow()
+        cutoff = now - timedelta(days=BOOKING_ARCHIVE_AFTER_DAYS)
+        query = {
+            "booking_date": {"$lt": cutoff},
+            "$or": [{"end_date": {"$lt": cutoff}}, {"end_date": None, "start_date": {"$lt": cutoff}}],
+        }
+        directory = Path(BOOKING_ARCHIVE_DIR)
+        before = await collection_sizes("bookings")
+        archived = 0
+        written = 0
+        while True:
+            batch = from_documents(await db.bookings.find(query).to_list(BOOKING_ARCHIVE_BATCH))
+            if not batch:
+                break
+            written += await asyncio.to_thread(write_archive_parts, directory, batch)
+            await db.bookings.delete_many(ids_filter([booking["id"] for booking in batch]))
+            archived += len(batch)
+            LIFECYCLE_DOCUMENTS.labels("bookings", "archived").inc(len(batch))
+        if compact and archived:
+            # Deleted documents leave free space in the data and index files until compacted
+            await db.command("compact", "bookings")
+        after = await collection_sizes("bookings")
+
+        archive_stats["archive"] = await asyncio.to_thread(archive_summary, directory)
+        report = {
+            "cutoff": cutoff,
+            "archived": archived,
+            "archive_bytes_written": written,
+            "hot_before": before,
+            "hot_after": after,
+            "hot_reduction": {
+                field: before[field] - after[field] for field in ("count", "size", "storage_size", "index_size")
+            },
+        }
+        archive_stats["runs"] += 1
+        archive_stats["bookings_archived"] += archived
+        archive_stats["last_run_at"] = now
+        archive_stats["last_report"] = report
+        logger.info("bookings_archived", extra={"archived": archived, "archive_bytes_written": written})
+        return report
+
+async def booking_archiver():
+    while True:
+        try:
+            await archive_bookings()
+        except Exception:
+            logger.exception("Booking archive run failed")
+        await asyncio.sleep(BOOKING_ARCHIVE_INTERVAL_HOURS * 3600)
+
+# Travel Routes
+# Distances between every known place (a gazetteer of towns, beaches and islands, plus each
+# town with listings placed at the centre of its listings) are precomputed as one NumPy
+# matrix. Road distance and time are estimated from the great-circle distance with a
+# detour factor and an average speed. Stops are ordered to minimise road time: exactly
+# for a handful of stops, by nearest neighbour plus 2-opt beyond that.
+EARTH_RADIUS_KM = 6371.0
+ROAD_DETOUR_FACTOR = float(os.environ.get('ROAD_DETOUR_FACTOR', 1.35))
+ROAD_SPEED_KMH = float(os.environ.get('ROAD_SPEED_KMH', 45))
+ROUTE_EXACT_MAX_STOPS = 9
+ROUTE_TWO_OPT_PASSES = 50
+ROUTE_MAX_STOPS = 200
+ROUTE_MAX_DAYS = 90
+ROUTE_CACHE_SIZE = int(os.environ.get('ROUTE_CACHE_SIZE', 1024))
+LISTING_REF_PATTERN = re.compile(r"^(hotel|car|event|tour|real-estate):([0-9a-fA-F-]{36})$")
+
+KNOWN_PLACES = {
+    "Freetown": (8.4657, -13.2317),
+    "Lungi": (8.6164, -13.1955),
+    "Aberdeen": (8.4897, -13.2844),
+    "Lumley": (8.4420, -13.2860),
+    "Hill Station": (8.4555, -13.2520),
+    "Lakka": (8.3970, -13.2600),
+    "River No. 2": (8.3590, -13.2050),
+    "Tokeh": (8.3230, -13.1720),
+    "York": (8.2583, -13.1472),
+    "Kent": (8.1667, -13.1500),
+    "Waterloo": (8.3389, -13.0709),
+    "Banana Islands": (8.1167, -13.2000),
+    "Bunce Island": (8.5697, -13.0408),
+    "Tacugama": (8.4300, -13.2100),
+    "Port Loko": (8.7667, -12.7833),
+    "Kambia": (9.1256, -12.9181),
+    "Makeni": (8.8833, -12.0500),
+    "Magburaka": (8.7167, -11.9500),
+    "Kabala": (9.5833, -11.5500),
+    "Mount Bintumani": (9.1667, -11.1167),
+    "Outamba-Kilimi": (9.7300, -12.4200),
+    "Koidu": (8.6439, -10.9711),
+    "Kailahun": (8.2789, -10.5739),
+    "Kenema": (7.8767, -11.1900),
+    "Gola Rainforest": (7.8000, -10.9000),
+    "Bo": (7.9644, -11.7383),
+    "Tiwai Island": (7.5500, -11.3500),
+    "Moyamba": (8.1606, -12.4333),
+    "Pujehun": (7.3500, -11.7167),
+    "Bonthe": (7.5264, -12.5050),
+    "Turtle Islands": (7.5800, -12.9400),
+}
+
+def place_key(name: str) -> str:
+    # Case, accents and punctuation are ignored: "River No. 2" matches "river no 2"
+    folded = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower()
+    return " ".join(re.findall(r"[a-z0-9]+", folded))
+
+def haversine_matrix(coordinates: np.ndarray) -> np.ndarray:
+    # Pairwise great-circle km between (lat, lng) rows, in one broadcast
+    radians = np.radians(coordinates)
+    lat, lng = radians[:, 0:1], radians[:, 1:2]
+    a = np.sin((lat - lat.T) / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin((lng - lng.T) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def road_estimate(km: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    road_km = km * ROAD_DETOUR_FACTOR
+    return road_km, road_km / ROAD_SPEED_KMH
+
+class TravelMatrix:
+    """Estimated road km and hours between every pair of known places."""
+
+    def __init__(self, places: Dict[str, Tuple[float, float]]):
+        self.names = list(places)
+        self.index = {place_key(name): i for i, name in enumerate(self.names)}
+        self.coordinates = np.array([places[name] for name in self.names], dtype=float).reshape(-1, 2)
+        self.road_km, self.hours = road_estimate(haversine_matrix(self.coordinates))
+
+    def lookup(self, name: str) -> Optional[tuple]:
+        i = self.index.get(place_key(name))
+        if i is None:
+            return None
+        return place_key(name), self.names[i], float(self.coordinates[i, 0]), float(self.coordinates[i, 1])
+
+    def submatrix(self, points: tuple) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        indices = [self.index.get(key) for key, _, _, _ in points]
+        if None in indices:
+            return None
+        grid = np.ix_(indices, indices)
+        return self.road_km[grid], self.hours[grid]
+
+travel_matrix: Optional[TravelMatrix] = None
+
+async def get_travel_matrix() -> TravelMatrix:
+    global travel_matrix
+    if travel_matrix is None:
+        places = dict(KNOWN_PLACES)
+        known = {place_key(name) for name in places}
+        pipeline = [
+            {"$match": {"city": {"$type": "string"}, "lat": {"$type": "number"}}},
+            {"$group": {"_id": "$city", "lat": {"$avg": "$lat"}, "lng": {"$avg": "$lng"}}},
+        ]
+        async for town in catalog_db.listing_cards.aggregate(pipeline):
+            if place_key(town["_id"]) not in known:
+                places[town["_id"]] = (town["lat"], town["lng"])
+        travel_matrix = TravelMatrix(places)
+    return travel_matrix
+
+# Registered after sync_listing_card, so the next rebuild sees the updated cards
+@on_catalog_change
+def invalidate_travel_matrix(service_type: str, listing_id: Optional[str], document: Optional[Dict[str, Any]]):
+    global travel_matrix
+    travel_matrix = None
+
+def _exact_order(hours: np.ndarray) -> List[int]:
+    # Held-Karp over the stops after the first: cost[mask, j] is the shortest path from
+    # stop 0 through the stops in mask, ending at stop j + 1
+    m = len(hours) - 1
+    full = 1 << m
+    cost = np.full((full, m), np.inf)
+    parent = np.full((full, m), -1, dtype=int)
+    for j in range(m):
+        cost[1 << j, j] = hours[0, j + 1]
+    for mask in range(1, full):
+        for j in np.flatnonzero(np.isfinite(cost[mask])):
+            for k in range(m):
+                if mask & (1 << k):
+                    continue
+                candidate = cost[mask, j] + hours[j + 1, k + 1]
+                if candidate < cost[mask | (1 << k), k]:
+                    cost[mask | (1 << k), k] = candidate
+                    parent[mask | (1 << k), k] = j
+    order, mask, j = [], full - 1, int(np.argmin(cost[full - 1]))
+    while j >= 0:
+        order.append(j + 1)
+        mask, j = mask ^ (1 << j), int(parent[mask, j])
+    return [0] + order[::-1]
+
+def _nearest_neighbour(hours: np.ndarray) -> List[int]:
+    visited = np.zeros(len(hours), dtype=bool)
+    visited[0] = True
+    order = [0]
+    for _ in range(len(hours) - 1):
+        nearest = int(np.argmin(np.where(visited, np.inf, hours[order[-1]])))
+        visited[nearest] = True
+        order.append(nearest)
+    return order
+
+def _two_opt(hours: np.ndarray, order: List[int]) -> List[int]:
+    # A zero-cost sink after the last stop lets the open route use the closed-tour move;
+    # for each i every candidate reversal route[i..j] is scored in one vector operation
+    n = len(order)
+    padded = np.zeros((n + 1, n + 1))
+    padded[:n, :n] = hours
+    route = np.array(order + [n])
+    for _ in range(ROUTE_TWO_OPT_PASSES):
+        improved = False
+        for i in range(1, n - 1):
+            a, b = route[i - 1], route[i]
+            c, d = route[i + 1:n], route[i + 2:n + 1]
+            delta = padded[a, c] + padded[b, d] - padded[a, b] - padded[c, d]
+            j = int(np.argmin(delta))
+            if delta[j] < -1e-9:
+                route[i:i + j + 2] = route[i:i + j + 2][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return route[:n].tolist()
+
+def order_stops(hours: np.ndarray) -> List[int]:
+    """Visiting order of an open route that starts at stop 0."""
+    if len(hours) <= 2:
+        return list(range(len(hours)))
+    if len(hours) <= ROUTE_EXACT_MAX_STOPS:
+        return _exact_order(hours)
+    return _two_opt(hours, _nearest_neighbour(hours))
+
+def _pack_stops(leg_hours: List[float], days: int) -> List[List[int]]:
+    # Consecutive stops grouped into at most `days` days, keeping the longest day on the
+    # road as short as possible (binary search on the daily limit, greedy packing)
+    def pack(limit: float) -> List[List[int]]:
+        groups, current, driving = [], [], 0.0
+        for k, hours in enumerate(leg_hours):
+            if current and driving + hours > limit:
+                groups.append(current)
+                current, driving = [], 0.0
+            current.append(k)
+            driving += hours
+        groups.append(current)
+        return groups
+
+    low, high = max(leg_hours), sum(leg_hours)
+    for _ in range(40):
+        middle = (low + high) / 2
+        if len(pack(middle)) <= days:
+            high = middle
+        else:
+            low = middle
+    return pack(high)
+
+def plan_days(labels: List[str], leg_km: List[float], leg_hours: List[float], duration_days: int) -> List[Dict[str, Any]]:
+    # leg_km[k] and leg_hours[k] are the travel into stop k (zero for the first stop)
+    n = len(labels)
+    if duration_days >= n:
+        groups, stay = [[k] for k in range(n)], [1] * n
+        # Spare days go first to the stops at the end of the longest drives
+        ranked = sorted(range(n), key=lambda k: (-leg_hours[k], k))
+        for spare in range(duration_days - n):
+            stay[ranked[spare % n]] += 1
+    else:
+        groups = _pack_stops(leg_hours, duration_days)
+        stay = [1] * len(groups)
+
+    days, day = [], 1
+    for group, length in zip(groups, stay):
+        legs = [
+            {"origin": labels[k - 1], "destination": labels[k], "km": round(leg_km[k], 1), "hours": round(leg_hours[k], 2)}
+            for k in group if k > 0
+        ]
+        days.append({
+            "day": day,
+            "stops": [labels[k] for k in group],
+            "legs": legs,
+            "travel_km": round(sum((leg["km"] for leg in legs), 0.0), 1),
+            "travel_hours": round(sum((leg["hours"] for leg in legs), 0.0), 2),
+        })
+        for extra in range(1, length):
+            days.append({"day": day + extra, "stops": [labels[group[-1]]], "legs": [], "travel_km": 0.0, "travel_hours": 0.0})
+        day += length
+    return days
+
+@lru_cache(maxsize=ROUTE_CACHE_SIZE)
+def solve_route(points: tuple, duration_days: int, keep_order: bool) -> Dict[str, Any]:
+    # points are (key, label, lat, lng); callers pass unordered sets in a canonical order so
+    # every permutation of the same destinations shares one cache entry
+    matrices = travel_matrix.submatrix(points) if travel_matrix is not None else None
+    if matrices is None:
+        matrices = road_estimate(haversine_matrix(np.array([(lat, lng) for _, _, lat, lng in points], dtype=float)))
+    road_km, hours = matrices
+    order = list(range(len(points))) if keep_order else order_stops(hours)
+    labels = [points[k][1] for k in order]
+    leg_km = [0.0] + [float(road_km[a, b]) for a, b in zip(order, order[1:])]
+    leg_hours = [0.0] + [float(hours[a, b]) for a, b in zip(order, order[1:])]
+    return {
+        "stops": labels,
+        "total_km": round(sum(leg_km), 1),
+        "total_hours": round(sum(leg_hours), 2),
+        "days": plan_days(labels, leg_km, leg_hours, duration_days),
+    }
+
+async def resolve_stops(destinations: List[str]) -> Tuple[List[tuple], List[str]]:
+    matrix = await get_travel_matrix()
+    refs = [LISTING_REF_PATTERN.match(destination.strip()) for destination in destinations]
+    wanted = [{"service_type": ref.group(1), "id": ref.group(2)} for ref in refs if ref]
+    cards: Dict[str, Dict[str, Any]] = {}
+    if wanted:
+        async for card in catalog_db.listing_cards.find({"$or": wanted}, {"service_type": 1, "id": 1, "name": 1, "lat": 1, "lng": 1}):
+            cards[f"{card['service_type']}:{card['id']}"] = card
 
-class Event(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    description: str
-    location: Location
-    date: datetime
-    end_date: Optional[datetime] = None
-    images: List[str]
-    category: str  # "Cultural", "Music", "Festival", "Sports"
-    price: float
-    max_attendees: int
-    current_attendees: int = 0
-    organizer: str
-    available: bool = True
-    rating: float = 0.0
-    reviews_count: int = 0
-    reviews: List[Dict[str, Any]] = []
-    contact_info: Dict[str, str] = {}
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    points, unresolved, seen = [], [], set()
+    for destination, ref in zip(destinations, refs):
+        if ref:
+            card = cards.get(ref.group(0))
+            point = (ref.group(0), card["name"], card["lat"], card["lng"]) if card and card.get("lat") is not None else None
+        else:
+            point = matrix.lookup(destination)
+        if point is None:
+            unresolved.append(destination)
+        elif point[0] not in seen:
+            seen.add(point[0])
+            points.append(point)
+    return points, unresolved
 
-class Tour(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    description: str
-    destinations: List[Location]
-    duration_days: int
-    images: List[str]
-    included: List[str]
-    price_per_person: float
-    max_group_size: int
-    difficulty_level: str  # "Easy", "Moderate", "Challenging"
-    tour_type: str  # "Cultural", "Adventure", "Beach", "Historical"
-    available: bool = True
-    rating: float = 0.0
-    reviews_count: int = 0
-    reviews: List[Dict[str, Any]] = []
-    contact_info: Dict[str, str] = {}
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+async def plan_route(destinations: List[str], duration_days: int, keep_order: bool = False) -> RoutePlan:
+    # Checked here so the trip planner is bounded the same way as /routes/plan
+    if not 1 <= len(destinations) <= ROUTE_MAX_STOPS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {ROUTE_MAX_STOPS} destinations per route")
+    if not 1 <= duration_days <= ROUTE_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"duration_days must be between 1 and {ROUTE_MAX_DAYS}")
+    points, unresolved = await resolve_stops(destinations)
+    if not points:
+        return RoutePlan(stops=[], total_km=0.0, total_hours=0.0, days=[], unresolved=unresolved)
+    if not keep_order:
+        # The first destination stays the starting point; the rest are a set
+        points = [points[0]] + sorted(points[1:])
+    plan = await asyncio.to_thread(solve_route, tuple(points), duration_days, keep_order)
+    return RoutePlan(**plan, unresolved=unresolved)
 
-class RealEstate(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    title: str
-    description: str
-    location: Location
-    property_type: str  # "House", "Apartment", "Land", "Commercial"
-    listing_type: str  # "Sale", "Rent"
-    price: float
-    bedrooms: Optional[int] = None
-    bathrooms: Optional[int] = None
-    area_sqm: Optional[float] = None
-    images: List[str]
-    features: List[str]
-    available: bool = True
-    contact_info: Dict[str, str]
-    rating: float = 0.0
-    reviews_count: int = 0
-    reviews: List[Dict[str, Any]] = []
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+# LLM Client
+# Every completion runs against a deadline, first on LLM_PRIMARY_MODEL and then on each of
+# LLM_FALLBACK_MODELS in turn ("provider:model"; emergentintegrations routes the provider
+# name, and the key is read from <PROVIDER>_API_KEY, else the universal EMERGENT_LLM_KEY).
+# A model that has not answered within the LLM_HEDGE_PERCENTILE of its recent latencies
+# gets a duplicate request and the first answer wins, so one stalled response costs a p95
+# wait instead of a full timeout. After LLM_BREAKER_FAILURES consecutive failed
+# attempts a model's breaker opens and it is skipped for LLM_BREAKER_COOLDOWN_SECONDS, after
+# which one probe at a time is let through until a success closes it.
+LLM_PRIMARY_MODEL = os.environ.get('LLM_PRIMARY_MODEL', 'openai:gpt-4o-mini')
+LLM_FALLBACK_MODELS = [model for model in os.environ.get('LLM_FALLBACK_MODELS', 'openai:gpt-4.1-mini').split(',') if model]
+# Whole trip-plan budget across models; each model gets at most LLM_ATTEMPT_TIMEOUT_SECONDS of it
+LLM_DEADLINE_SECONDS = float(os.environ.get('LLM_DEADLINE_SECONDS', 40))
+LLM_ATTEMPT_TIMEOUT_SECONDS = float(os.environ.get('LLM_ATTEMPT_TIMEOUT_SECONDS', 25))
+LLM_HEDGE_PERCENTILE = float(os.environ.get('LLM_HEDGE_PERCENTILE', 95))
+# Requests in flight per attempt, the original included; 1 turns hedging off
+LLM_HEDGE_REQUESTS = int(os.environ.get('LLM_HEDGE_REQUESTS', 2))
+LLM_HEDGE_MIN_SECONDS = 1.0
+# Hedge delay until a model has LLM_HEDGE_MIN_SAMPLES latencies of its own
+LLM_HEDGE_DEFAULT_SECONDS = 12.0
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_LATENCY_WINDOW = 200
+LLM_BREAKER_FAILURES = int(os.environ.get('LLM_BREAKER_FAILURES', 5))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.environ.get('LLM_BREAKER_COOLDOWN_SECONDS', 60))
 
-class BookingRequest(BaseModel):
-    service_type: str  # "hotel", "car", "event", "tour"
-    service_id: str
-    start_date: str
-    end_date: Optional[str] = None
-    guests: int = 1
-    special_requests: Optional[str] = None
+def llm_api_key(provider: str) -> str:
+    key = os.environ.get(f"{provider.upper()}_API_KEY") or os.environ.get('EMERGENT_LLM_KEY')
+    if not key:
+        raise RuntimeError(f"No API key configured for LLM provider {provider}")
+    return key
 
-class Booking(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    service_type: str  # "hotel", "car", "event", "tour"
-    service_id: str
-    service_name: str
-    booking_date: datetime = Field(default_factory=datetime.utcnow)
-    start_date: datetime
-    end_date: Optional[datetime] = None
-    guests: int = 1
-    total_price: float
-    payment_status: str = "pending"  # "pending", "paid", "refunded"
-    payment_intent_id: Optional[str] = None
-    stripe_payment_id: Optional[str] = None
-    status: str = "confirmed"  # "confirmed", "cancelled"
-    special_requests: Optional[str] = None
+class LlmUnavailable(Exception):
+    """No model answered before the deadline, or every breaker is open."""
 
-class PaymentRequest(BaseModel):
-    booking_id: str
-    amount: float
-    currency: str = "usd"
+class CircuitBreaker:
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
 
-class TripPlan(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_query: str
-    destinations: List[str]
-    duration_days: int
-    budget: Optional[float] = None
-    preferences: List[str]
-    suggested_hotels: List[str]
-    suggested_cars: List[str]
-    suggested_tours: List[str]
-    suggested_events: List[str]
-    total_estimated_cost: float
-    itinerary: Dict[str, Any]
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
 
-# Utility Functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.cooldown:
+            return False
+        # Half-open: this call is the probe, and the next one waits out another cooldown
+        # (so a probe that never reports back cannot hold the breaker open for good)
+        self.opened_at = now
+        return True
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    def record(self, succeeded: bool):
+        if succeeded:
+            self.failures = 0
+            self.opened_at = None
+        else:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
 
-def create_access_token(data: dict) -> str:
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
+class LlmClient:
+    """Deadlines, hedged requests, failover and circuit breaking around LlmChat."""
 
-async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid authentication")
-        
-        user = await db.users.find_one({"id": user_id})
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
-        
-        return user
-    except jwt.PyJWTError:
-        raise HTTPException(status_code=401, detail="Invalid authentication")
+    def __init__(
+        self,
+        models: List[str],
+        attempt_timeout: float = LLM_ATTEMPT_TIMEOUT_SECONDS,
+        hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+        hedge_requests: int = LLM_HEDGE_REQUESTS,
+        hedge_min: float = LLM_HEDGE_MIN_SECONDS,
+        hedge_default: float = LLM_HEDGE_DEFAULT_SECONDS,
+        breaker_failures: int = LLM_BREAKER_FAILURES,
+        breaker_cooldown: float = LLM_BREAKER_COOLDOWN_SECONDS,
+    ):
+        self.models = models
+        self.attempt_timeout = attempt_timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_requests = hedge_requests
+        self.hedge_min = hedge_min
+        self.hedge_default = hedge_default
+        self.breakers = {model: CircuitBreaker(breaker_failures, breaker_cooldown) for model in models}
+        # Seconds taken by recent attempts, per model
+        self.latencies: Dict[str, deque] = {model: deque(maxlen=LLM_LATENCY_WINDOW) for model in models}
+        self.counts: Dict[str, CallCounter] = {model: CallCounter() for model in models}
 
-async def verify_admin(user = Depends(verify_token)):
-    if user.get("user_type") != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
-    return user
+    def hedge_delay(self, model: str) -> float:
+        samples = self.latencies[model]
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return self.hedge_default
+        return max(self.hedge_min, float(np.percentile(samples, self.hedge_percentile)))
+
+    async def _send(self, model: str, system_message: str, text: str) -> str:
+        provider, name = model.split(":", 1)
+        chat = LlmChat(
+            api_key=llm_api_key(provider),
+            session_id=f"llm_{uuid.uuid4()}",
+            system_message=system_message
+        ).with_model(provider, name)
+        with track_upstream("llm", model):
+            return await chat.send_message(UserMessage(text=text))
+
+    async def _hedged(self, model: str, system_message: str, text: str, timeout: float) -> str:
+        # One latency sample per attempt, timed from the first request: a hedged or timed-out
+        # attempt contributes the time its first request had been waiting as a lower bound, so
+        # the slow requests that define the percentile are not left out of the window
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + timeout
+        hedge_at = start + self.hedge_delay(model)
+        first = asyncio.create_task(self._send(model, system_message, text))
+        pending = {first}
+        sent = 1
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    self.latencies[model].append(now - start)
+                    raise asyncio.TimeoutError()
+                wake = min(deadline, hedge_at) if sent < self.hedge_requests else deadline
+                done, pending = await asyncio.wait(pending, timeout=wake - now, return_when=asyncio.FIRST_COMPLETED)
+                failed = [task for task in done if task.exception() is not None]
+                for task in done:
+                    if task not in failed:
+                        self.latencies[model].append(loop.time() - start)
+                        if sent > 1:
+                            LLM_HEDGES.labels(model, "lost" if task is first else "won").inc()
+                        return task.result()
+                if failed:
+                    error = failed[0].exception()
+                # A request that fails outright is not hedged; the caller fails over instead
+                if not done and sent < self.hedge_requests and loop.time() >= hedge_at:
+                    pending.add(asyncio.create_task(self._send(model, system_message, text)))
+                    sent += 1
+                    self.counts[model]["hedges"] += 1
+                    # Further hedges are spaced by the same delay rather than all fired at once
+                    hedge_at = loop.time() + self.hedge_delay(model)
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def complete(self, system_message: str, text: str, deadline: float) -> Tuple[str, str]:
+        """Returns (response, model) or raises LlmUnavailable."""
+        loop = asyncio.get_running_loop()
+        end = loop.time() + deadline
+        for model in self.models:
+            remaining = end - loop.time()
+            if remaining <= 0:
+                break
+            breaker = self.breakers[model]
+            if not breaker.allow():
+                outcome = "rejected"
+            else:
+                try:
+                    response = await self._hedged(model, system_message, text, min(remaining, self.attempt_timeout))
+                except asyncio.TimeoutError:
+                    outcome = "timeout"
+                except Exception as e:
+                    outcome = "error"
+                    logger.warning("llm_call_failed", extra={"model": model, "error": str(e)})
+                else:
+                    outcome = "success"
+                breaker.record(outcome == "success")
+                LLM_CIRCUIT_OPEN.labels(model).set(breaker.opened_at is not None)
+            self.counts[model][outcome] += 1
+            LLM_CALLS.labels(model, outcome).inc()
+            if outcome == "success":
+                return response, model
+        raise LlmUnavailable("No LLM model answered in time")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            model: {
+                "state": self.breakers[model].state,
+                "consecutive_failures": self.breakers[model].failures,
+                "latency_samples": len(self.latencies[model]),
+                "p50_s": round(float(np.percentile(self.latencies[model], 50)), 2) if self.latencies[model] else None,
+                "hedge_after_s": round(self.hedge_delay(model), 2),
+                **self.counts[model],
+            }
+            for model in self.models
+        }
+
+llm_client = LlmClient([LLM_PRIMARY_MODEL, *LLM_FALLBACK_MODELS])
+
+# Degraded Trip Plans
+# While no model answers, a trip is planned from the last LLM itinerary written for the same
+# stops and duration (kept in memory), or else assembled from the listing cards: each day's
+# route, the best rated hotel where it ends, and the best rated tours and events on the way.
+TRIP_PLAN_CACHE_SIZE = 512
+CATALOG_PLAN_ACTIVITIES = 2  # tours/events suggested per day
+
+trip_plan_cache: Dict[tuple, str] = {}
+trip_plan_stats: Dict[str, int] = {"llm": 0, "cache": 0, "catalog": 0}
+
+def trip_plan_cache_key(destinations: List[str], duration: int) -> tuple:
+    return tuple(place_key(destination) for destination in destinations), duration
+
+def cache_trip_plan(key: tuple, response: str):
+    trip_plan_cache.pop(key, None)
+    if len(trip_plan_cache) >= TRIP_PLAN_CACHE_SIZE:
+        del trip_plan_cache[next(iter(trip_plan_cache))]
+    trip_plan_cache[key] = response
+
+def describe_card(card: Dict[str, Any]) -> str:
+    price = f"${card['price']:,.0f}" + (f"/{card['price_unit']}" if card.get("price_unit") else "")
+    return f"{card['name']} ({price}, rated {card.get('rating', 0):.1f})"
+
+async def catalog_trip_plan(route: RoutePlan, destinations: List[str], duration: int) -> Tuple[str, Dict[str, List[str]]]:
+    keys = {place_key(destination) for destination in destinations}
+    cards = await catalog_db.listing_cards.find(
+        {
+            "service_type": {"$in": ["hotel", "tour", "event"]},
+            "available": True,
+            "$or": [{"city": {"$in": destinations}}, {"district": {"$in": destinations}}],
+        },
+        {"_id": 0, "service_type": 1, "id": 1, "name": 1, "price": 1, "price_unit": 1, "rating": 1, "city": 1, "district": 1},
+    ).sort("rating", -1).to_list(300)
+    # Best rated first within every (place, type)
+    by_place: Dict[tuple, List[Dict[str, Any]]] = {}
+    for card in cards:
+        for key in {place_key(card.get("city") or ""), place_key(card.get("district") or "")} & keys:
+            by_place.setdefault((key, card["service_type"]), []).append(card)
+
+    suggested: Dict[str, List[str]] = {"hotel": [], "tour": [], "event": []}
+    days = [(day.day, day.stops, day.travel_hours) for day in route.days]
+    if not days:
+        days = [(number + 1, [destination], 0.0) for number, destination in enumerate(destinations[:duration])]
+    lines = [f"{duration}-day itinerary assembled from Explore Sierra listings."]
+    for number, stops, travel_hours in days:
+        lines.append("")
+        lines.append(f"Day {number}: {' -> '.join(stops)}" + (f" ({travel_hours:.1f} h by road)" if travel_hours else ""))
+        hotels = by_place.get((place_key(stops[-1]), "hotel"), []) if stops else []
+        if hotels:
+            lines.append(f"- Stay: {describe_card(hotels[0])}")
+            if hotels[0]["id"] not in suggested["hotel"]:
+                suggested["hotel"].append(hotels[0]["id"])
+        activities = [
+            card
+            for stop in stops
+            for service_type in ("tour", "event")
+            for card in by_place.get((place_key(stop), service_type), [])
+            if card["id"] not in suggested[card["service_type"]]
+        ]
+        for card in sorted(activities, key=lambda card: -card.get("rating", 0))[:CATALOG_PLAN_ACTIVITIES]:
+            lines.append(f"- {'Tour' if card['service_type'] == 'tour' else 'Event'}: {describe_card(card)}")
+            suggested[card["service_type"]].append(card["id"])
+    if route.unresolved:
+        lines.append("")
+        lines.append(f"Not on the route map: {', '.join(route.unresolved)}")
+    return "\n".join(lines), suggested
 
 # AI Trip Planner
-async def generate_trip_plan(query: str, destinations: List[str], duration: int, budget: Optional[float] = None) -> TripPlan:
-    # Initialize AI chat
-    chat = LlmChat(
-        api_key=os.environ['OPENAI_API_KEY'],
-        session_id=f"trip_plan_{uuid.uuid4()}",
-        system_message="""You are an expert Sierra Leone travel assistant. Create detailed trip plans for visitors to Sierra Leone, 
+TRIP_PLANNER_SYSTEM_MESSAGE = """You are an expert Sierra Leone travel assistant. Create detailed trip plans for visitors to Sierra Leone, 
         focusing on authentic experiences, local culture, beautiful beaches, historical sites, and adventure activities. 
         Provide practical recommendations for hotels, transportation, tours, and events specific to Sierra Leone."""
-    ).with_model("openai", "gpt-4o-mini")
+
+async def generate_trip_plan(query: str, destinations: List[str], duration: int, budget: Optional[float] = None) -> TripPlan:
+    # Order the destinations by road time before asking for the itinerary
+    route = await plan_route(destinations, duration)
+    destinations = route.stops + route.unresolved
+    route_outline = "; ".join(
+        f"Day {day.day}: {' -> '.join(day.stops)}" + (f" ({day.travel_hours:.1f} h by road)" if day.travel_hours else "")
+        for day in route.days
+    )
     
     # Create user message for trip planning
-    user_message = UserMessage(
-        text=f"""Plan a {duration}-day trip to Sierra Leone with the following details:
+    prompt = f"""Plan a {duration}-day trip to Sierra Leone with the following details:
         - Destinations: {', '.join(destinations)}
+        - Suggested route: {route_outline or 'Not available'}
         - Budget: ${budget if budget else 'Not specified'}
         - User query: {query}
         
@@ -270,10 +3929,30 @@ async def generate_trip_plan(query: str, destinations: List[str], duration: int,
         
         Focus on authentic Sierra Leone experiences including beaches like Tokeh and River No. 2, 
         cultural sites in Freetown, Banana Islands, Bunce Island, and local markets."""
-    )
     
-    # Get AI response
-    response = await chat.send_message(user_message)
+    # Get AI response, or a degraded plan when no model answers in time
+    cache_key = trip_plan_cache_key(destinations, duration)
+    suggested: Dict[str, List[str]] = {"hotel": [], "tour": [], "event": []}
+    model = None
+    start = time.perf_counter()
+    try:
+        response, model = await llm_client.complete(TRIP_PLANNER_SYSTEM_MESSAGE, prompt, LLM_DEADLINE_SECONDS)
+        source = "llm"
+        cache_trip_plan(cache_key, response)
+    except LlmUnavailable:
+        response = trip_plan_cache.get(cache_key)
+        source = "cache"
+        if response is None:
+            response, suggested = await catalog_trip_plan(route, destinations, duration)
+            source = "catalog"
+    trip_plan_stats[source] += 1
+    TRIP_PLANS_GENERATED.labels(source).inc()
+    logger.info("trip_plan_generated", extra={
+        "llm_ms": round((time.perf_counter() - start) * 1000, 1),
+        "response_chars": len(response),
+        "source": source,
+        "model": model,
+    })
     
     # Create trip plan object
     trip_plan = TripPlan(
@@ -282,12 +3961,13 @@ async def generate_trip_plan(query: str, destinations: List[str], duration: int,
         duration_days=duration,
         budget=budget,
         preferences=[],
-        suggested_hotels=[],
+        suggested_hotels=suggested["hotel"],
         suggested_cars=[],
-        suggested_tours=[],
-        suggested_events=[],
+        suggested_tours=suggested["tour"],
+        suggested_events=suggested["event"],
         total_estimated_cost=budget or 1000,
-        itinerary={"ai_generated_plan": response}
+        # source: "llm" (and the model that answered), "cache" or "catalog"
+        itinerary={"ai_generated_plan": response, "route": route.dict(), "source": source, "model": model}
     )
     
     return trip_plan
@@ -310,7 +3990,7 @@ async def signup(user_data: UserSignup):
         phone=user_data.phone
     )
     
-    await db.users.insert_one(user.dict())
+    await db.users.insert_one(to_document(user.dict()))
     
     # Create access token
     access_token = create_access_token({"sub": user.id, "email": user.email})
@@ -331,7 +4011,7 @@ async def login(login_data: UserLogin):
     # Check for hardcoded admin credentials
     if login_data.email == "sierraexplorenow@gmail.com" and login_data.password == "Sierraexplore@24":
         # Create or update admin user
-        admin_user = await db.users.find_one({"email": login_data.email})
+        admin_user = from_document(await db.users.find_one({"email": login_data.email}))
         if not admin_user:
             admin_user = User(
                 email=login_data.email,
@@ -339,7 +4019,7 @@ async def login(login_data: UserLogin):
                 full_name="Sierra Explore Admin",
                 user_type="admin"
             )
-            await db.users.insert_one(admin_user.dict())
+            await db.users.insert_one(to_document(admin_user.dict()))
         else:
             # Update to admin if not already
             await db.users.update_one(
@@ -363,7 +4043,7 @@ async def login(login_data: UserLogin):
         }
     
     # Find user
-    user = await db.users.find_one({"email": login_data.email})
+    user = from_document(await db.users.find_one({"email": login_data.email}))
     if not user or not verify_password(login_data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
@@ -381,196 +4061,524 @@ async def login(login_data: UserLogin):
         }
     }
 
+# Facet Routes (registered before the /{type}/{id} detail routes)
+@api_router.get("/{catalog}/facets")
+async def get_catalog_facets(catalog: str, filters: CatalogFilters = Depends()):
+    if catalog not in CATALOG_PATHS:
+        raise HTTPException(status_code=404, detail="Catalog not found")
+    service_type = CATALOG_PATHS[catalog]
+    cache_key = (service_type, filters.signature(service_type))
+    cached = facet_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    collection = SERVICE_TYPES[service_type][0]
+    result = await catalog_db[collection].aggregate(facet_pipeline(service_type, filters)).to_list(1)
+    facets = format_facets(service_type, result[0])
+    facet_cache.set(cache_key, facets)
+    return facets
+
+# Similar Listings Route
+@api_router.get("/{catalog}/{listing_id}/similar", response_model=List[SimilarListing])
+async def get_similar_listings(catalog: str, listing_id: str, limit: int = Query(6, ge=1, le=SIMILAR_NEIGHBOURS)):
+    if catalog not in CATALOG_PATHS:
+        raise HTTPException(status_code=404, detail="Catalog not found")
+    service_type = CATALOG_PATHS[catalog]
+    index = similarity_indexes.get(service_type)
+    neighbours = await asyncio.to_thread(index.similar, listing_id, limit) if index is not None else None
+    if neighbours is None:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    scores = dict(neighbours)
+    cards = await catalog_db.listing_cards.find(
+        {"service_type": service_type, "id": {"$in": list(scores)}}, {"_id": 0}
+    ).to_list(None)
+    cards.sort(key=lambda card: -scores[card["id"]])
+    return [SimilarListing(**card, score=scores[card["id"]]) for card in cards]
+
+# Autocomplete Route
+@api_router.get("/autocomplete", response_model=List[AutocompleteSuggestion])
+async def get_autocomplete(
+    q: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(AUTOCOMPLETE_LIMIT, ge=1, le=AUTOCOMPLETE_MAX_LIMIT),
+    kind: Optional[str] = None,
+    catalog: Optional[str] = None
+):
+    if kind is not None and kind not in AUTOCOMPLETE_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown kind: {kind}")
+    if catalog is not None and catalog not in CATALOG_PATHS:
+        raise HTTPException(status_code=404, detail="Catalog not found")
+    return autocomplete_index.suggest(q, limit, kind, CATALOG_PATHS.get(catalog))
+
+# Trending Route
+@api_router.get("/trending", response_model=List[TrendingListing])
+async def get_trending(catalog: Optional[str] = None, limit: int = Query(20, ge=1, le=100)):
+    query: Dict[str, Any] = {}
+    if catalog is not None:
+        if catalog not in CATALOG_PATHS:
+            raise HTTPException(status_code=404, detail="Catalog not found")
+        query["service_type"] = CATALOG_PATHS[catalog]
+    # Over-fetch a little: some of the most popular listings may since have been withdrawn
+    entries = from_documents(await catalog_db.popularity.find(query, {"_id": 0}).sort("log_score", -1).to_list(limit * 2))
+    if not entries:
+        return []
+    cards = await catalog_db.listing_cards.find(
+        {"$or": [{"service_type": entry["service_type"], "id": entry["service_id"]} for entry in entries], "available": True},
+        {"_id": 0},
+    ).to_list(None)
+    cards_by_key = {(card["service_type"], card["id"]): card for card in cards}
+    now = datetime.utcnow()
+    trending = []
+    for entry in entries:
+        card = cards_by_key.get((entry["service_type"], entry["service_id"]))
+        if card is not None:
+            trending.append(TrendingListing(
+                **card,
+                trending_score=trending_score(entry["log_score"], now),
+                bookings=entry.get("bookings", 0),
+                payments=entry.get("payments", 0),
+            ))
+    return trending[:limit]
+
+# Home Route
+@api_router.get("/home", response_model=Dict[str, List[ListingCard]])
+async def get_home(limit: int = Query(HOME_CARDS_PER_TYPE, ge=1, le=24)):
+    return await featured_cards(limit)
+
+# Map Routes
+@api_router.get("/map/tiles/{z}/{x}/{y}", response_model=MapTile)
+async def get_map_tile(z: int, x: int, y: int):
+    if not 0 <= z <= MAP_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Tile out of range")
+    precision = tile_precision(z)
+    south, west, north, east = bounds = tile_bounds(z, x, y)
+    documents = await catalog_db.map_clusters.find({"_id": {"$in": tile_cells(bounds, precision)}}).to_list(None)
+    # A cluster belongs to the tile holding its centroid, so neighbouring tiles never repeat it
+    clusters = [
+        cluster for cluster in map(map_cluster, documents)
+        if cluster is not None
+        and south <= cluster.centroid["lat"] < north and west <= cluster.centroid["lng"] < east
+    ]
+    clusters.sort(key=lambda cluster: cluster.geohash)
+    return MapTile(z=z, x=x, y=y, precision=precision, clusters=clusters)
+
 # Hotels Routes
 @api_router.get("/hotels", response_model=List[Hotel])
-async def get_hotels():
-    hotels = await db.hotels.find({"available": True}).to_list(100)
-    return [Hotel(**hotel) for hotel in hotels]
+async def get_hotels(filters: CatalogFilters = Depends(), fields: Optional[str] = None, sort: Optional[str] = None):
+    selected = parse_fields(Hotel, fields)
+    query = {"available": True, **filters.query("hotel")}
+    hotels = await find_listings("hotel", query, projection_for(selected), sort)
+    if selected:
+        return sparse_response(Hotel, selected, hotels)
+    return build_models(Hotel, hotels)
 
 @api_router.get("/hotels/{hotel_id}", response_model=Hotel)
-async def get_hotel(hotel_id: str):
-    hotel = await db.hotels.find_one({"id": hotel_id})
+async def get_hotel(hotel_id: str, fields: Optional[str] = None):
+    selected = parse_fields(Hotel, fields)
+    hotel = from_document(await catalog_db.hotels.find_one(id_filter(hotel_id), projection_for(selected)))
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
+    if selected:
+        return sparse_response(Hotel, selected, hotel)
     return Hotel(**hotel)
 
 @api_router.post("/hotels", response_model=Hotel)
 async def create_hotel(hotel: Hotel, admin = Depends(verify_admin)):
-    await db.hotels.insert_one(hotel.dict())
+    await db.hotels.insert_one(to_document(with_geohash(hotel.dict())))
+    await notify_catalog_change("hotel", hotel.id, hotel.dict())
     return hotel
 
 @api_router.put("/hotels/{hotel_id}", response_model=Hotel)
 async def update_hotel(hotel_id: str, hotel: Hotel, admin = Depends(verify_admin)):
-    await db.hotels.update_one({"id": hotel_id}, {"$set": hotel.dict()})
+    hotel.id = hotel_id
+    result = await db.hotels.update_one(id_filter(hotel_id), {"$set": to_update(with_geohash(hotel.dict()))})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Hotel not found")
+    await notify_catalog_change("hotel", hotel_id, hotel.dict())
     return hotel
 
 @api_router.delete("/hotels/{hotel_id}")
 async def delete_hotel(hotel_id: str, admin = Depends(verify_admin)):
-    result = await db.hotels.delete_one({"id": hotel_id})
+    result = await db.hotels.delete_one(id_filter(hotel_id))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Hotel not found")
+    await notify_catalog_change("hotel", hotel_id)
     return {"message": "Hotel deleted successfully"}
 
 # Cars Routes
 @api_router.get("/cars", response_model=List[Car])
-async def get_cars():
-    cars = await db.cars.find({"available": True}).to_list(100)
-    return [Car(**car) for car in cars]
+async def get_cars(filters: CatalogFilters = Depends(), fields: Optional[str] = None, sort: Optional[str] = None):
+    selected = parse_fields(Car, fields)
+    query = {"available": True, **filters.query("car")}
+    cars = await find_listings("car", query, projection_for(selected), sort)
+    if selected:
+        return sparse_response(Car, selected, cars)
+    return build_models(Car, cars)
 
 @api_router.get("/cars/{car_id}", response_model=Car)
-async def get_car(car_id: str):
-    car = await db.cars.find_one({"id": car_id})
+async def get_car(car_id: str, fields: Optional[str] = None):
+    selected = parse_fields(Car, fields)
+    car = from_document(await catalog_db.cars.find_one(id_filter(car_id), projection_for(selected)))
     if not car:
         raise HTTPException(status_code=404, detail="Car not found")
+    if selected:
+        return sparse_response(Car, selected, car)
     return Car(**car)
 
 @api_router.post("/cars", response_model=Car)
 async def create_car(car: Car, admin = Depends(verify_admin)):
-    await db.cars.insert_one(car.dict())
+    await db.cars.insert_one(to_document(with_geohash(car.dict())))
+    await notify_catalog_change("car", car.id, car.dict())
     return car
 
 @api_router.put("/cars/{car_id}", response_model=Car)
 async def update_car(car_id: str, car: Car, admin = Depends(verify_admin)):
-    await db.cars.update_one({"id": car_id}, {"$set": car.dict()})
+    car.id = car_id
+    result = await db.cars.update_one(id_filter(car_id), {"$set": to_update(with_geohash(car.dict()))})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Car not found")
+    await notify_catalog_change("car", car_id, car.dict())
     return car
 
 @api_router.delete("/cars/{car_id}")
 async def delete_car(car_id: str, admin = Depends(verify_admin)):
-    result = await db.cars.delete_one({"id": car_id})
+    result = await db.cars.delete_one(id_filter(car_id))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Car not found")
+    await notify_catalog_change("car", car_id)
     return {"message": "Car deleted successfully"}
 
 # Events Routes
 @api_router.get("/events", response_model=List[Event])
-async def get_events():
-    events = await db.events.find({"available": True}).to_list(100)
-    return [Event(**event) for event in events]
+async def get_events(filters: CatalogFilters = Depends(), fields: Optional[str] = None, sort: Optional[str] = None):
+    selected = parse_fields(Event, fields)
+    query = {"available": True, **filters.query("event")}
+    events = await find_listings("event", query, projection_for(selected), sort)
+    if selected:
+        return sparse_response(Event, selected, events)
+    return build_models(Event, events)
 
 @api_router.get("/events/{event_id}", response_model=Event)
-async def get_event(event_id: str):
-    event = await db.events.find_one({"id": event_id})
+async def get_event(event_id: str, fields: Optional[str] = None):
+    selected = parse_fields(Event, fields)
+    event = from_document(await catalog_db.events.find_one(id_filter(event_id), projection_for(selected)))
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
+    if selected:
+        return sparse_response(Event, selected, event)
     return Event(**event)
 
 @api_router.post("/events", response_model=Event)
 async def create_event(event: Event, admin = Depends(verify_admin)):
-    await db.events.insert_one(event.dict())
+    await db.events.insert_one(to_document(with_geohash(event.dict())))
+    await notify_catalog_change("event", event.id, event.dict())
     return event
 
 @api_router.put("/events/{event_id}", response_model=Event)
 async def update_event(event_id: str, event: Event, admin = Depends(verify_admin)):
-    await db.events.update_one({"id": event_id}, {"$set": event.dict()})
+    event.id = event_id
+    result = await db.events.update_one(id_filter(event_id), {"$set": to_update(with_geohash(event.dict()))})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Event not found")
+    await notify_catalog_change("event", event_id, event.dict())
     return event
 
 @api_router.delete("/events/{event_id}")
 async def delete_event(event_id: str, admin = Depends(verify_admin)):
-    result = await db.events.delete_one({"id": event_id})
+    result = await db.events.delete_one(id_filter(event_id))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Event not found")
+    await notify_catalog_change("event", event_id)
     return {"message": "Event deleted successfully"}
 
 # Tours Routes
 @api_router.get("/tours", response_model=List[Tour])
-async def get_tours():
-    tours = await db.tours.find({"available": True}).to_list(100)
-    return [Tour(**tour) for tour in tours]
+async def get_tours(filters: CatalogFilters = Depends(), fields: Optional[str] = None, sort: Optional[str] = None):
+    selected = parse_fields(Tour, fields)
+    query = {"available": True, **filters.query("tour")}
+    tours = await find_listings("tour", query, projection_for(selected), sort)
+    if selected:
+        return sparse_response(Tour, selected, tours)
+    return build_models(Tour, tours)
 
 @api_router.get("/tours/{tour_id}", response_model=Tour)
-async def get_tour(tour_id: str):
-    tour = await db.tours.find_one({"id": tour_id})
+async def get_tour(tour_id: str, fields: Optional[str] = None):
+    selected = parse_fields(Tour, fields)
+    tour = from_document(await catalog_db.tours.find_one(id_filter(tour_id), projection_for(selected)))
     if not tour:
         raise HTTPException(status_code=404, detail="Tour not found")
+    if selected:
+        return sparse_response(Tour, selected, tour)
     return Tour(**tour)
 
+@api_router.get("/tours/{tour_id}/route", response_model=RoutePlan)
+async def get_tour_route(tour_id: str):
+    tour = from_document(await catalog_db.tours.find_one(id_filter(tour_id), {"destinations": 1, "duration_days": 1}))
+    if not tour:
+        raise HTTPException(status_code=404, detail="Tour not found")
+    points, unresolved = [], []
+    for index, location in enumerate(tour.get("destinations") or []):
+        label = location.get("area") or location.get("city")
+        coordinates = location.get("coordinates") or {}
+        if coordinates.get("lat") is None or coordinates.get("lng") is None:
+            unresolved.append(label)
+        else:
+            points.append((f"{tour_id}:{index}", label, coordinates["lat"], coordinates["lng"]))
+    if not points:
+        return RoutePlan(stops=[], total_km=0.0, total_hours=0.0, days=[], unresolved=unresolved)
+    # A tour's destinations are visited in the order the operator listed them
+    plan = await asyncio.to_thread(solve_route, tuple(points), tour["duration_days"], True)
+    return RoutePlan(**plan, unresolved=unresolved)
+
 @api_router.post("/tours", response_model=Tour)
 async def create_tour(tour: Tour, admin = Depends(verify_admin)):
-    await db.tours.insert_one(tour.dict())
+    await db.tours.insert_one(to_document(with_geohash(tour.dict())))
+    await notify_catalog_change("tour", tour.id, tour.dict())
     return tour
 
 @api_router.put("/tours/{tour_id}", response_model=Tour)
 async def update_tour(tour_id: str, tour: Tour, admin = Depends(verify_admin)):
-    await db.tours.update_one({"id": tour_id}, {"$set": tour.dict()})
+    tour.id = tour_id
+    result = await db.tours.update_one(id_filter(tour_id), {"$set": to_update(with_geohash(tour.dict()))})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Tour not found")
+    await notify_catalog_change("tour", tour_id, tour.dict())
     return tour
 
 @api_router.delete("/tours/{tour_id}")
 async def delete_tour(tour_id: str, admin = Depends(verify_admin)):
-    result = await db.tours.delete_one({"id": tour_id})
+    result = await db.tours.delete_one(id_filter(tour_id))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Tour not found")
+    await notify_catalog_change("tour", tour_id)
     return {"message": "Tour deleted successfully"}
 
 # Real Estate Routes
 @api_router.get("/real-estate", response_model=List[RealEstate])
-async def get_real_estate():
-    properties = await db.real_estate.find({"available": True}).to_list(100)
-    return [RealEstate(**prop) for prop in properties]
+async def get_real_estate(filters: CatalogFilters = Depends(), fields: Optional[str] = None, sort: Optional[str] = None):
+    selected = parse_fields(RealEstate, fields)
+    query = {"available": True, **filters.query("real-estate")}
+    properties = await find_listings("real-estate", query, projection_for(selected), sort)
+    if selected:
+        return sparse_response(RealEstate, selected, properties)
+    return build_models(RealEstate, properties)
 
 @api_router.get("/real-estate/{property_id}", response_model=RealEstate)
-async def get_property(property_id: str):
-    property = await db.real_estate.find_one({"id": property_id})
+async def get_property(property_id: str, fields: Optional[str] = None):
+    selected = parse_fields(RealEstate, fields)
+    property = from_document(await catalog_db.real_estate.find_one(id_filter(property_id), projection_for(selected)))
     if not property:
         raise HTTPException(status_code=404, detail="Property not found")
+    if selected:
+        return sparse_response(RealEstate, selected, property)
     return RealEstate(**property)
 
 @api_router.post("/real-estate", response_model=RealEstate)
 async def create_property(property: RealEstate, admin = Depends(verify_admin)):
-    await db.real_estate.insert_one(property.dict())
+    await db.real_estate.insert_one(to_document(with_geohash(property.dict())))
+    await notify_catalog_change("real-estate", property.id, property.dict())
     return property
 
 @api_router.put("/real-estate/{property_id}", response_model=RealEstate)
 async def update_property(property_id: str, property: RealEstate, admin = Depends(verify_admin)):
-    await db.real_estate.update_one({"id": property_id}, {"$set": property.dict()})
+    property.id = property_id
+    result = await db.real_estate.update_one(id_filter(property_id), {"$set": to_update(with_geohash(property.dict()))})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Property not found")
+    await notify_catalog_change("real-estate", property_id, property.dict())
     return property
 
 @api_router.delete("/real-estate/{property_id}")
 async def delete_property(property_id: str, admin = Depends(verify_admin)):
-    result = await db.real_estate.delete_one({"id": property_id})
+    result = await db.real_estate.delete_one(id_filter(property_id))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Property not found")
+    await notify_catalog_change("real-estate", property_id)
     return {"message": "Property deleted successfully"}
 
+# Listing Batch Route
+def group_refs(refs: List[tuple]) -> Dict[str, List[str]]:
+    ids_by_type: Dict[str, List[str]] = {}
+    for service_type, listing_id in refs:
+        if service_type not in SERVICE_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unknown service type: {service_type}")
+        ids = ids_by_type.setdefault(service_type, [])
+        if listing_id not in ids:
+            ids.append(listing_id)
+    return ids_by_type
+
+async def fetch_listings(ids_by_type: Dict[str, List[str]], projection: Optional[Dict[str, Any]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    # One $in query per collection, all collections queried concurrently
+    service_types = list(ids_by_type)
+    results = await asyncio.gather(*(
+        catalog_db[SERVICE_TYPES[service_type][0]].find(ids_filter(ids_by_type[service_type]), projection).to_list(None)
+        for service_type in service_types
+    ))
+    return {service_type: from_documents(documents) for service_type, documents in zip(service_types, results)}
+
+@api_router.post("/listings/batch", response_model=ListingBatchResponse)
+async def get_listings_batch(batch_request: ListingBatchRequest):
+    if len(batch_request.items) > LISTING_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {LISTING_BATCH_MAX_ITEMS} items per batch")
+
+    ids_by_type = group_refs([(item.service_type, item.id) for item in batch_request.items])
+    documents_by_type = await fetch_listings(ids_by_type)
+
+    listings: Dict[str, Dict[str, Any]] = {}
+    for service_type, documents in documents_by_type.items():
+        model = SERVICE_TYPES[service_type][1]
+        for listing in build_models(model, documents):
+            listings[listing.id] = {"service_type": service_type, **jsonable_encoder(listing)}
+
+    missing = [
+        ListingRef(service_type=service_type, id=listing_id)
+        for service_type, ids in ids_by_type.items()
+        for listing_id in ids
+        if listing_id not in listings
+    ]
+    return ListingBatchResponse(listings=listings, missing=missing)
+
+# Quote Routes
+@api_router.post("/quotes", response_model=QuoteResponse)
+async def create_quotes(quote_request: QuoteRequest):
+    if len(quote_request.items) > QUOTE_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {QUOTE_MAX_ITEMS} items per quote")
+    start_date, end_date = parse_stay(quote_request.start_date, quote_request.end_date)
+
+    ids_by_type = group_refs([(item.service_type, item.service_id) for item in quote_request.items])
+    price_projection = projection_for(["id", "room_types"] + [field for field, _, _ in PRICE_FIELDS.values()])
+    documents_by_type = await fetch_listings(ids_by_type, price_projection)
+
+    quotes: List[Quote] = []
+    missing: List[ListingRef] = []
+    for service_type, documents in documents_by_type.items():
+        by_id = {document["id"]: document for document in documents}
+        items = [item for item in quote_request.items if item.service_type == service_type]
+        found = [item for item in items if item.service_id in by_id]
+        missing.extend(
+            ListingRef(service_type=service_type, id=item.service_id) for item in items if item.service_id not in by_id
+        )
+        if not found:
+            continue
+        units, rates, totals = price_services(
+            service_type,
+            [by_id[item.service_id] for item in found],
+            [item.room_type for item in found],
+            start_date,
+            end_date,
+            quote_request.guests,
+        )
+        quotes.extend(
+            Quote(
+                service_type=service_type,
+                service_id=item.service_id,
+                room_type=item.room_type,
+                units=units,
+                base_rate=float(rate),
+                total_price=float(total),
+            )
+            for item, rate, total in zip(found, rates, totals)
+        )
+
+    return QuoteResponse(
+        start_date=start_date,
+        end_date=end_date,
+        guests=quote_request.guests,
+        quotes=quotes,
+        missing=missing,
+    )
+
 # AI Trip Planner Route
 @api_router.post("/ai-trip-planner", response_model=TripPlan)
 async def create_trip_plan(
     query: str,
     destinations: List[str],
     duration: int,
-    budget: Optional[float] = None
+    budget: Optional[float] = None,
+    user = Depends(optional_user)
 ):
     trip_plan = await generate_trip_plan(query, destinations, duration, budget)
-    await db.trip_plans.insert_one(trip_plan.dict())
+    # Signed-in users keep their plans; anonymous plans expire after TRIP_PLAN_TTL_HOURS
+    if user is not None:
+        trip_plan.user_id = user["id"]
+    else:
+        trip_plan.expires_at = trip_plan.created_at + timedelta(hours=TRIP_PLAN_TTL_HOURS)
+    await db.trip_plans.insert_one(to_document(trip_plan.dict()))
+    logger.info("trip_plan_created", extra={
+        "trip_plan_id": trip_plan.id,
+        "user_id": trip_plan.user_id,
+        "destinations": len(destinations),
+        "duration_days": duration,
+    })
     return trip_plan
 
+# Route Planner Route
+@api_router.post("/routes/plan", response_model=RoutePlan)
+async def create_route_plan(route_request: RouteRequest):
+    return await plan_route(route_request.destinations, route_request.duration_days, route_request.keep_order)
+
+# Catalog Stream Route
+@api_router.get("/stream/catalog")
+async def stream_catalog(
+    types: Optional[str] = None,
+    district: Optional[str] = None,
+    resume_after: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None)
+):
+    # Server-sent events; browsers resend the last id as Last-Event-ID when reconnecting
+    wanted = set(types.split(",")) if types else set(STREAM_COLLECTIONS.values())
+    unknown = wanted - set(STREAM_COLLECTIONS.values())
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(sorted(unknown))}")
+    if not await supports_change_streams():
+        raise HTTPException(status_code=503, detail="Change streams require a replica set")
+
+    resume_token = resume_after or last_event_id
+    source = resumed_change_events(resume_token) if resume_token else shared_change_events()
+
+    async def event_stream():
+        yield "retry: 3000\n\n"
+        try:
+            async for event in source:
+                if event is None:
+                    yield ": keepalive\n\n"
+                elif event["type"] in wanted and (district is None or event["district"] in (None, district)):
+                    yield format_sse(event)
+        except PyMongoError as error:
+            # e.g. the resume token fell off the oplog; the client should reload and resubscribe
+            yield f"event: error\ndata: {json.dumps({'detail': str(error)})}\n\n"
+        finally:
+            # Close the cursor / shared subscription as soon as the client goes away
+            await source.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Booking Routes
 @api_router.post("/bookings/create", response_model=Booking)
 async def create_booking(booking_request: BookingRequest, user = Depends(verify_token)):
     # Get service details
-    service_collection = f"{booking_request.service_type}s"
-    if booking_request.service_type == "real-estate":
-        service_collection = "real_estate"
+    if booking_request.service_type not in SERVICE_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown service type: {booking_request.service_type}")
+    service_collection = SERVICE_TYPES[booking_request.service_type][0]
     
-    service = await db[service_collection].find_one({"id": booking_request.service_id})
+    service = await db[service_collection].find_one(id_filter(booking_request.service_id))
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
     
-    # Calculate total price
-    start_date = datetime.fromisoformat(booking_request.start_date)
-    end_date = datetime.fromisoformat(booking_request.end_date) if booking_request.end_date else start_date
-    
-    if booking_request.service_type == "hotel":
-        days = (end_date - start_date).days or 1
-        total_price = service["price_per_night"] * days * booking_request.guests
-    elif booking_request.service_type == "car":
-        days = (end_date - start_date).days or 1
-        total_price = service["price_per_day"] * days
-    elif booking_request.service_type == "event":
-        total_price = service["price"] * booking_request.guests
-    elif booking_request.service_type == "tour":
-        total_price = service["price_per_person"] * booking_request.guests
-    else:  # real-estate
-        total_price = service["price"]
+    # Calculate total price with the same engine that serves /api/quotes
+    start_date, end_date = parse_stay(booking_request.start_date, booking_request.end_date)
+    _, _, totals = price_services(
+        booking_request.service_type,
+        [service],
+        [booking_request.room_type],
+        start_date,
+        end_date,
+        booking_request.guests
+    )
+    total_price = float(totals[0])
     
     # Create booking
     booking = Booking(
@@ -585,12 +4593,20 @@ async def create_booking(booking_request: BookingRequest, user = Depends(verify_
         special_requests=booking_request.special_requests
     )
     
-    await db.bookings.insert_one(booking.dict())
+    await db.bookings.insert_one(to_document(booking.dict()))
+    await record_popularity(booking.service_type, booking.service_id, "booking")
+    logger.info("booking_created", extra={
+        "booking_id": booking.id,
+        "user_id": booking.user_id,
+        "service_type": booking.service_type,
+        "service_id": booking.service_id,
+        "total_price": booking.total_price,
+    })
     return booking
 
 @api_router.get("/bookings/{booking_id}", response_model=Booking)
 async def get_booking(booking_id: str, user = Depends(verify_token)):
-    booking = await db.bookings.find_one({"id": booking_id})
+    booking = from_document(await db.bookings.find_one(id_filter(booking_id)))
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
@@ -600,70 +4616,153 @@ async def get_booking(booking_id: str, user = Depends(verify_token)):
     
     return Booking(**booking)
 
-@api_router.get("/my-bookings", response_model=List[Booking])
-async def get_my_bookings(user = Depends(verify_token)):
-    bookings = await db.bookings.find({"user_id": user["id"]}).to_list(100)
-    return [Booking(**booking) for booking in bookings]
+BOOKING_SERVICE_SUMMARY = {
+    "_id": int(BINARY_IDS),
+    "id": 1,
+    "name": {"$ifNull": ["$name", "$title"]},
+    "thumbnail": {"$first": "$images"},
+    "location": {"$ifNull": ["$location", {"$first": "$destinations"}]},
+    "rating": 1,
+    "contact_info": 1,
+}
+
+def parse_booking_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        booking_date, booking_id = cursor.split("|", 1)
+        booking_date = datetime.fromisoformat(booking_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [
+        {"booking_date": {"$lt": booking_date}},
+        {"booking_date": booking_date, ID_FIELD: {"$lt": stored_id(booking_id)}},
+    ]}
+
+@api_router.get("/my-bookings", response_model=List[BookingWithService])
+async def get_my_bookings(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    before: Optional[str] = None,
+    user = Depends(verify_token)
+):
+    # Newest first, keyset-paginated on the (user_id, booking_date, id) index; the
+    # cursor for the next page is returned in the X-Next-Cursor header
+    match: Dict[str, Any] = {"user_id": stored_id(user["id"])}
+    if before:
+        match.update(parse_booking_cursor(before))
+
+    bookings = from_documents(await db.bookings.find(match).sort(
+        [("booking_date", -1), (ID_FIELD, -1)]
+    ).to_list(limit + 1))
+    if len(bookings) > limit:
+        bookings = bookings[:limit]
+        last = bookings[-1]
+        response.headers["X-Next-Cursor"] = f"{last['booking_date'].isoformat()}|{last['id']}"
+    # Each booking's listing from its own catalog: one $in query per service type on the page
+    ids_by_type = group_refs([
+        (booking["service_type"], booking["service_id"]) for booking in bookings if booking["service_type"] in SERVICE_TYPES
+    ])
+    services = {
+        (service_type, service["id"]): service
+        for service_type, documents in (await fetch_listings(ids_by_type, BOOKING_SERVICE_SUMMARY)).items()
+        for service in documents
+    }
+    for booking in bookings:
+        booking.pop("_id", None)
+        booking["service"] = services.get((booking["service_type"], booking["service_id"]))
+    return build_models(BookingWithService, bookings)
 
 @api_router.get("/admin/bookings", response_model=List[Booking])
-async def get_all_bookings(admin = Depends(verify_admin)):
-    bookings = await db.bookings.find({}).to_list(1000)
-    return [Booking(**booking) for booking in bookings]
+async def get_all_bookings(
+    filters: BookingFilters = Depends(),
+    limit: int = Query(1000, ge=1, le=5000),
+    include_archived: bool = True,
+    admin = Depends(verify_admin)
+):
+    # Newest first across the hot collection and the Parquet archive
+    bookings = await find_bookings(filters, limit, include_archived)
+    return build_models(Booking, bookings)
 
 # Payment Routes
 @api_router.post("/payments/create-intent")
 async def create_payment_intent(payment_request: PaymentRequest, user = Depends(verify_token)):
     try:
         # Get booking
-        booking = await db.bookings.find_one({"id": payment_request.booking_id})
+        booking = from_document(await db.bookings.find_one(id_filter(payment_request.booking_id)))
         if not booking:
             raise HTTPException(status_code=404, detail="Booking not found")
         
         if booking["user_id"] != user["id"]:
             raise HTTPException(status_code=403, detail="Access denied")
         
+        if booking.get("payment_status") == "expired":
+            logger.info("payment_intent_rejected", extra={"booking_id": booking["id"], "reason": "hold_expired"})
+            raise HTTPException(status_code=409, detail="Booking hold expired")
+        
         # Create Stripe payment intent
-        intent = stripe.PaymentIntent.create(
-            amount=int(payment_request.amount * 100),  # Stripe uses cents
-            currency=payment_request.currency,
-            metadata={
-                "platform": "sierra_explore",
-                "booking_id": payment_request.booking_id,
-                "user_id": user["id"]
-            }
-        )
+        with track_upstream("stripe", "payment_intent_create"):
+            intent = stripe.PaymentIntent.create(
+                amount=int(payment_request.amount * 100),  # Stripe uses cents
+                currency=payment_request.currency,
+                metadata={
+                    "platform": "sierra_explore",
+                    "booking_id": payment_request.booking_id,
+                    "user_id": user["id"],
+                    "request_id": current_request_id.get() or ""
+                }
+            )
         
         # Update booking with payment intent
         await db.bookings.update_one(
-            {"id": payment_request.booking_id},
+            id_filter(payment_request.booking_id),
             {"$set": {"payment_intent_id": intent.id}}
         )
+        logger.info("payment_intent_created", extra={
+            "booking_id": payment_request.booking_id,
+            "payment_intent_id": intent.id,
+            "amount": payment_request.amount,
+            "currency": payment_request.currency,
+        })
         
         return {"client_secret": intent.client_secret}
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.warning("payment_intent_failed", extra={"booking_id": payment_request.booking_id, "error": str(e)})
         raise HTTPException(status_code=400, detail=str(e))
 
 @api_router.post("/payments/confirm")
 async def confirm_payment(payment_intent_id: str, user = Depends(verify_token)):
     try:
         # Retrieve payment intent from Stripe
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        with track_upstream("stripe", "payment_intent_retrieve"):
+            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
         
         if intent.status == "succeeded":
-            # Update booking status
+            # Update booking status; a payment that lands after the hold lapsed revives the booking
             booking_id = intent.metadata.get("booking_id")
-            await db.bookings.update_one(
-                {"id": booking_id},
-                {"$set": {
-                    "payment_status": "paid",
-                    "stripe_payment_id": payment_intent_id
-                }}
-            )
+            booking = from_document(await db.bookings.find_one_and_update(
+                id_filter(booking_id),
+                {
+                    "$set": {
+                        "payment_status": "paid",
+                        "status": "confirmed",
+                        "stripe_payment_id": payment_intent_id
+                    },
+                    "$unset": {"expired_at": ""}
+                },
+                projection={"service_type": 1, "service_id": 1, "payment_status": 1}
+            ))
+            # Only the first confirmation of a booking counts towards its listing's popularity
+            if booking is not None and booking.get("payment_status") != "paid":
+                await record_popularity(booking["service_type"], booking["service_id"], "payment")
+            logger.info("payment_confirmed", extra={"booking_id": booking_id, "payment_intent_id": payment_intent_id})
             
             return {"status": "success", "message": "Payment confirmed"}
         else:
+            logger.info("payment_not_completed", extra={"payment_intent_id": payment_intent_id, "intent_status": intent.status})
             return {"status": "failed", "message": "Payment not completed"}
     except Exception as e:
+        logger.warning("payment_confirm_failed", extra={"payment_intent_id": payment_intent_id, "error": str(e)})
         raise HTTPException(status_code=400, detail=str(e))
 
 # Initialize with comprehensive Sierra Leone sample data
@@ -980,19 +5079,22 @@ async def init_sample_data(admin = Depends(verify_admin)):
     
     # Insert all sample data
     for hotel in sample_hotels:
-        await db.hotels.insert_one(hotel.dict())
+        await db.hotels.insert_one(to_document(with_geohash(hotel.dict())))
     
     for car in sample_cars:
-        await db.cars.insert_one(car.dict())
+        await db.cars.insert_one(to_document(with_geohash(car.dict())))
     
     for tour in sample_tours:
-        await db.tours.insert_one(tour.dict())
+        await db.tours.insert_one(to_document(with_geohash(tour.dict())))
     
     for event in sample_events:
-        await db.events.insert_one(event.dict())
+        await db.events.insert_one(to_document(with_geohash(event.dict())))
     
     for property in sample_properties:
-        await db.real_estate.insert_one(property.dict())
+        await db.real_estate.insert_one(to_document(with_geohash(property.dict())))
+    
+    for service_type in SERVICE_TYPES:
+        await notify_catalog_change(service_type)
     
     return {"message": "Comprehensive Sierra Leone sample data initialized successfully"}
 
@@ -1006,9 +5108,10 @@ async def get_admin_stats(admin = Depends(verify_admin)):
     property_count = await db.real_estate.count_documents({"available": True})
     user_count = await db.users.count_documents({"user_type": "user"})
     booking_count = await db.bookings.count_documents({})
+    archived_count = (archive_stats["archive"] or {}).get("bookings", 0)
     
     # Recent bookings
-    recent_bookings = await db.bookings.find({}).sort("booking_date", -1).limit(5).to_list(5)
+    recent_bookings = from_documents(await db.bookings.find({}).sort("booking_date", -1).limit(5).to_list(5))
     
     return {
         "hotels": hotel_count,
@@ -1017,28 +5120,228 @@ async def get_admin_stats(admin = Depends(verify_admin)):
         "tours": tour_count,
         "properties": property_count,
         "users": user_count,
-        "bookings": booking_count,
+        "bookings": booking_count + archived_count,
+        "archived_bookings": archived_count,
         "recent_bookings": recent_bookings
     }
 
+# Similar-listings index size for admin dashboard
+@api_router.get("/admin/similar")
+async def get_similarity_stats(admin = Depends(verify_admin)):
+    return {service_type: index.stats() for service_type, index in similarity_indexes.items()}
+
+# Booking archive: status, and an on-demand run that reports how much the hot collection shrank
+def require_booking_archive():
+    if not BOOKING_ARCHIVE_ENABLED:
+        raise HTTPException(status_code=503, detail="Booking archive is not configured")
+
+@api_router.get("/admin/archive")
+async def get_archive_stats(admin = Depends(verify_admin)):
+    require_booking_archive()
+    return {
+        "config": {
+            "directory": BOOKING_ARCHIVE_DIR,
+            "after_days": BOOKING_ARCHIVE_AFTER_DAYS,
+            "interval_hours": BOOKING_ARCHIVE_INTERVAL_HOURS,
+        },
+        **archive_stats,
+        "hot": await collection_sizes("bookings"),
+    }
+
+@api_router.post("/admin/archive/bookings")
+async def run_booking_archive(compact: bool = False, admin = Depends(verify_admin)):
+    require_booking_archive()
+    if archive_lock.locked():
+        raise HTTPException(status_code=409, detail="Archive run already in progress")
+    return await archive_bookings(compact)
+
+# LLM breaker states, hedge delays and where recent trip plans came from
+@api_router.get("/admin/llm")
+async def get_llm_stats(admin = Depends(verify_admin)):
+    return {
+        "config": {
+            "models": llm_client.models,
+            "deadline_seconds": LLM_DEADLINE_SECONDS,
+            "attempt_timeout_seconds": LLM_ATTEMPT_TIMEOUT_SECONDS,
+            "hedge_percentile": LLM_HEDGE_PERCENTILE,
+            "hedge_requests": LLM_HEDGE_REQUESTS,
+            "breaker_failures": LLM_BREAKER_FAILURES,
+            "breaker_cooldown_seconds": LLM_BREAKER_COOLDOWN_SECONDS,
+        },
+        "models": llm_client.stats(),
+        "trip_plans": trip_plan_stats,
+        "cached_plans": len(trip_plan_cache),
+    }
+
+# Data lifecycle counters for admin dashboard
+@api_router.get("/admin/lifecycle")
+async def get_lifecycle_stats(admin = Depends(verify_admin)):
+    return {
+        "config": {
+            "booking_hold_minutes": BOOKING_HOLD_MINUTES,
+            "expired_booking_retention_days": EXPIRED_BOOKING_RETENTION_DAYS,
+            "trip_plan_ttl_hours": TRIP_PLAN_TTL_HOURS,
+            "sweep_interval_seconds": LIFECYCLE_SWEEP_INTERVAL_SECONDS,
+        },
+        **lifecycle_stats,
+        "pending_bookings": await db.bookings.count_documents({"payment_status": "pending"}),
+        "trip_plans": await db.trip_plans.estimated_document_count(),
+    }
+
+# Connection pool telemetry for admin dashboard
+@api_router.get("/admin/db/pool")
+async def get_db_pool_stats(admin = Depends(verify_admin)):
+    return {
+        "config": {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "catalog_read_preference": MONGO_CATALOG_READ_PREFERENCE,
+            "write_concern": write_concern.document,
+        },
+        "servers": pool_telemetry.snapshot()
+    }
+
+# Sampling profiler toggle; stopping returns folded stacks for flamegraph.pl or speedscope
+@api_router.post("/admin/profiler/start")
+async def start_profiler(interval_ms: float = Query(5.0, ge=1, le=1000), admin = Depends(verify_admin)):
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="Profiler already running")
+    profiler.start(interval_ms)
+    return {"status": "running", "interval_ms": interval_ms}
+
+@api_router.post("/admin/profiler/stop")
+async def stop_profiler(admin = Depends(verify_admin)):
+    if not profiler.running:
+        raise HTTPException(status_code=409, detail="Profiler not running")
+    folded = profiler.stop()
+    return Response(folded, media_type="text/plain", headers={"X-Profile-Samples": str(profiler.samples)})
+
 # Include the router in the main app
 app.include_router(api_router)
 
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "X-Next-Cursor", "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "Retry-After"],
 )
+app.add_middleware(CompressionMiddleware)
+if REQUEST_TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestContextMiddleware)
+
+# Prometheus scrape endpoint (served on the backend port, not proxied under /api)
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+log_listener = configure_logging()
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    if not BINARY_IDS:
+        # With binary ids the identifier is `_id`, which is already uniquely indexed
+        for collection in [collection for collection, _ in SERVICE_TYPES.values()] + ["users", "bookings"]:
+            await db[collection].create_index("id", unique=True)
+    await db.bookings.create_index([("user_id", 1), ("booking_date", -1), (ID_FIELD, -1)])
+    await db.bookings.create_index([("payment_status", 1), ("booking_date", 1)])
+    await db.bookings.create_index("expired_at", sparse=True)
+    # The archive run scans bookings older than the cutoff
+    await db.bookings.create_index("booking_date")
+    await db.trip_plans.create_index("expires_at", sparse=True)
+    await db.listing_cards.create_index([("service_type", 1), ("id", 1)], unique=True)
+    await db.listing_cards.create_index([("service_type", 1), ("available", 1), ("rating", -1), ("id", 1)])
+    await db.listing_cards.create_index([("service_type", 1), ("available", 1), ("geohash", 1), ("price", 1)])
+    for collection, _ in SERVICE_TYPES.values():
+        await db[collection].create_index("geohash")
+    await db.popularity.create_index([("service_type", 1), ("service_id", 1)], unique=True)
+    await db.popularity.create_index([("service_type", 1), ("log_score", -1)])
+    await db.popularity.create_index([("log_score", -1)])
+    if isinstance(rate_limit_backend, MongoRateLimitBackend):
+        await rate_limit_backend.ensure_indexes()
+
+@app.on_event("startup")
+async def backfill_listing_cards():
+    # First start against an existing catalog; afterwards the change hooks keep cards current
+    if await db.listing_cards.estimated_document_count() == 0:
+        for service_type in SERVICE_TYPES:
+            await rebuild_listing_cards(service_type)
+
+@app.on_event("startup")
+async def backfill_map_clusters():
+    for collection, _ in SERVICE_TYPES.values():
+        await backfill_geohashes(collection)
+    if await db.map_clusters.estimated_document_count() == 0:
+        # Cards from before positions were kept are rebuilt along with the clusters
+        for service_type in SERVICE_TYPES:
+            await rebuild_listing_cards(service_type)
+            await rebuild_map_clusters(service_type)
+
+@app.on_event("startup")
+async def backfill_popularity():
+    # Bookings taken before popularity was tracked; afterwards it is updated as they happen
+    if await db.popularity.estimated_document_count() == 0:
+        await db.bookings.aggregate(popularity_pipeline(datetime.utcnow())).to_list(None)
+
+@app.on_event("startup")
+async def build_similarity_indexes():
+    for service_type in SERVICE_TYPES:
+        await build_similarity_index(service_type)
+
+@app.on_event("startup")
+async def load_autocomplete_index():
+    await build_autocomplete_index()
+
+async def publish_catalog_snapshots():
+    try:
+        for service_type in SERVICE_TYPES:
+            await publish_list_snapshot(service_type)
+            await publish_all_detail_snapshots(service_type)
+        await publish_home_snapshot()
+    except Exception:
+        # nginx falls back to the API for anything not yet published
+        logger.exception("Catalog snapshot publish failed")
+
+@app.on_event("startup")
+async def start_snapshot_publisher():
+    global snapshot_task
+    if SNAPSHOT_DIR is None:
+        return
+    # A large catalog takes a while to publish; the API serves every catalog read until it is done
+    snapshot_task = asyncio.create_task(publish_catalog_snapshots())
+
+@app.on_event("startup")
+async def start_lifecycle_sweeper():
+    global lifecycle_task
+    await backfill_trip_plan_expiry()
+    lifecycle_task = asyncio.create_task(lifecycle_sweeper())
+
+@app.on_event("startup")
+async def start_booking_archiver():
+    global archive_task
+    if not BOOKING_ARCHIVE_ENABLED:
+        return
+    archive_stats["archive"] = await asyncio.to_thread(archive_summary, Path(BOOKING_ARCHIVE_DIR))
+    archive_task = asyncio.create_task(booking_archiver())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if lifecycle_task is not None:
+        lifecycle_task.cancel()
+    if archive_task is not None:
+        archive_task.cancel()
+    if snapshot_task is not None:
+        snapshot_task.cancel()
+    if catalog_broadcaster.task is not None:
+        catalog_broadcaster.task.cancel()
+    for index in similarity_indexes.values():
+        index.retired = True
     client.close()
\ No newline at end of file
@@ -4,9 +4,14 @@ set -e
 # Start the FastAPI backend
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
+# Catalog snapshots are published here and served by nginx (see nginx.conf)
+export SNAPSHOT_DIR=${SNAPSHOT_DIR:-/var/cache/sierra-explore/snapshots}
+mkdir -p "$SNAPSHOT_DIR"
+
 echo "Starting FastAPI backend"
 # Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+# The app writes its own sampled JSON access log (see RequestContextMiddleware)
+uvicorn server:app --host 0.0.0.0 --port 8001 --no-access-log &
 BACKEND_PID=$!
 
 echo "Waiting for backend to start..."
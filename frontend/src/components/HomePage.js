@@ -20,18 +20,13 @@ const HomePage = () => {
 
   const fetchFeaturedServices = async () => {
     try {
-      const [hotelsRes, carsRes, toursRes, eventsRes] = await Promise.all([
-        axios.get('/hotels'),
-        axios.get('/cars'),
-        axios.get('/tours'),
-        axios.get('/events')
-      ]);
+      const response = await axios.get('/home');
 
       setFeaturedServices({
-        hotels: hotelsRes.data.slice(0, 3),
-        cars: carsRes.data.slice(0, 3),
-        tours: toursRes.data.slice(0, 3),
-        events: eventsRes.data.slice(0, 3)
+        hotels: response.data.hotel,
+        cars: response.data.car,
+        tours: response.data.tour,
+        events: response.data.event
       });
     } catch (error) {
       console.error('Error fetching featured services:', error);
@@ -205,7 +200,7 @@ const HomePage = () => {
                     <h3 className="text-xl font-bold text-gray-800 mb-2">{hotel.name}</h3>
                     <div className="flex items-center text-gray-500 text-sm mb-2">
                       <FaMapMarkerAlt className="mr-1" />
-                      <span>{hotel.location.city}, {hotel.location.district}</span>
+                      <span>{hotel.city}, {hotel.district}</span>
                     </div>
                     {hotel.rating > 0 && (
                       <div className="flex items-center text-yellow-500 text-sm mb-3">
@@ -213,10 +208,10 @@ const HomePage = () => {
                         <span>{hotel.rating} ({hotel.reviews_count} reviews)</span>
                       </div>
                     )}
-                    <p className="text-gray-600 text-sm mb-4 line-clamp-2">{hotel.description}</p>
+                    <p className="text-gray-600 text-sm mb-4 line-clamp-2">{hotel.summary}</p>
                     <div className="flex items-center justify-between">
                       <div className="text-2xl font-bold text-emerald-600">
-                        ${hotel.price_per_night}
+                        ${hotel.price}
                         <span className="text-sm text-gray-500 ml-1">/night</span>
                       </div>
                       <Link
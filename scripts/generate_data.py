@@ -0,0 +1,512 @@
+"""Generate a large, realistic Sierra Explore data set for capacity testing.
+
+Catalogs are spread over every district of Sierra Leone around real town coordinates
+(Freetown weighted heaviest), with log-normal prices, embedded reviews, users, and
+bookings that follow the dry-season / rainy-season and weekend patterns of real
+travel. Everything is derived from --seed and --as-of, so the same arguments always
+produce the same documents; each collection has its own random stream, so changing
+one count does not reshuffle the others. Documents are streamed in with unordered
+bulk inserts and never held in memory all at once.
+
+    python scripts/generate_data.py --db-name sierra_explore_staging --scale 10 --drop
+    python scripts/generate_data.py --db-name sierra_explore_staging --scale 100 --seed 7 --as-of 2025-06-01
+    python scripts/generate_data.py --db-name load --hotels 250000 --bookings 0 --id-storage binary
+
+--scale multiplies the base volume (10k listings, 5k users, 20k bookings). Use
+--id-storage to match the backend's ID_STORAGE. Restart the backend afterwards so it
+builds its indexes and listing cards.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import bcrypt
+from pymongo import MongoClient
+
+# District, main town, neighbourhoods, latitude, longitude, relative listing weight
+DISTRICTS = [
+    ("Western Area", "Freetown", ["Aberdeen", "Lumley", "Congo Town", "Hill Station", "Wilberforce", "Murray Town", "Brookfields", "Kissy", "Wellington", "Goderich"], 8.4657, -13.2317, 30),
+    ("Western Area", "Waterloo", ["Tokeh", "York", "Kent", "River No. 2", "Lakka", "Hastings"], 8.3389, -13.0709, 8),
+    ("Bo", "Bo", [None], 7.9644, -11.7383, 8),
+    ("Kenema", "Kenema", [None], 7.8767, -11.1900, 7),
+    ("Bombali", "Makeni", [None], 8.8833, -12.0500, 6),
+    ("Kono", "Koidu", [None], 8.6439, -10.9711, 5),
+    ("Port Loko", "Port Loko", [None], 8.7667, -12.7833, 5),
+    ("Tonkolili", "Magburaka", [None], 8.7167, -11.9500, 3),
+    ("Kambia", "Kambia", [None], 9.1256, -12.9181, 3),
+    ("Kailahun", "Kailahun", [None], 8.2789, -10.5739, 3),
+    ("Moyamba", "Moyamba", [None], 8.1606, -12.4333, 3),
+    ("Bonthe", "Bonthe", [None], 7.5264, -12.5050, 2),
+    ("Pujehun", "Pujehun", [None], 7.3500, -11.7167, 2),
+    ("Koinadugu", "Kabala", [None], 9.5833, -11.5500, 2),
+    ("Falaba", "Falaba", [None], 9.8500, -11.3200, 1),
+    ("Karene", "Kamakwie", [None], 9.4967, -12.2408, 1),
+]
+
+# Base volume at --scale 1
+BASE_COUNTS = {
+    "hotels": 2000,
+    "cars": 1500,
+    "events": 1000,
+    "tours": 500,
+    "real_estate": 5000,
+    "users": 5000,
+    "bookings": 20000,
+}
+# Collections the backend derives from the ones above. It rebuilds them at startup only when
+# they are empty, so --drop has to clear them too or they keep describing the previous data set.
+DERIVED_COLLECTIONS = ["listing_cards", "map_clusters", "popularity"]
+
+# Dry season (November to April) is peak travel; the rainy season (June to September) is quiet
+MONTH_WEIGHTS = {1: 1.3, 2: 1.2, 3: 1.2, 4: 1.4, 5: 0.8, 6: 0.6, 7: 0.5, 8: 0.5, 9: 0.6, 10: 0.8, 11: 1.1, 12: 1.8}
+# Stays starting on Friday or Saturday are more common
+WEEKDAY_WEIGHTS = [0.8, 0.8, 0.8, 0.9, 1.3, 1.4, 1.0]
+SEASON_PEAK = max(MONTH_WEIGHTS.values()) * max(WEEKDAY_WEIGHTS)
+
+FIRST_NAMES = ["Mohamed", "Fatmata", "Abdul", "Aminata", "Ibrahim", "Mariama", "Alusine", "Isatu", "Foday", "Hawa",
+               "Sahr", "Kadiatu", "Joseph", "Christiana", "Alpha", "Zainab", "Musa", "Adama", "John", "Memuna",
+               "Emma", "David", "Sarah", "Michael", "Grace", "Daniel", "Marie", "Peter", "Sia", "Tamba"]
+LAST_NAMES = ["Kamara", "Sesay", "Conteh", "Koroma", "Bangura", "Turay", "Kargbo", "Jalloh", "Mansaray", "Fofanah",
+              "Kanu", "Barrie", "Sankoh", "Cole", "Williams", "Johnson", "Tucker", "Massaquoi", "Kallon", "Sandi",
+              "Smith", "Brown", "Mensah", "Okafor", "Schmidt", "Dubois", "Rossi", "Nakamura", "Silva", "Lee"]
+
+REVIEW_COMMENTS = [
+    "Amazing ocean views and excellent service!",
+    "Friendly staff and great local food.",
+    "Good value for money, would come back.",
+    "Clean and comfortable, a bit far from the centre.",
+    "The generator kept the lights on during every power cut.",
+    "Perfect base for exploring the beaches.",
+    "Booking was easy and everything was as described.",
+    "Could be better maintained, but the location is great.",
+    "Our guide knew the history of every place we visited.",
+    "Unforgettable experience, highly recommended.",
+]
+
+HOTEL_PREFIXES = ["Atlantic", "Lumley", "Tokeh", "Sierra", "Lion Mountain", "Cotton Tree", "Bintumani", "Sunset",
+                  "Palm", "Mamba Point", "Tacugama", "Freedom", "Sweet Salone", "Golden Tulip", "Riverside", "Hilltop"]
+HOTEL_SUFFIXES = ["Hotel", "Lodge", "Resort", "Guest House", "Inn", "Suites", "Beach Resort", "Eco Lodge"]
+HOTEL_AMENITIES = ["WiFi", "Pool", "Restaurant", "Beach Access", "Spa", "Parking", "Bar", "Gym", "Air Conditioning",
+                   "Generator", "Airport Shuttle", "Conference Room", "Room Service", "Garden"]
+CAR_MODELS = [("Toyota", "Land Cruiser", 7), ("Toyota", "Hilux", 5), ("Toyota", "RAV4", 5), ("Toyota", "Corolla", 5),
+              ("Nissan", "Patrol", 7), ("Nissan", "X-Trail", 5), ("Mitsubishi", "Pajero", 7), ("Honda", "CR-V", 5),
+              ("Hyundai", "Tucson", 5), ("Ford", "Ranger", 5), ("Kia", "Sportage", 5), ("Toyota", "Hiace", 14)]
+CAR_FEATURES = ["4WD", "Air Conditioning", "GPS", "Bluetooth", "Driver Available", "Roof Rack", "Child Seat", "USB Charging"]
+EVENT_KINDS = [("Cultural", "Heritage Festival"), ("Music", "Afro Beats Night"), ("Festival", "Beach Festival"),
+               ("Sports", "Marathon"), ("Cultural", "Lantern Parade"), ("Music", "Gospel Concert"),
+               ("Festival", "Food and Palm Wine Fair"), ("Sports", "Football Cup Final")]
+TOUR_NAMES = ["Banana Islands Escape", "Bunce Island History Trail", "Tacugama Chimpanzee Visit", "Outamba Safari",
+              "Tiwai Island Wildlife", "Mount Bintumani Trek", "Freetown Peninsula Beaches", "Loma Mountains Hike",
+              "Turtle Islands Cruise", "Gola Rainforest Walk", "Kono Diamond Heritage", "Old Wharf Steps Walk"]
+TOUR_INCLUDED = ["Guide", "Meals", "Transport", "Accommodation", "Boat Transfer", "Park Fees", "Water", "Snorkelling Gear"]
+PROPERTY_FEATURES = ["Parking", "Security", "Ocean View", "Generator", "Borehole", "Garden", "Furnished",
+                     "Road Access", "Utilities Available", "Boys Quarters", "Balcony", "Swimming Pool"]
+
+# Service type -> (collection, share of bookings)
+BOOKABLE = {"hotel": ("hotels", 45), "car": ("cars", 25), "tour": ("tours", 15), "event": ("events", 15)}
+
+
+def stream_rng(seed: int, name: str) -> random.Random:
+    digest = hashlib.sha256(f"{seed}:{name}".encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def seeded_uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def lognormal_price(rng: random.Random, median: float, sigma: float, minimum: float) -> float:
+    return round(max(minimum, median * math.exp(rng.gauss(0, sigma))), 2)
+
+
+def pick_location(rng: random.Random) -> Dict[str, Any]:
+    district, city, areas, lat, lng, _ = rng.choices(DISTRICTS, weights=[d[5] for d in DISTRICTS])[0]
+    spread = 0.03 if city == "Freetown" else 0.06
+    return {
+        "district": district,
+        "city": city,
+        "area": rng.choice(areas),
+        "coordinates": {"lat": round(lat + rng.gauss(0, spread), 6), "lng": round(lng + rng.gauss(0, spread), 6)},
+    }
+
+
+def phone(rng: random.Random) -> str:
+    return f"+232 {rng.choice([76, 77, 78, 79, 88, 99, 30, 33])} {rng.randint(100, 999)} {rng.randint(100, 999)}"
+
+
+def rating_and_reviews(rng: random.Random, as_of: datetime, popularity: float) -> Dict[str, Any]:
+    rating = round(min(5.0, max(1.0, rng.gauss(4.1, 0.5))), 1)
+    reviews_count = int(rng.paretovariate(1.2) * popularity) if rng.random() > 0.1 else 0
+    reviews = [
+        {
+            "user": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)[0]}.",
+            "rating": int(min(5, max(1, round(rng.gauss(rating, 0.8))))),
+            "comment": rng.choice(REVIEW_COMMENTS),
+            "date": (as_of - timedelta(days=rng.randint(1, 730))).strftime("%Y-%m-%d"),
+        }
+        # Only the latest few are embedded, as the admin UI does
+        for _ in range(min(reviews_count, 5))
+    ]
+    return {"rating": rating if reviews_count else 0.0, "reviews_count": reviews_count, "reviews": reviews}
+
+
+def created_at(rng: random.Random, as_of: datetime) -> datetime:
+    return as_of - timedelta(days=rng.uniform(0, 1095))
+
+
+def description(rng: random.Random, subject: str, location: Dict[str, Any]) -> str:
+    place = f"{location['area']}, {location['city']}" if location.get("area") else location["city"]
+    return (
+        f"{subject} in {place}, {location['district']}. "
+        + rng.choice([
+            "Authentic Sierra Leonean hospitality close to beaches and markets.",
+            "A quiet retreat with easy access to the main road and local restaurants.",
+            "Ideal for families, business travellers and weekend getaways.",
+            "Surrounded by lush hills with views over the Atlantic.",
+        ])
+    )
+
+
+# Listing generators yield (document, booking info) pairs; the info is what bookings need later
+def generate_hotels(rng: random.Random, count: int, as_of: datetime) -> Iterator[Tuple[Dict[str, Any], tuple]]:
+    for index in range(count):
+        location = pick_location(rng)
+        name = f"{rng.choice(HOTEL_PREFIXES)} {rng.choice(HOTEL_SUFFIXES)} {location['city']}"
+        price = lognormal_price(rng, 90, 0.6, 20)
+        document = {
+            "id": seeded_uuid(rng),
+            "name": name,
+            "description": description(rng, name, location),
+            "location": location,
+            "images": [],
+            "amenities": rng.sample(HOTEL_AMENITIES, rng.randint(3, 8)),
+            "room_types": [
+                {"type": "Standard Room", "price": price, "description": "Garden view"},
+                {"type": "Deluxe Room", "price": round(price * 1.5, 2), "description": "Ocean or city view"},
+                {"type": "Suite", "price": round(price * 2.4, 2), "description": "Separate living area"},
+            ][:rng.randint(1, 3)],
+            "price_per_night": price,
+            **rating_and_reviews(rng, as_of, 8),
+            "available": rng.random() > 0.03,
+            "contact_info": {"phone": phone(rng), "email": f"reservations{index}@hotels.example.sl"},
+            "created_at": created_at(rng, as_of),
+        }
+        yield document, (document["id"], name, price, 1)
+
+
+def generate_cars(rng: random.Random, count: int, as_of: datetime) -> Iterator[Tuple[Dict[str, Any], tuple]]:
+    for index in range(count):
+        location = pick_location(rng)
+        brand, model, seats = rng.choice(CAR_MODELS)
+        year = rng.randint(2010, as_of.year)
+        name = f"{brand} {model} {year}"
+        price = lognormal_price(rng, 60 + (year - 2010) * 3, 0.35, 20)
+        document = {
+            "id": seeded_uuid(rng),
+            "name": name,
+            "brand": brand,
+            "model": model,
+            "year": year,
+            "description": description(rng, name, location),
+            "location": location,
+            "images": [],
+            "features": rng.sample(CAR_FEATURES, rng.randint(2, 5)),
+            "price_per_day": price,
+            "transmission": rng.choices(["Manual", "Automatic"], weights=[55, 45])[0],
+            "fuel_type": rng.choices(["Petrol", "Diesel"], weights=[40, 60])[0],
+            "seats": seats,
+            "available": rng.random() > 0.05,
+            **rating_and_reviews(rng, as_of, 4),
+            "contact_info": {"phone": phone(rng)},
+            "created_at": created_at(rng, as_of),
+        }
+        yield document, (document["id"], name, price, 1)
+
+
+def generate_events(rng: random.Random, count: int, as_of: datetime) -> Iterator[Tuple[Dict[str, Any], tuple]]:
+    for index in range(count):
+        location = pick_location(rng)
+        category, kind = rng.choice(EVENT_KINDS)
+        date = seasonal_day(rng, as_of - timedelta(days=365), as_of + timedelta(days=365)) + timedelta(hours=rng.choice([10, 14, 18, 20]))
+        name = f"{location['city']} {kind} {date.year}"
+        max_attendees = rng.choice([100, 250, 500, 1000, 2500, 5000, 10000])
+        document = {
+            "id": seeded_uuid(rng),
+            "name": name,
+            "description": description(rng, name, location),
+            "location": location,
+            "date": date,
+            "end_date": date + timedelta(hours=rng.choice([3, 6, 12, 48])),
+            "images": [],
+            "category": category,
+            "price": lognormal_price(rng, 20, 0.7, 2),
+            "max_attendees": max_attendees,
+            "current_attendees": rng.randint(0, max_attendees),
+            "organizer": f"{rng.choice(LAST_NAMES)} Events",
+            "available": date > as_of,
+            **rating_and_reviews(rng, as_of, 3),
+            "contact_info": {"phone": phone(rng)},
+            "created_at": date - timedelta(days=rng.randint(14, 180)),
+        }
+        yield document, (document["id"], name, document["price"], 1)
+
+
+def generate_tours(rng: random.Random, count: int, as_of: datetime) -> Iterator[Tuple[Dict[str, Any], tuple]]:
+    for index in range(count):
+        destinations = [pick_location(rng) for _ in range(rng.randint(1, 4))]
+        name = f"{rng.choice(TOUR_NAMES)} ({rng.choice(LAST_NAMES)} Tours)"
+        duration = rng.choices([1, 2, 3, 4, 5, 7, 10], weights=[30, 20, 20, 10, 10, 7, 3])[0]
+        price = lognormal_price(rng, 80 * duration, 0.4, 25)
+        document = {
+            "id": seeded_uuid(rng),
+            "name": name,
+            "description": description(rng, name, destinations[0]),
+            "destinations": destinations,
+            "duration_days": duration,
+            "images": [],
+            "included": rng.sample(TOUR_INCLUDED, rng.randint(2, 6)),
+            "price_per_person": price,
+            "max_group_size": rng.choice([4, 6, 8, 12, 16, 20]),
+            "difficulty_level": rng.choices(["Easy", "Moderate", "Challenging"], weights=[50, 35, 15])[0],
+            "tour_type": rng.choice(["Cultural", "Adventure", "Beach", "Historical", "Wildlife"]),
+            "available": rng.random() > 0.05,
+            **rating_and_reviews(rng, as_of, 6),
+            "contact_info": {"phone": phone(rng)},
+            "created_at": created_at(rng, as_of),
+        }
+        yield document, (document["id"], name, price, duration)
+
+
+def generate_properties(rng: random.Random, count: int, as_of: datetime) -> Iterator[Tuple[Dict[str, Any], tuple]]:
+    for index in range(count):
+        location = pick_location(rng)
+        property_type = rng.choices(["House", "Apartment", "Land", "Commercial"], weights=[35, 30, 25, 10])[0]
+        listing_type = "Sale" if property_type == "Land" else rng.choices(["Sale", "Rent"], weights=[45, 55])[0]
+        bedrooms = None if property_type in ("Land", "Commercial") else rng.randint(1, 6)
+        area_sqm = round(rng.uniform(400, 5000) if property_type == "Land" else rng.uniform(40, 600), 1)
+        price = (
+            lognormal_price(rng, 900 if location["city"] == "Freetown" else 400, 0.6, 100)
+            if listing_type == "Rent"
+            else lognormal_price(rng, 90000 if location["city"] == "Freetown" else 35000, 0.9, 3000)
+        )
+        title = f"{bedrooms}-Bedroom {property_type}" if bedrooms else f"{int(area_sqm)} sqm {property_type}"
+        title += f" in {location['area'] or location['city']}"
+        document = {
+            "id": seeded_uuid(rng),
+            "title": title,
+            "description": description(rng, title, location),
+            "location": location,
+            "property_type": property_type,
+            "listing_type": listing_type,
+            "price": price,
+            "bedrooms": bedrooms,
+            "bathrooms": max(1, bedrooms - rng.randint(0, 2)) if bedrooms else None,
+            "area_sqm": area_sqm,
+            "images": [],
+            "features": rng.sample(PROPERTY_FEATURES, rng.randint(2, 6)),
+            "available": rng.random() > 0.15,
+            "contact_info": {"phone": phone(rng), "agent": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"},
+            **rating_and_reviews(rng, as_of, 1),
+            "created_at": created_at(rng, as_of),
+        }
+        yield document, None
+
+
+def generate_users(rng: random.Random, count: int, as_of: datetime, password_hash: str) -> Iterator[Tuple[Dict[str, Any], str]]:
+    for index in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        document = {
+            "id": seeded_uuid(rng),
+            "email": f"{first.lower()}.{last.lower()}.{index}@example.sl",
+            "password_hash": password_hash,
+            "full_name": f"{first} {last}",
+            "phone": phone(rng) if rng.random() > 0.3 else None,
+            "user_type": "user",
+            "created_at": created_at(rng, as_of),
+            "is_active": rng.random() > 0.02,
+        }
+        yield document, document["id"]
+
+
+def seasonal_day(rng: random.Random, start: datetime, end: datetime) -> datetime:
+    # Rejection sampling against the month and weekday weights
+    span = (end - start).days
+    while True:
+        day = start + timedelta(days=rng.randrange(span))
+        weight = MONTH_WEIGHTS[day.month] * WEEKDAY_WEIGHTS[day.weekday()]
+        if rng.random() * SEASON_PEAK < weight:
+            return day.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def skewed_index(rng: random.Random, size: int) -> int:
+    # A few popular listings and users take most of the traffic (roughly Zipf-like)
+    return min(size - 1, int(size * rng.random() ** 3))
+
+
+def generate_bookings(
+    rng: random.Random,
+    count: int,
+    as_of: datetime,
+    user_ids: List[str],
+    listings: Dict[str, List[tuple]],
+) -> Iterator[Tuple[Dict[str, Any], None]]:
+    bookable = [(service_type, share) for service_type, (_, share) in BOOKABLE.items() if listings.get(service_type)]
+    if not user_ids or not bookable:
+        return
+    history_start = as_of - timedelta(days=730)
+    horizon = as_of + timedelta(days=180)
+    for _ in range(count):
+        service_type = rng.choices([t for t, _ in bookable], weights=[s for _, s in bookable])[0]
+        service_id, service_name, price, duration = listings[service_type][skewed_index(rng, len(listings[service_type]))]
+        while True:
+            start_date = seasonal_day(rng, history_start, horizon)
+            lead = timedelta(days=min(180.0, rng.lognormvariate(math.log(14), 0.9)))
+            booking_date = start_date - lead + timedelta(minutes=rng.randint(0, 1439))
+            if booking_date <= as_of:
+                break
+
+        if service_type == "hotel":
+            units = rng.choices([1, 2, 3, 4, 5, 7, 10], weights=[25, 25, 20, 10, 8, 8, 4])[0]
+        elif service_type == "car":
+            units = rng.choices([1, 2, 3, 5, 7, 14], weights=[30, 25, 20, 12, 9, 4])[0]
+        else:
+            units = duration
+        guests = rng.choices([1, 2, 3, 4, 5, 6], weights=[25, 40, 12, 13, 5, 5])[0]
+        per_night = service_type in ("hotel", "car")
+        per_guest = service_type in ("hotel", "event", "tour")
+        total_price = round(price * (units if per_night else 1) * (guests if per_guest else 1), 2)
+
+        document = {
+            "id": seeded_uuid(rng),
+            "user_id": user_ids[skewed_index(rng, len(user_ids))],
+            "service_type": service_type,
+            "service_id": service_id,
+            "service_name": service_name,
+            "booking_date": booking_date,
+            "start_date": start_date,
+            "end_date": start_date + timedelta(days=units) if per_night or service_type == "tour" else None,
+            "guests": guests,
+            "total_price": total_price,
+            "payment_status": "paid",
+            "payment_intent_id": None,
+            "stripe_payment_id": None,
+            "status": "confirmed",
+            "special_requests": rng.choice([None] * 8 + ["Late check-in", "Airport pickup", "Vegetarian meals"]),
+            "expired_at": None,
+        }
+        outcome = rng.random()
+        if as_of - booking_date < timedelta(minutes=30) and outcome < 0.5:
+            document["payment_status"] = "pending"
+        elif outcome < 0.10:
+            # Unpaid holds released by the lifecycle sweeper
+            document.update(payment_status="expired", status="cancelled", expired_at=booking_date + timedelta(minutes=30))
+        elif outcome < 0.13:
+            document.update(payment_status="refunded", status="cancelled")
+        if document["payment_status"] in ("paid", "refunded"):
+            document["payment_intent_id"] = f"pi_{rng.getrandbits(96):024x}"
+            document["stripe_payment_id"] = document["payment_intent_id"]
+        yield document, None
+
+
+def stored(document: Dict[str, Any], id_storage: str) -> Dict[str, Any]:
+    # Mirrors the backend's to_document for ID_STORAGE=binary
+    if id_storage == "binary":
+        document["_id"] = uuid.UUID(document.pop("id"))
+        for field in ("user_id", "service_id"):
+            if isinstance(document.get(field), str):
+                document[field] = uuid.UUID(document[field])
+    return document
+
+
+def load(db, collection: str, items: Iterator[Tuple[Dict[str, Any], Any]], batch_size: int, id_storage: str,
+         keep: Callable[[Any], None] = None) -> Dict[str, Any]:
+    started = time.perf_counter()
+    inserted = 0
+    batch: List[Dict[str, Any]] = []
+    for document, info in items:
+        if keep is not None and info is not None:
+            keep(info)
+        batch.append(stored(document, id_storage))
+        if len(batch) == batch_size:
+            db[collection].insert_many(batch, ordered=False)
+            inserted += len(batch)
+            batch = []
+            print(f"\r{collection}: {inserted}", end="", file=sys.stderr)
+    if batch:
+        db[collection].insert_many(batch, ordered=False)
+        inserted += len(batch)
+    elapsed = time.perf_counter() - started
+    print(f"\r{collection}: {inserted} in {elapsed:.1f}s", file=sys.stderr)
+    return {"documents": inserted, "seconds": round(elapsed, 2), "docs_per_s": round(inserted / elapsed) if elapsed else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", required=True)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on the base volume")
+    for collection in BASE_COUNTS:
+        parser.add_argument(f"--{collection.replace('_', '-')}", type=int, dest=collection, help=f"override the {collection} count")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--as-of", default=datetime.utcnow().strftime("%Y-%m-%d"),
+                        help="date the data set is generated as of (YYYY-MM-DD); fix it for reproducible output")
+    parser.add_argument("--id-storage", choices=["string", "binary"], default="string")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--password", default="password123", help="password shared by every generated user")
+    parser.add_argument("--drop", action="store_true", help="drop the generated collections, and those derived from them, first")
+    args = parser.parse_args()
+
+    as_of = datetime.strptime(args.as_of, "%Y-%m-%d")
+    counts = {
+        collection: getattr(args, collection) if getattr(args, collection) is not None else int(base * args.scale)
+        for collection, base in BASE_COUNTS.items()
+    }
+
+    client = MongoClient(args.mongo_url, uuidRepresentation="standard")
+    db = client[args.db_name]
+    if args.drop:
+        for collection in list(BASE_COUNTS) + DERIVED_COLLECTIONS:
+            db.drop_collection(collection)
+
+    # One hash for everyone; bcrypt per user would dominate the run time
+    password_hash = bcrypt.hashpw(args.password.encode("utf-8"), bcrypt.gensalt(rounds=10)).decode("utf-8")
+
+    listings: Dict[str, List[tuple]] = {service_type: [] for service_type in BOOKABLE}
+    user_ids: List[str] = []
+    generators = [
+        ("hotels", "hotel", generate_hotels),
+        ("cars", "car", generate_cars),
+        ("events", "event", generate_events),
+        ("tours", "tour", generate_tours),
+        ("real_estate", None, generate_properties),
+    ]
+    report: Dict[str, Any] = {"seed": args.seed, "as_of": args.as_of, "id_storage": args.id_storage, "collections": {}}
+    started = time.perf_counter()
+    for collection, service_type, generate in generators:
+        rng = stream_rng(args.seed, collection)
+        keep = listings[service_type].append if service_type else None
+        report["collections"][collection] = load(
+            db, collection, generate(rng, counts[collection], as_of), args.batch_size, args.id_storage, keep
+        )
+    report["collections"]["users"] = load(
+        db, "users", generate_users(stream_rng(args.seed, "users"), counts["users"], as_of, password_hash),
+        args.batch_size, args.id_storage, user_ids.append,
+    )
+    report["collections"]["bookings"] = load(
+        db, "bookings", generate_bookings(stream_rng(args.seed, "bookings"), counts["bookings"], as_of, user_ids, listings),
+        args.batch_size, args.id_storage,
+    )
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(report, indent=2))
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
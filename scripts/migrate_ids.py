@@ -0,0 +1,186 @@
+"""Migrate Sierra Explore identifiers between string `id` fields and binary UUID `_id`s.
+
+Each collection is copied into a scratch collection in the target layout, its
+secondary indexes are rebuilt with `id` rewritten to `_id` (or back), and the copy
+is swapped in with renameCollection. Document, index and WiredTiger cache sizes are
+measured before and after so the saving can be checked against the real data set.
+
+    python scripts/migrate_ids.py --mongo-url mongodb://localhost:27017 --db-name sierra_explore --to binary
+    python scripts/migrate_ids.py --mongo-url ... --db-name ... --to string   # roll back
+    python scripts/migrate_ids.py --mongo-url ... --db-name ... --measure-only
+
+Stop the API while migrating and restart it with ID_STORAGE set to the --to value.
+"""
+import argparse
+import json
+import sys
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+
+COLLECTIONS = ["users", "hotels", "cars", "events", "tours", "real_estate", "bookings", "trip_plans"]
+REFERENCE_FIELDS = ("user_id", "service_id")
+SCRATCH_SUFFIX = "__id_migration"
+
+
+def parse_uuid(value):
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        return value
+
+
+def to_binary(document: Dict[str, Any]) -> Dict[str, Any]:
+    if "id" in document:
+        # The ObjectId `_id` is dropped; the uuid becomes the primary key
+        document["_id"] = parse_uuid(document.pop("id"))
+    for field in REFERENCE_FIELDS:
+        if isinstance(document.get(field), str):
+            document[field] = parse_uuid(document[field])
+    return document
+
+
+def to_string(document: Dict[str, Any]) -> Dict[str, Any]:
+    if "id" not in document:
+        # A fresh ObjectId `_id` is assigned on insert
+        document["id"] = str(document.pop("_id"))
+    for field in REFERENCE_FIELDS:
+        if isinstance(document.get(field), uuid.UUID):
+            document[field] = str(document[field])
+    return document
+
+
+def needs_migration(collection, target: str) -> bool:
+    if target == "binary":
+        return collection.find_one({"id": {"$exists": True}}, {"_id": 1}) is not None
+    return collection.find_one({"id": {"$exists": False}}, {"_id": 1}) is not None
+
+
+def warm(collection):
+    # Touch every document and every index entry so the cache holds the full working set
+    for _ in collection.find({}, batch_size=1000):
+        pass
+    for name in collection.index_information():
+        try:
+            for _ in collection.find({}, {"_id": 1}).hint(name):
+                pass
+        except OperationFailure:
+            # Partial indexes cannot be hinted for an unfiltered scan
+            continue
+
+
+def measure(db, name: str) -> Dict[str, Any]:
+    warm(db[name])
+    stats = db.command("collStats", name)
+    cache_bytes = stats.get("wiredTiger", {}).get("cache", {}).get("bytes currently in the cache", 0)
+    index_cache_bytes = sum(
+        details.get("cache", {}).get("bytes currently in the cache", 0)
+        for details in stats.get("indexDetails", {}).values()
+    )
+    return {
+        "count": stats.get("count", 0),
+        "avg_obj_size": stats.get("avgObjSize", 0),
+        "size": stats.get("size", 0),
+        "storage_size": stats.get("storageSize", 0),
+        "total_index_size": stats.get("totalIndexSize", 0),
+        "index_sizes": stats.get("indexSizes", {}),
+        "cache_bytes": cache_bytes,
+        "index_cache_bytes": index_cache_bytes,
+    }
+
+
+def rewritten_indexes(collection, target: str) -> List[tuple]:
+    indexes = []
+    for name, info in collection.index_information().items():
+        if name == "_id_":
+            continue
+        keys = info["key"]
+        if target == "binary":
+            if [field for field, _ in keys] == ["id"]:
+                continue  # `_id` is the identifier now
+            keys = [("_id" if field == "id" else field, direction) for field, direction in keys]
+        else:
+            keys = [("id" if field == "_id" else field, direction) for field, direction in keys]
+        options = {key: value for key, value in info.items() if key not in ("key", "v", "ns")}
+        indexes.append((keys, options))
+    if target == "string" and not any([field for field, _ in keys] == ["id"] for keys, _ in indexes):
+        indexes.append(([("id", 1)], {"unique": True}))
+    return indexes
+
+
+def migrate(db, name: str, target: str, batch_size: int) -> int:
+    source = db[name]
+    scratch = db[name + SCRATCH_SUFFIX]
+    scratch.drop()
+    convert = to_binary if target == "binary" else to_string
+
+    copied = 0
+    batch = []
+    for document in source.find({}, batch_size=batch_size):
+        batch.append(convert(document))
+        if len(batch) == batch_size:
+            scratch.insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+    if batch:
+        scratch.insert_many(batch, ordered=False)
+        copied += len(batch)
+
+    for keys, options in rewritten_indexes(source, target):
+        scratch.create_index(keys, **options)
+    scratch.rename(name, dropTarget=True)
+    return copied
+
+
+def totals(measurements: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    return {
+        key: sum(measurement[key] for measurement in measurements.values())
+        for key in ("size", "storage_size", "total_index_size", "cache_bytes", "index_cache_bytes")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", required=True)
+    parser.add_argument("--to", choices=["binary", "string"], default="binary")
+    parser.add_argument("--collections", nargs="+", default=COLLECTIONS, choices=COLLECTIONS)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--measure-only", action="store_true")
+    parser.add_argument("--output", help="Write the JSON report here as well as stdout")
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_url, uuidRepresentation="standard")
+    db = client[args.db_name]
+    existing = set(db.list_collection_names())
+    names = [name for name in args.collections if name in existing]
+
+    report: Dict[str, Any] = {"to": args.to, "collections": {}}
+    before = {name: measure(db, name) for name in names}
+    for name in names:
+        entry: Dict[str, Any] = {"before": before[name]}
+        if not args.measure_only and needs_migration(db[name], args.to):
+            entry["migrated"] = migrate(db, name, args.to, args.batch_size)
+            print(f"{name}: migrated {entry['migrated']} documents", file=sys.stderr)
+        report["collections"][name] = entry
+
+    if not args.measure_only:
+        after = {name: measure(db, name) for name in names}
+        for name in names:
+            report["collections"][name]["after"] = after[name]
+        report["totals"] = {"before": totals(before), "after": totals(after)}
+    else:
+        report["totals"] = {"before": totals(before)}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+#!/bin/bash
+# Start a local single-node replica set so change streams (/api/stream/catalog) can be
+# exercised in development. Point the backend at the printed MONGO_URL.
+set -e
+
+DBPATH=${DBPATH:-/tmp/sierra-explore-rs0}
+PORT=${PORT:-27017}
+REPLSET=${REPLSET:-rs0}
+
+mkdir -p "$DBPATH"
+mongod --replSet "$REPLSET" --port "$PORT" --dbpath "$DBPATH" --bind_ip 127.0.0.1 \
+    --fork --logpath "$DBPATH/mongod.log"
+
+mongosh --port "$PORT" --quiet --eval "
+try {
+    rs.status();
+} catch (e) {
+    rs.initiate({_id: '$REPLSET', members: [{_id: 0, host: '127.0.0.1:$PORT'}]});
+}
+"
+
+echo "MONGO_URL=mongodb://127.0.0.1:$PORT/?replicaSet=$REPLSET"
@@ -0,0 +1,133 @@
+"""Benchmark for the Parquet booking archive.
+
+Archives synthetic bookings from scripts/generate_data.py whose trips ended more than a
+year before --as-of, then reports the archive size against the same documents as BSON,
+the write throughput, and the latency of typical admin queries against the archive. No
+mongod is needed; pyarrow is.
+
+    python -m tests.archive_benchmark
+    python -m tests.archive_benchmark --bookings 100000 1000000 --output archive.json
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+import bson
+
+from tests.benchmark import ROOT_DIR, git_commit, load_app
+
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+import generate_data  # noqa: E402
+
+
+def synthetic_bookings(count: int, as_of: datetime, seed: int) -> List[Dict[str, Any]]:
+    listings: Dict[str, List[tuple]] = {}
+    for collection, service_type, generate in [
+        ("hotels", "hotel", generate_data.generate_hotels),
+        ("cars", "car", generate_data.generate_cars),
+        ("events", "event", generate_data.generate_events),
+        ("tours", "tour", generate_data.generate_tours),
+    ]:
+        rng = generate_data.stream_rng(seed, collection)
+        listings[service_type] = [info for _, info in generate(rng, 500, as_of)]
+    users = generate_data.generate_users(generate_data.stream_rng(seed, "users"), max(1000, count // 20), as_of, "-")
+    user_ids = [user_id for _, user_id in users]
+    rng = generate_data.stream_rng(seed, "bookings")
+    return [document for document, _ in generate_data.generate_bookings(rng, count, as_of, user_ids, listings)]
+
+
+def timed_ms(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def benchmark_bookings(server, count: int, as_of: datetime, seed: int, repeat: int) -> Dict[str, Any]:
+    bookings = synthetic_bookings(count, as_of, seed)
+    cutoff = as_of - timedelta(days=server.BOOKING_ARCHIVE_AFTER_DAYS)
+    # The same selection archive_bookings makes
+    cold = [
+        booking for booking in bookings
+        if booking["booking_date"] < cutoff and (booking["end_date"] or booking["start_date"]) < cutoff
+    ]
+    bson_bytes = sum(len(bson.encode(generate_data.stored(dict(booking), "string"))) for booking in cold)
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        start = time.perf_counter()
+        parquet_bytes = 0
+        for offset in range(0, len(cold), server.BOOKING_ARCHIVE_BATCH):
+            parquet_bytes += server.write_archive_parts(directory, cold[offset:offset + server.BOOKING_ARCHIVE_BATCH])
+        write_s = time.perf_counter() - start
+        summary = server.archive_summary(directory)
+
+        picker = random.Random(seed)
+        month = picker.choice(list(summary["months"]))
+        month_start = datetime.strptime(month, "%Y-%m")
+        queries = {
+            "by_user": lambda: server.BookingFilters(user_id=picker.choice(cold)["user_id"]),
+            "by_month": lambda: server.BookingFilters(since=month_start, until=month_start + timedelta(days=31)),
+            "refunded_all_months": lambda: server.BookingFilters(payment_status="refunded"),
+        }
+        latency = {
+            name: round(statistics.median(
+                timed_ms(server.query_archive, directory, make_filters(), 1000) for _ in range(repeat)
+            ), 2)
+            for name, make_filters in queries.items()
+        }
+
+    return {
+        "bookings": count,
+        "archived": len(cold),
+        "partitions": len(summary["months"]),
+        "files": summary["files"],
+        "bson_bytes": bson_bytes,
+        "parquet_bytes": parquet_bytes,
+        "compression_ratio": round(bson_bytes / parquet_bytes, 1) if parquet_bytes else None,
+        "write_s": round(write_s, 3),
+        "write_bookings_per_s": round(len(cold) / write_s) if write_s else None,
+        "query_ms": latency,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookings", type=int, nargs="+", default=[100000])
+    parser.add_argument("--as-of", type=datetime.fromisoformat, default=datetime(2025, 6, 1))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this path")
+    args = parser.parse_args()
+
+    server = load_app("mongodb://localhost:27017", "sierra_explore_benchmark", 0, 0, "off")
+    if server.pa is None:
+        parser.error("pyarrow is not installed")
+    results: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {key: str(value) for key, value in vars(args).items() if key != "output"},
+        "bookings": {},
+    }
+    for count in args.bookings:
+        stats = benchmark_bookings(server, count, args.as_of, args.seed, args.repeat)
+        results["bookings"][str(count)] = stats
+        print(
+            f"{count:>8} bookings  {stats['archived']:>8} archived in {stats['files']} files"
+            f"  BSON {stats['bson_bytes'] / 2 ** 20:>7.1f} MB -> Parquet {stats['parquet_bytes'] / 2 ** 20:>6.1f} MB"
+            f" ({stats['compression_ratio']}x)  write {stats['write_s']:>6.2f} s"
+            f"  query ms {json.dumps(stats['query_ms'])}"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Benchmark for the autocomplete index.
+
+Builds the in-memory index over synthetic listings from scripts/generate_data.py (in the
+generator's mix of hotels, cars, events, tours and properties) and replays typed prefixes
+of real listing and place words, some with a typo or accents added, reporting suggestion
+latency with and without the result cache and the cost of an incremental update. No
+mongod is needed.
+
+    python -m tests.autocomplete_benchmark
+    python -m tests.autocomplete_benchmark --entries 10000 100000 --queries 5000 --output autocomplete.json
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from tests.benchmark import ROOT_DIR, git_commit, load_app
+
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+import generate_data  # noqa: E402
+
+GENERATORS = [
+    ("hotels", "hotel", generate_data.generate_hotels),
+    ("cars", "car", generate_data.generate_cars),
+    ("events", "event", generate_data.generate_events),
+    ("tours", "tour", generate_data.generate_tours),
+    ("real_estate", "real-estate", generate_data.generate_properties),
+]
+ACCENTS = {"a": "á", "e": "é", "i": "í", "o": "ó", "u": "ú"}
+
+
+def synthetic_listings(count: int, seed: int) -> List[Tuple[str, Dict[str, Any], float]]:
+    total = sum(generate_data.BASE_COUNTS[collection] for collection, _, _ in GENERATORS)
+    listings = []
+    for collection, service_type, generate in GENERATORS:
+        share = round(count * generate_data.BASE_COUNTS[collection] / total)
+        rng = generate_data.stream_rng(seed, collection)
+        trending = random.Random(seed)
+        listings += [
+            (service_type, document, trending.expovariate(1.0) if trending.random() < 0.2 else 0.0)
+            for document, _ in generate(rng, share, datetime(2025, 6, 1))
+        ]
+    return listings
+
+
+def typed_queries(rng: random.Random, listings: List[tuple], count: int) -> List[str]:
+    # What someone is part-way through typing: a prefix of one or two words of a real name or place
+    queries = []
+    while len(queries) < count:
+        _, document, _ = rng.choice(listings)
+        location = document.get("location") or document["destinations"][0]
+        text = rng.choice([document.get("name") or document.get("title"), location["city"], location["district"]])
+        words = text.split()
+        start = rng.randrange(len(words))
+        words = words[start:start + rng.choice([1, 1, 2])]
+        last = words[-1][:rng.randint(1, len(words[-1]))]
+        query = " ".join(words[:-1] + [last])
+        roll = rng.random()
+        if roll < 0.15 and len(query) >= 5:
+            position = rng.randrange(1, len(query))
+            query = query[:position] + rng.choice("abcdefghijklmnopqrstuvwxyz") + query[position + 1:]
+        elif roll < 0.25:
+            query = "".join(ACCENTS.get(char, char) for char in query)
+        queries.append(query)
+    return queries
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "p50_us": round(ordered[len(ordered) // 2] * 1e6, 1),
+        "p99_us": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6, 1),
+        "max_us": round(ordered[-1] * 1e6, 1),
+    }
+
+
+def benchmark_entries(server, count: int, queries: int, seed: int) -> Dict[str, Any]:
+    listings = synthetic_listings(count, seed)
+    start = time.perf_counter()
+    index = server.AutocompleteIndex.build(listings)
+    build_s = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    typed = typed_queries(rng, listings, queries)
+    uncached, cached, empty = [], [], 0
+    for query in typed:
+        index.cache.clear()
+        start = time.perf_counter()
+        suggestions = index.suggest(query, server.AUTOCOMPLETE_LIMIT)
+        uncached.append(time.perf_counter() - start)
+        empty += not suggestions
+        # The same keystroke again, as from the next visitor
+        start = time.perf_counter()
+        index.suggest(query, server.AUTOCOMPLETE_LIMIT)
+        cached.append(time.perf_counter() - start)
+
+    updates = []
+    for service_type, document, trending in rng.sample(listings, min(500, len(listings))):
+        changed = {**document, "reviews_count": document.get("reviews_count", 0) + 1}
+        start = time.perf_counter()
+        index.upsert_listing(service_type, document["id"], changed, trending)
+        updates.append(time.perf_counter() - start)
+
+    return {
+        "build_s": round(build_s, 3),
+        **index.stats(),
+        "lookup_uncached": percentiles(uncached),
+        "lookup_cached": percentiles(cached),
+        "no_suggestions_pct": round(100 * empty / len(typed), 1),
+        "update": percentiles(updates),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, nargs="+", default=[10000, 100000], help="listings indexed")
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this path")
+    args = parser.parse_args()
+
+    server = load_app("mongodb://localhost:27017", "sierra_explore_benchmark", 0, 0, "off")
+    results: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "entries": {},
+    }
+    for count in args.entries:
+        stats = benchmark_entries(server, count, args.queries, args.seed)
+        results["entries"][str(count)] = stats
+        print(
+            f"{count:>8} listings  build {stats['build_s']:>6.2f} s  {stats['words']:>6} words"
+            f"  uncached p50 {stats['lookup_uncached']['p50_us']:>8.1f} us p99 {stats['lookup_uncached']['p99_us']:>8.1f} us"
+            f"  cached p99 {stats['lookup_cached']['p99_us']:>6.1f} us"
+            f"  update p99 {stats['update']['p99_us']:>8.1f} us  empty {stats['no_suggestions_pct']}%"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,486 @@
+"""Offline load-testing and benchmark suite for the Sierra Explore API.
+
+Runs the real FastAPI app under uvicorn against a local mongod, with the LLM
+and Stripe backends replaced by in-process stubs with configurable latency.
+
+    python -m tests.benchmark --concurrency 20 --duration 30 --output bench.json
+    python -m tests.benchmark --compare bench-main.json --output bench-branch.json
+
+Logging overhead per request, with every access line kept:
+
+    LOG_ACCESS_SAMPLE_RATE=1 LOG_SAMPLE_RATES=/api/hotels=1 python -m tests.benchmark --scenarios browse booking --log-mode off --output log-off.json
+    LOG_ACCESS_SAMPLE_RATE=1 LOG_SAMPLE_RATES=/api/hotels=1 python -m tests.benchmark --scenarios browse booking --log-mode async --compare log-off.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import types
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+from pymongo import MongoClient
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT_DIR / "backend"
+
+DISTRICTS = [
+    ("Western Area", "Freetown", ["Aberdeen", "Lumley", "Congo Town", "Tokeh", "Hill Station"], 8.4657, -13.2317),
+    ("Bo", "Bo", [None], 7.9644, -11.7383),
+    ("Kenema", "Kenema", [None], 7.8767, -11.1900),
+    ("Bombali", "Makeni", [None], 8.8833, -12.0500),
+    ("Kono", "Koidu", [None], 8.6439, -10.9711),
+    ("Port Loko", "Port Loko", [None], 8.7667, -12.7833),
+]
+
+SCENARIOS = ["browse", "home", "home_fanout", "map", "trending", "auth", "booking", "payment", "trip_planner"]
+CATALOGS = ["hotels", "cars", "events", "tours", "real-estate"]
+
+
+# Stubbed upstreams
+class StubLlmChat:
+    latency = 0.0
+
+    def __init__(self, api_key: str, session_id: str, system_message: str):
+        self.session_id = session_id
+
+    def with_model(self, provider: str, model: str):
+        return self
+
+    async def send_message(self, message):
+        await asyncio.sleep(self.latency)
+        return "Day 1: Freetown beaches. Day 2: Banana Islands. Day 3: Tokeh."
+
+
+class StubPaymentIntent:
+    latency = 0.0
+    _intents: Dict[str, Any] = {}
+    by_booking: Dict[str, str] = {}
+
+    @classmethod
+    def create(cls, amount: int, currency: str, metadata: Dict[str, str]):
+        time.sleep(cls.latency)  # the real Stripe client is synchronous
+        intent = types.SimpleNamespace(
+            id=f"pi_{uuid.uuid4().hex[:24]}",
+            client_secret=f"pi_secret_{uuid.uuid4().hex}",
+            status="succeeded",
+            amount=amount,
+            currency=currency,
+            metadata=metadata,
+        )
+        cls._intents[intent.id] = intent
+        cls.by_booking[metadata["booking_id"]] = intent.id
+        return intent
+
+    @classmethod
+    def retrieve(cls, intent_id: str):
+        time.sleep(cls.latency)
+        return cls._intents[intent_id]
+
+
+def load_app(mongo_url: str, db_name: str, llm_latency_ms: float, stripe_latency_ms: float, log_mode: str):
+    os.environ["MONGO_URL"] = mongo_url
+    os.environ["DB_NAME"] = db_name
+    os.environ["LOG_MODE"] = log_mode
+    # Every benchmark request comes from one client address
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_benchmark")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    StubLlmChat.latency = llm_latency_ms / 1000
+    StubPaymentIntent.latency = stripe_latency_ms / 1000
+    server.LlmChat = StubLlmChat
+    server.stripe.PaymentIntent = StubPaymentIntent
+    return server
+
+
+# Seeding
+def random_location(rng: random.Random) -> Dict[str, Any]:
+    district, city, areas, lat, lng = rng.choice(DISTRICTS)
+    return {
+        "district": district,
+        "city": city,
+        "area": rng.choice(areas),
+        "coordinates": {"lat": lat + rng.uniform(-0.05, 0.05), "lng": lng + rng.uniform(-0.05, 0.05)},
+    }
+
+
+def seed_database(server, mongo_url: str, db_name: str, scale: int, seed: int) -> Dict[str, List[str]]:
+    rng = random.Random(seed)
+    sync_db = MongoClient(mongo_url, uuidRepresentation="standard")[db_name]
+    sync_client = sync_db.client
+    sync_client.drop_database(db_name)
+
+    reviews = [
+        {"user": f"Guest {i}", "rating": rng.randint(3, 5), "comment": "Lovely stay, friendly staff and great food.", "date": "2024-11-15"}
+        for i in range(5)
+    ]
+    description = "Comfortable stay with authentic Sierra Leonean hospitality, close to beaches and markets. " * 3
+
+    hotels = [
+        server.Hotel(
+            name=f"Hotel {i}",
+            description=description,
+            location=random_location(rng),
+            images=[],
+            amenities=rng.sample(["WiFi", "Pool", "Restaurant", "Beach Access", "Spa", "Parking", "Bar"], 4),
+            room_types=[
+                {"type": "Standard Room", "price": 80, "description": "Garden view"},
+                {"type": "Suite", "price": 180, "description": "Ocean view"},
+            ],
+            price_per_night=rng.randint(40, 400),
+            rating=round(rng.uniform(3, 5), 1),
+            reviews_count=len(reviews),
+            reviews=reviews,
+            contact_info={"phone": "+232 77 000 000", "email": "info@example.sl"},
+        ).dict()
+        for i in range(scale)
+    ]
+    cars = [
+        server.Car(
+            name=f"Car {i}",
+            brand="Toyota",
+            model="Land Cruiser",
+            year=rng.randint(2015, 2024),
+            description=description,
+            location=random_location(rng),
+            images=[],
+            features=["4WD", "Air Conditioning", "GPS"],
+            price_per_day=rng.randint(30, 150),
+            transmission=rng.choice(["Manual", "Automatic"]),
+            fuel_type=rng.choice(["Petrol", "Diesel"]),
+            seats=rng.choice([4, 5, 7]),
+            rating=round(rng.uniform(3, 5), 1),
+        ).dict()
+        for i in range(scale)
+    ]
+    events = [
+        server.Event(
+            name=f"Event {i}",
+            description=description,
+            location=random_location(rng),
+            date=datetime(2025, 1, 1) + timedelta(days=rng.randint(0, 365)),
+            images=[],
+            category=rng.choice(["Cultural", "Music", "Festival", "Sports"]),
+            price=rng.randint(5, 60),
+            max_attendees=rng.randint(100, 5000),
+            organizer="Benchmark Events",
+        ).dict()
+        for i in range(scale)
+    ]
+    tours = [
+        server.Tour(
+            name=f"Tour {i}",
+            description=description,
+            destinations=[random_location(rng), random_location(rng)],
+            duration_days=rng.randint(1, 7),
+            images=[],
+            included=["Guide", "Meals", "Transport"],
+            price_per_person=rng.randint(40, 500),
+            max_group_size=rng.randint(4, 20),
+            difficulty_level=rng.choice(["Easy", "Moderate", "Challenging"]),
+            tour_type=rng.choice(["Cultural", "Adventure", "Beach", "Historical"]),
+        ).dict()
+        for i in range(scale)
+    ]
+    properties = [
+        server.RealEstate(
+            title=f"Property {i}",
+            description=description,
+            location=random_location(rng),
+            property_type=rng.choice(["House", "Apartment", "Land", "Commercial"]),
+            listing_type=rng.choice(["Sale", "Rent"]),
+            price=rng.randint(500, 500000),
+            images=[],
+            features=["Parking", "Security"],
+            contact_info={"phone": "+232 77 000 000"},
+        ).dict()
+        for i in range(scale)
+    ]
+    for collection, documents in [
+        ("hotels", hotels),
+        ("cars", cars),
+        ("events", events),
+        ("tours", tours),
+        ("real_estate", properties),
+    ]:
+        # Stored in whatever identifier layout ID_STORAGE selects for the server
+        sync_db[collection].insert_many([server.to_document(document) for document in documents], ordered=False)
+
+    sync_client.close()
+    return {
+        "hotel": [doc["id"] for doc in hotels],
+        "car": [doc["id"] for doc in cars],
+        "event": [doc["id"] for doc in events],
+        "tour": [doc["id"] for doc in tours],
+        "real-estate": [doc["id"] for doc in properties],
+    }
+
+
+# Server
+class BackgroundServer:
+    """Runs uvicorn on its own thread and event loop so it does not share the driver's loop."""
+
+    def __init__(self, app, port: int):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+# Driver
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def call(self, client: httpx.AsyncClient, label: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        self.samples.setdefault(label, []).append(time.perf_counter() - start)
+        if response is None or response.status_code >= 400:
+            self.errors[label] = self.errors.get(label, 0) + 1
+            return None
+        return response
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        results = {}
+        for label, samples in sorted(self.samples.items()):
+            latencies = np.array(samples) * 1000
+            results[label] = {
+                "requests": len(samples),
+                "errors": self.errors.get(label, 0),
+                "rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+                "max_ms": round(float(latencies.max()), 3),
+            }
+        return results
+
+
+async def login_user(client: httpx.AsyncClient, rec: Recorder) -> Dict[str, str]:
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.sl"
+    response = await rec.call(
+        client, "POST /api/auth/signup", "POST", "/api/auth/signup",
+        json={"email": email, "password": "benchmark-pass", "full_name": "Bench User"},
+    )
+    token = response.json()["access_token"] if response is not None else ""
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def scenario_browse(client, rec, ids, rng, headers):
+    service = rng.choice(CATALOGS)
+    await rec.call(client, f"GET /api/{service}", "GET", f"/api/{service}")
+    service_type = {"hotels": "hotel", "cars": "car", "events": "event", "tours": "tour", "real-estate": "real-estate"}[service]
+    detail = f"/api/{service}/{rng.choice(ids[service_type])}"
+    await rec.call(client, f"GET /api/{service}/{{id}}", "GET", detail)
+
+
+async def scenario_home(client, rec, ids, rng, headers):
+    await rec.call(client, "GET /api/home", "GET", "/api/home")
+
+
+async def scenario_home_fanout(client, rec, ids, rng, headers):
+    # The landing page before /api/home: every catalog list in parallel, trimmed client-side
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        rec.call(client, f"GET /api/{catalog}", "GET", f"/api/{catalog}") for catalog in CATALOGS
+    ))
+    rec.samples.setdefault("GET home fan-out (5 lists)", []).append(time.perf_counter() - start)
+
+
+async def scenario_map(client, rec, ids, rng, headers):
+    # Panning around a town at a city-to-street zoom level
+    _, _, _, lat, lng = rng.choice(DISTRICTS)
+    z = rng.randint(8, 16)
+    n = 2 ** z
+    x = int((lng + rng.uniform(-0.05, 0.05) + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat + rng.uniform(-0.05, 0.05)))) / math.pi) / 2 * n)
+    await rec.call(client, "GET /api/map/tiles/{z}/{x}/{y}", "GET", f"/api/map/tiles/{z}/{x}/{y}")
+
+
+async def scenario_trending(client, rec, ids, rng, headers):
+    service = rng.choice(CATALOGS)
+    await rec.call(client, "GET /api/{catalog}?sort=trending", "GET", f"/api/{service}", params={"sort": "trending"})
+    await rec.call(client, "GET /api/trending", "GET", "/api/trending")
+
+
+async def scenario_auth(client, rec, ids, rng, headers):
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.sl"
+    await rec.call(
+        client, "POST /api/auth/signup", "POST", "/api/auth/signup",
+        json={"email": email, "password": "benchmark-pass", "full_name": "Bench User"},
+    )
+    await rec.call(
+        client, "POST /api/auth/login", "POST", "/api/auth/login",
+        json={"email": email, "password": "benchmark-pass"},
+    )
+
+
+async def create_booking(client, rec, ids, rng, headers) -> Optional[Dict[str, Any]]:
+    service_type = rng.choice(["hotel", "car", "event", "tour"])
+    start = datetime(2025, 12, 1) + timedelta(days=rng.randint(0, 90))
+    response = await rec.call(
+        client, "POST /api/bookings/create", "POST", "/api/bookings/create", headers=headers,
+        json={
+            "service_type": service_type,
+            "service_id": rng.choice(ids[service_type]),
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=rng.randint(1, 5))).isoformat(),
+            "guests": rng.randint(1, 4),
+        },
+    )
+    return response.json() if response is not None else None
+
+
+async def scenario_booking(client, rec, ids, rng, headers):
+    await create_booking(client, rec, ids, rng, headers)
+    await rec.call(client, "GET /api/my-bookings", "GET", "/api/my-bookings", headers=headers)
+
+
+async def scenario_payment(client, rec, ids, rng, headers):
+    booking = await create_booking(client, rec, ids, rng, headers)
+    if booking is None:
+        return
+    await rec.call(
+        client, "POST /api/payments/create-intent", "POST", "/api/payments/create-intent", headers=headers,
+        json={"booking_id": booking["id"], "amount": booking["total_price"]},
+    )
+    intent_id = StubPaymentIntent.by_booking.get(booking["id"])
+    if intent_id is not None:
+        await rec.call(
+            client, "POST /api/payments/confirm", "POST", "/api/payments/confirm", headers=headers,
+            params={"payment_intent_id": intent_id},
+        )
+
+
+async def scenario_trip_planner(client, rec, ids, rng, headers):
+    await rec.call(
+        client, "POST /api/ai-trip-planner", "POST", "/api/ai-trip-planner",
+        params={"query": "Beaches and culture", "duration": rng.randint(2, 7)},
+        json=rng.sample(["Freetown", "Tokeh", "Banana Islands", "Bo", "Kenema"], 2),
+    )
+
+
+SCENARIO_FUNCS: Dict[str, Callable] = {
+    "browse": scenario_browse,
+    "home": scenario_home,
+    "home_fanout": scenario_home_fanout,
+    "map": scenario_map,
+    "trending": scenario_trending,
+    "auth": scenario_auth,
+    "booking": scenario_booking,
+    "payment": scenario_payment,
+    "trip_planner": scenario_trip_planner,
+}
+
+
+async def run_scenario(base_url: str, name: str, ids, concurrency: int, duration: float, seed: int) -> Dict[str, Any]:
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        headers = await login_user(client, Recorder())
+        deadline = time.perf_counter() + duration
+
+        async def worker(worker_id: int):
+            rng = random.Random(seed * 1000 + worker_id)
+            while time.perf_counter() < deadline:
+                await SCENARIO_FUNCS[name](client, rec, ids, rng, headers)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {"elapsed_s": round(elapsed, 3), "endpoints": rec.summary(elapsed)}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"{'scenario / endpoint':60} {'p95 base':>10} {'p95 now':>10} {'rps base':>10} {'rps now':>10}")
+    for scenario, result in current["scenarios"].items():
+        base_endpoints = baseline.get("scenarios", {}).get(scenario, {}).get("endpoints", {})
+        for label, stats in result["endpoints"].items():
+            base = base_endpoints.get(label)
+            if base is None:
+                continue
+            print(
+                f"{scenario + ' ' + label:60} {base['p95_ms']:>10.2f} {stats['p95_ms']:>10.2f}"
+                f" {base['rps']:>10.1f} {stats['rps']:>10.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="sierra_explore_benchmark")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per scenario")
+    parser.add_argument("--scale", type=int, default=500, help="listings seeded per catalog")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--stripe-latency-ms", type=float, default=150.0)
+    parser.add_argument("--log-mode", choices=["async", "sync", "off"], default="async", help="backend LOG_MODE")
+    parser.add_argument("--output", help="write JSON results to this path")
+    parser.add_argument("--compare", help="baseline JSON results to compare against")
+    args = parser.parse_args()
+
+    server = load_app(args.mongo_url, args.db_name, args.llm_latency_ms, args.stripe_latency_ms, args.log_mode)
+    ids = seed_database(server, args.mongo_url, args.db_name, args.scale, args.seed)
+
+    results: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "scenarios": {},
+    }
+    with BackgroundServer(server.app, args.port):
+        base_url = f"http://127.0.0.1:{args.port}"
+        for name in args.scenarios:
+            results["scenarios"][name] = asyncio.run(
+                run_scenario(base_url, name, ids, args.concurrency, args.duration, args.seed)
+            )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+    if args.compare:
+        compare(results, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
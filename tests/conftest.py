@@ -0,0 +1,27 @@
+import pytest
+
+from tests.benchmark import load_app
+
+
+@pytest.fixture(scope="session")
+def server():
+    # Nothing here talks to MongoDB; the client connects lazily and never does
+    return load_app("mongodb://localhost:27017", "sierra_explore_test", 0, 0, "off")
+
+
+@pytest.fixture
+def clock(server, monkeypatch):
+    """Replaces time.monotonic with a clock the test moves by hand."""
+
+    class Clock:
+        now = 1000.0
+
+        def __call__(self):
+            return self.now
+
+        def advance(self, seconds: float):
+            self.now += seconds
+
+    fake = Clock()
+    monkeypatch.setattr(server.time, "monotonic", fake)
+    return fake
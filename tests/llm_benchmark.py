@@ -0,0 +1,180 @@
+"""Tail-latency benchmark for the LLM client against a fake provider.
+
+Every model is a FakeProvider with a log-normal latency around --median-ms, a --tail-rate
+share of requests that stall for --tail-ms more, and an --error-rate; scenarios degrade the
+primary model in different ways. Each scenario is replayed through a bare LlmChat call with
+no deadline (how trip plans used to be generated), through the client with hedging off, and
+through the client as configured, reporting latency percentiles, how requests were served
+and the extra provider calls hedging cost. Latencies are simulated at --time-scale of real
+time and reported unscaled. No mongod or API key is needed.
+
+    python -m tests.llm_benchmark
+    python -m tests.llm_benchmark --requests 5000 --concurrency 50 --tail-rate 0.1 --output llm.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from tests.benchmark import git_commit, load_app
+
+PRIMARY = "fake:primary"
+FALLBACK = "fake:fallback"
+STRATEGIES = ["direct", "deadline", "hedged"]
+
+
+@dataclass
+class FakeProvider:
+    median_ms: float
+    sigma: float
+    tail_rate: float
+    tail_ms: float
+    error_rate: float
+    error_ms: float = 200.0
+
+
+class FakeLlmChat:
+    providers: Dict[str, FakeProvider] = {}
+    scale = 0.01
+    rng = random.Random(0)
+    calls: Dict[str, int] = {}
+
+    def __init__(self, api_key: str, session_id: str, system_message: str):
+        self.model = None
+
+    def with_model(self, provider: str, model: str):
+        self.model = f"{provider}:{model}"
+        return self
+
+    async def send_message(self, message):
+        fake = self.providers[self.model]
+        self.calls[self.model] = self.calls.get(self.model, 0) + 1
+        if self.rng.random() < fake.error_rate:
+            await asyncio.sleep(fake.error_ms / 1000 * self.scale)
+            raise RuntimeError(f"{self.model} returned 503")
+        latency_ms = fake.median_ms * math.exp(self.rng.gauss(0, fake.sigma))
+        if self.rng.random() < fake.tail_rate:
+            latency_ms += fake.tail_ms
+        await asyncio.sleep(latency_ms / 1000 * self.scale)
+        return "Day 1: Freetown beaches. Day 2: Banana Islands. Day 3: Tokeh."
+
+
+def scenarios(args) -> Dict[str, Dict[str, FakeProvider]]:
+    healthy = FakeProvider(args.median_ms, args.sigma, args.tail_rate, args.tail_ms, args.error_rate)
+    fallback = FakeProvider(args.median_ms * 1.5, args.sigma, args.tail_rate, args.tail_ms, args.error_rate)
+    return {
+        "healthy": {PRIMARY: healthy, FALLBACK: fallback},
+        "slow_tail": {PRIMARY: FakeProvider(args.median_ms, args.sigma, 0.1, args.tail_ms * 2, args.error_rate), FALLBACK: fallback},
+        "brownout": {PRIMARY: FakeProvider(args.median_ms * 2, args.sigma, args.tail_rate, args.tail_ms, 0.3), FALLBACK: fallback},
+        "primary_down": {PRIMARY: FakeProvider(args.median_ms, args.sigma, 0.0, 0.0, 1.0), FALLBACK: fallback},
+        "all_down": {PRIMARY: FakeProvider(args.median_ms, args.sigma, 0.0, 0.0, 1.0), FALLBACK: FakeProvider(args.median_ms, args.sigma, 1.0, args.tail_ms * 10, 0.0)},
+    }
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 1)
+
+
+async def replay(server, strategy: str, args) -> Dict[str, Any]:
+    scale = args.time_scale
+    client = server.LlmClient(
+        [PRIMARY, FALLBACK],
+        attempt_timeout=server.LLM_ATTEMPT_TIMEOUT_SECONDS * scale,
+        hedge_requests=1 if strategy == "deadline" else server.LLM_HEDGE_REQUESTS,
+        hedge_min=server.LLM_HEDGE_MIN_SECONDS * scale,
+        hedge_default=server.LLM_HEDGE_DEFAULT_SECONDS * scale,
+        breaker_cooldown=server.LLM_BREAKER_COOLDOWN_SECONDS * scale,
+    )
+    served: Dict[str, int] = {}
+    latencies: List[float] = []
+    requests = iter(range(args.requests))
+    loop = asyncio.get_running_loop()
+
+    async def one():
+        start = loop.time()
+        if strategy == "direct":
+            chat = server.LlmChat(api_key="benchmark", session_id="direct", system_message="").with_model(*PRIMARY.split(":"))
+            try:
+                await chat.send_message(server.UserMessage(text="plan"))
+                outcome = PRIMARY
+            except Exception:
+                outcome = "error"
+        else:
+            try:
+                _, outcome = await client.complete("", "plan", server.LLM_DEADLINE_SECONDS * scale)
+            except server.LlmUnavailable:
+                outcome = "degraded"
+        latencies.append((loop.time() - start) / scale * 1000)
+        served[outcome] = served.get(outcome, 0) + 1
+
+    async def worker():
+        for _ in requests:
+            await one()
+
+    FakeLlmChat.calls = {}
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": percentile(ordered, 0.5),
+        "p95_ms": percentile(ordered, 0.95),
+        "p99_ms": percentile(ordered, 0.99),
+        "max_ms": round(ordered[-1], 1),
+        "served": served,
+        "provider_calls_per_request": round(sum(FakeLlmChat.calls.values()) / args.requests, 3),
+        "hedges": sum(counts["hedges"] for counts in client.counts.values()),
+        "breakers": {model: stats["state"] for model, stats in client.stats().items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--median-ms", type=float, default=4000)
+    parser.add_argument("--sigma", type=float, default=0.35, help="log-normal spread of provider latency")
+    parser.add_argument("--tail-rate", type=float, default=0.03, help="share of requests that stall")
+    parser.add_argument("--tail-ms", type=float, default=30000, help="added latency of a stalled request")
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--time-scale", type=float, default=0.01, help="simulated seconds per provider second")
+    parser.add_argument("--scenarios", nargs="+", default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this path")
+    args = parser.parse_args()
+
+    server = load_app("mongodb://localhost:27017", "sierra_explore_benchmark", 0, 0, "off")
+    server.LlmChat = FakeLlmChat
+    os.environ.setdefault("FAKE_API_KEY", "benchmark")
+    FakeLlmChat.scale = args.time_scale
+    results: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "scenarios": {},
+    }
+    for name, providers in scenarios(args).items():
+        if args.scenarios and name not in args.scenarios:
+            continue
+        FakeLlmChat.providers = providers
+        results["scenarios"][name] = {}
+        for strategy in STRATEGIES:
+            FakeLlmChat.rng = random.Random(args.seed)
+            stats = asyncio.run(replay(server, strategy, args))
+            results["scenarios"][name][strategy] = stats
+            print(
+                f"{name:>13} {strategy:>9}  p50 {stats['p50_ms']:>8.0f} ms  p95 {stats['p95_ms']:>8.0f} ms"
+                f"  p99 {stats['p99_ms']:>8.0f} ms  max {stats['max_ms']:>8.0f} ms"
+                f"  calls/req {stats['provider_calls_per_request']:.2f}  served {json.dumps(stats['served'])}"
+            )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
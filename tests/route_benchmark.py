@@ -0,0 +1,99 @@
+"""Benchmark for the trip route solver.
+
+Times the distance matrix, stop ordering and day planning on random points spread over
+Sierra Leone, both uncached and from the route cache, and reports how much road time
+the solved order saves over visiting the points as given. No mongod is needed.
+
+    python -m tests.route_benchmark
+    python -m tests.route_benchmark --points 10 100 1000 --repeat 5 --output routes.json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from tests.benchmark import git_commit, load_app
+
+# Rough bounding box of Sierra Leone
+LAT_RANGE = (6.9, 10.0)
+LNG_RANGE = (-13.3, -10.3)
+
+
+def random_points(rng: random.Random, count: int) -> tuple:
+    return tuple(
+        (f"point:{i}", f"Point {i}", rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE))
+        for i in range(count)
+    )
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def benchmark_points(server, rng: random.Random, count: int, days: int, repeat: int) -> Dict[str, Any]:
+    samples: Dict[str, List[float]] = {"matrix_ms": [], "order_ms": [], "solve_cold_ms": [], "solve_cached_ms": []}
+    saved = []
+    for _ in range(repeat):
+        points = random_points(rng, count)
+        coordinates = np.array([(lat, lng) for _, _, lat, lng in points])
+        samples["matrix_ms"].append(timed(lambda: server.road_estimate(server.haversine_matrix(coordinates))))
+        _, hours = server.road_estimate(server.haversine_matrix(coordinates))
+        samples["order_ms"].append(timed(server.order_stops, hours))
+
+        server.solve_route.cache_clear()
+        samples["solve_cold_ms"].append(timed(server.solve_route, points, days, False))
+        samples["solve_cached_ms"].append(timed(server.solve_route, points, days, False))
+
+        as_given = float(sum(hours[i, i + 1] for i in range(count - 1)))
+        solved = server.solve_route(points, days, False)["total_hours"]
+        saved.append(100 * (1 - solved / as_given) if as_given else 0.0)
+
+    result: Dict[str, Any] = {
+        name: {"median": round(statistics.median(values), 3), "max": round(max(values), 3)}
+        for name, values in samples.items()
+    }
+    result["solver"] = "exact" if count <= server.ROUTE_EXACT_MAX_STOPS else "nearest neighbour + 2-opt"
+    result["road_time_saved_pct"] = round(statistics.median(saved), 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--days", type=int, default=7, help="trip length handed to the day planner")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this path")
+    args = parser.parse_args()
+
+    server = load_app("mongodb://localhost:27017", "sierra_explore_benchmark", 0, 0, "off")
+    rng = random.Random(args.seed)
+    results: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "points": {},
+    }
+    for count in args.points:
+        results["points"][str(count)] = benchmark_points(server, rng, count, args.days, args.repeat)
+        stats = results["points"][str(count)]
+        print(
+            f"{count:>6} points  matrix {stats['matrix_ms']['median']:>9.3f} ms  order {stats['order_ms']['median']:>9.3f} ms"
+            f"  solve {stats['solve_cold_ms']['median']:>9.3f} ms  cached {stats['solve_cached_ms']['median']:>7.3f} ms"
+            f"  saved {stats['road_time_saved_pct']:>5.1f}%  ({stats['solver']})"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
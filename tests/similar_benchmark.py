@@ -0,0 +1,114 @@
+"""Benchmark for the similar-listings index.
+
+Builds the in-memory index over synthetic hotels from scripts/generate_data.py and
+reports build and precompute time, first (uncached) and repeat lookup latency, the cost of an
+incremental upsert and removal, and the index memory per 100k listings. No mongod is
+needed.
+
+    python -m tests.similar_benchmark
+    python -m tests.similar_benchmark --listings 10000 100000 --lookups 2000 --output similar.json
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from tests.benchmark import ROOT_DIR, git_commit, load_app
+
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+import generate_data  # noqa: E402
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "p50_us": round(ordered[len(ordered) // 2] * 1e6, 1),
+        "p99_us": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6, 1),
+    }
+
+
+def benchmark_listings(server, count: int, lookups: int, seed: int) -> Dict[str, Any]:
+    rng = generate_data.stream_rng(seed, "hotels")
+    documents = [document for document, _ in generate_data.generate_hotels(rng, count, datetime(2025, 6, 1))]
+
+    start = time.perf_counter()
+    index = server.SimilarityIndex("hotel", documents)
+    build_s = time.perf_counter() - start
+    # A second index precomputed up front, the way the server warms one after each build
+    warmed = server.SimilarityIndex("hotel", documents)
+    start = time.perf_counter()
+    warmed.precompute()
+    precompute_s = time.perf_counter() - start
+
+    picker = random.Random(seed)
+    sample = [document["id"] for document in picker.sample(documents, min(lookups, count))]
+    # First lookups score the listing against the whole type; repeats read the cached list
+    cold, warm = [], []
+    for listing_id in sample:
+        start = time.perf_counter()
+        index.similar(listing_id, 6)
+        cold.append(time.perf_counter() - start)
+    for listing_id in sample:
+        start = time.perf_counter()
+        index.similar(listing_id, 6)
+        warm.append(time.perf_counter() - start)
+
+    upserts, removals = [], []
+    for document in picker.sample(documents, min(200, count)):
+        changed = {**document, "price_per_night": document["price_per_night"] * picker.uniform(0.8, 1.2)}
+        start = time.perf_counter()
+        index.upsert(changed)
+        upserts.append(time.perf_counter() - start)
+    for document in picker.sample(documents, min(200, count)):
+        start = time.perf_counter()
+        index.remove(document["id"])
+        removals.append(time.perf_counter() - start)
+
+    stats = index.stats()
+    return {
+        "build_s": round(build_s, 3),
+        "precompute_s": round(precompute_s, 3),
+        "dimensions": stats["dimensions"],
+        "lookup_uncached": percentiles(cold),
+        "lookup_cached": percentiles(warm),
+        "upsert": percentiles(upserts),
+        "remove": percentiles(removals),
+        "memory_bytes": stats["memory_bytes"],
+        "memory_mb_per_100k": round(stats["memory_bytes_per_100k"] / 2 ** 20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this path")
+    args = parser.parse_args()
+
+    server = load_app("mongodb://localhost:27017", "sierra_explore_benchmark", 0, 0, "off")
+    results: Dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "listings": {},
+    }
+    for count in args.listings:
+        stats = benchmark_listings(server, count, args.lookups, args.seed)
+        results["listings"][str(count)] = stats
+        print(
+            f"{count:>8} listings  build {stats['build_s']:>7.3f} s  precompute {stats['precompute_s']:>7.3f} s"
+            f"  lookup p50 {stats['lookup_uncached']['p50_us']:>9.1f} us uncached / {stats['lookup_cached']['p50_us']:>6.1f} us cached"
+            f"  upsert p50 {stats['upsert']['p50_us']:>9.1f} us  {stats['memory_mb_per_100k']:>6.1f} MB per 100k"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+
+def booking(number: int, month: int):
+    return {
+        "id": f"booking-{number}",
+        "user_id": f"user-{number % 3}",
+        "service_type": "hotel",
+        "service_id": "hotel-1",
+        "booking_date": datetime(2024, month, 1 + number % 28),
+        "guests": 2,
+        "total_price": 120.0,
+        "status": "confirmed",
+    }
+
+
+def test_rewriting_a_batch_does_not_duplicate_archived_bookings(server, tmp_path):
+    batch = [booking(number, 1 + number % 2) for number in range(10)]
+    assert server.write_archive_parts(tmp_path, batch) > 0
+
+    # The same batch again, as after a crash before delete_many, plus one new booking
+    assert server.write_archive_parts(tmp_path, batch + [booking(10, 1)]) > 0
+    assert server.write_archive_parts(tmp_path, batch) == 0
+
+    summary = server.archive_summary(tmp_path)
+    assert summary["bookings"] == 11
+    assert summary["months"] == {"2024-01": 6, "2024-02": 5}
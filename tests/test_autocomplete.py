@@ -0,0 +1,41 @@
+import random
+
+from tests.autocomplete_benchmark import synthetic_listings, typed_queries
+
+
+def test_batched_load_matches_a_single_build(server):
+    listings = synthetic_listings(3000, 42)
+    whole = server.AutocompleteIndex.build(listings)
+    batched = server.AutocompleteIndex()
+    batched.bulk = True
+    for start in range(0, len(listings), 400):
+        batched.extend(listings[start:start + 400])
+    batched.finish_bulk()
+
+    assert batched.stats() == whole.stats()
+    for query in typed_queries(random.Random(7), listings, 200):
+        assert batched.suggest(query, server.AUTOCOMPLETE_LIMIT) == whole.suggest(query, server.AUTOCOMPLETE_LIMIT)
+
+
+def test_prefix_typo_and_accent_find_the_same_listing(server):
+    index = server.AutocompleteIndex.build([
+        ("hotel", {"id": "h1", "name": "Tokeh Beach Resort", "location": {"city": "Tokeh", "district": "Western Area Rural"}}, 0.0),
+    ])
+    for typed in ["tok", "Tókeh be", "tokeh bech"]:
+        assert "Tokeh Beach Resort" in [suggestion["label"] for suggestion in index.suggest(typed, 5)]
+
+
+def test_refreshed_trending_reorders_listings(server):
+    index = server.AutocompleteIndex.build([
+        ("hotel", {"id": "h1", "name": "Bintumani Hotel", "reviews_count": 40}, 0.0),
+        ("hotel", {"id": "h2", "name": "Bintumani Suites", "reviews_count": 10}, 0.0),
+    ])
+    assert [suggestion["id"] for suggestion in index.suggest("bintu", 2)] == ["h1", "h2"]
+
+    assert index.refresh_trending({"listing:hotel:h2": 20.0}) == 1
+    assert [suggestion["id"] for suggestion in index.suggest("bintu", 2)] == ["h2", "h1"]
+
+    # A score that decays away drops the listing back to its review weight
+    assert index.refresh_trending({}) == 1
+    assert [suggestion["id"] for suggestion in index.suggest("bintu", 2)] == ["h1", "h2"]
+    assert index.refresh_trending({}) == 0
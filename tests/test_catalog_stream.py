@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+
+def change(token: str, operation: str = "update"):
+    return {
+        "_id": {"_data": token},
+        "ns": {"db": "sierra_explore_test", "coll": "hotels"},
+        "operationType": operation,
+        "documentKey": {"_id": token},
+        "fullDocument": {"id": token, "name": f"Hotel {token}", "location": {"district": "Western Area"}},
+    }
+
+
+class FakeStream:
+    """Plays a fixed oplog: the shared stream sees `live`, a resumed cursor sees `history`."""
+
+    def __init__(self, changes):
+        self.changes = list(changes)
+        self.alive = True
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(0)
+        if not self.changes:
+            # The shared stream stays open until it is cancelled
+            await asyncio.Event().wait()
+        return self.changes.pop(0)
+
+    async def try_next(self):
+        await asyncio.sleep(0)
+        return self.changes.pop(0) if self.changes else None
+
+
+class FakeDatabase:
+    def __init__(self, history, live):
+        self.history, self.live = history, live
+        self.resumed = []
+
+    def watch(self, pipeline, full_document=None, resume_after=None, max_await_time_ms=None):
+        stream = FakeStream(self.history if resume_after else self.live)
+        if resume_after:
+            self.resumed.append(stream)
+        return stream
+
+
+@pytest.fixture
+def broadcaster(server, monkeypatch):
+    fresh = server.CatalogChangeBroadcaster()
+    monkeypatch.setattr(server, "catalog_broadcaster", fresh)
+    return fresh
+
+
+async def collect(events, count):
+    seen = []
+    async for event in events:
+        if event is not None:
+            seen.append(event["token"])
+        if len(seen) == count:
+            break
+    await events.aclose()
+    return seen
+
+
+def test_resumed_stream_hands_over_to_the_shared_stream(server, broadcaster, monkeypatch):
+    database = FakeDatabase(history=[change("t2"), change("t3"), change("t4"), change("t5")], live=[change("t4"), change("t5")])
+    monkeypatch.setattr(server, "db", database)
+
+    seen = asyncio.run(collect(server.resumed_change_events("t1"), 4))
+
+    assert seen == ["t2", "t3", "t4", "t5"]
+    resumed, = database.resumed
+    # The dedicated cursor was closed at the handoff event, before t5 was read from it
+    assert resumed.closed and resumed.changes == [change("t5")]
+    assert not broadcaster.subscribers
+
+
+def test_resumed_stream_keeps_its_cursor_when_the_shared_stream_ends(server, broadcaster, monkeypatch):
+    async def failed():
+        broadcaster._publish(None)
+
+    monkeypatch.setattr(broadcaster, "_run", failed)
+    monkeypatch.setattr(server, "db", FakeDatabase(history=[change("t2"), change("t3"), change("t4")], live=[]))
+
+    assert asyncio.run(collect(server.resumed_change_events("t1"), 3)) == ["t2", "t3", "t4"]
+    assert not broadcaster.subscribers
+
+
+def test_shared_subscribers_are_told_when_the_stream_stops(server, broadcaster, monkeypatch):
+    async def scenario():
+        subscriber = broadcaster.subscribe()
+        await asyncio.sleep(0.01)
+        broadcaster.task.cancel()
+        return await asyncio.wait_for(subscriber.get(), timeout=1)
+
+    monkeypatch.setattr(server, "db", FakeDatabase(history=[], live=[]))
+    assert asyncio.run(scenario()) is None
+
+
+def test_pipeline_skips_events_without_a_document_key(server):
+    operations = server.CHANGE_STREAM_PIPELINE[0]["$match"]["operationType"]["$in"]
+    assert set(operations) == {"insert", "update", "replace", "delete"}
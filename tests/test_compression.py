@@ -0,0 +1,47 @@
+import pytest
+from starlette.responses import JSONResponse, Response
+from starlette.testclient import TestClient
+
+LARGE = {"hotels": [{"name": "Tokeh Beach Resort", "city": "Tokeh"}] * 100}
+
+
+@pytest.fixture
+def client(server):
+    return lambda response: TestClient(server.CompressionMiddleware(response))
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "identity", ""])
+def test_negotiated_responses_vary_on_accept_encoding(client, accept_encoding):
+    response = client(JSONResponse(LARGE)).get("/", headers={"Accept-Encoding": accept_encoding})
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers.get("Content-Encoding") == ("gzip" if accept_encoding == "gzip" else None)
+
+
+def test_small_responses_are_sent_unchanged_but_still_vary(client):
+    response = client(JSONResponse({"ok": True})).get("/", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+
+def test_gzip_body_round_trips(client):
+    response = client(JSONResponse(LARGE)).get("/", headers={"Accept-Encoding": "gzip"})
+    assert int(response.headers["Content-Length"]) < len(JSONResponse(LARGE).body)
+    assert response.json() == LARGE
+
+
+def test_existing_vary_is_kept(client):
+    response = client(JSONResponse(LARGE, headers={"Vary": "Authorization"})).get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Vary"] == "Authorization, Accept-Encoding"
+
+
+def test_uncompressible_types_are_left_alone(client):
+    response = client(Response(b"\x89PNG" * 1000, media_type="image/png")).get("/", headers={"Accept-Encoding": "gzip"})
+    assert "Vary" not in response.headers
+    assert "Content-Encoding" not in response.headers
+
+
+def test_negotiation_prefers_brotli_and_honours_q_zero(server):
+    assert server.negotiate_encoding("gzip;q=0, identity") is None
+    assert server.negotiate_encoding("deflate, gzip;q=0.5") == "gzip"
+    if server.brotli is not None:
+        assert server.negotiate_encoding("gzip, br") == "br"
@@ -0,0 +1,27 @@
+def test_facet_cache_evicts_the_least_recently_used(server, clock):
+    cache = server.FacetCache(ttl=60.0, size=3)
+    for name in "abc":
+        cache.set(("hotel", name), {"name": name})
+    assert cache.get(("hotel", "a")) == {"name": "a"}
+    cache.set(("hotel", "d"), {"name": "d"})
+    assert cache.get(("hotel", "b")) is None
+    assert [key[1] for key in cache.entries] == ["c", "a", "d"]
+
+
+def test_facet_cache_drops_expired_entries_on_set(server, clock):
+    cache = server.FacetCache(ttl=60.0, size=100)
+    for name in range(50):
+        cache.set(("hotel", name), {})
+    assert cache.get(("hotel", 0)) == {}
+    clock.advance(61.0)
+    assert cache.get(("hotel", 0)) is None
+    cache.set(("car", "fresh"), {})
+    assert list(cache.entries) == [("car", "fresh")]
+
+
+def test_facet_cache_invalidates_one_type(server, clock):
+    cache = server.FacetCache(ttl=60.0)
+    cache.set(("hotel", "a"), {})
+    cache.set(("car", "a"), {})
+    cache.invalidate("hotel")
+    assert list(cache.entries) == [("car", "a")]
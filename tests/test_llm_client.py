@@ -0,0 +1,219 @@
+import asyncio
+import random
+import time
+import types
+
+import pytest
+
+from tests.llm_benchmark import FALLBACK, PRIMARY, FakeLlmChat, FakeProvider
+
+
+def steady(ms: float, error_rate: float = 0.0) -> FakeProvider:
+    return FakeProvider(ms, 0.0, 0.0, 0.0, error_rate, error_ms=1.0)
+
+
+STALLED = FakeProvider(10.0, 0.0, 1.0, 60000.0, 0.0)
+DOWN = steady(10.0, error_rate=1.0)
+
+
+@pytest.fixture
+def providers(server, monkeypatch):
+    monkeypatch.setenv("FAKE_API_KEY", "test")
+    monkeypatch.setattr(server, "LlmChat", FakeLlmChat)
+    monkeypatch.setattr(FakeLlmChat, "scale", 1.0)
+    monkeypatch.setattr(FakeLlmChat, "rng", random.Random(1))
+    monkeypatch.setattr(FakeLlmChat, "calls", {})
+    monkeypatch.setattr(FakeLlmChat, "providers", {})
+    return FakeLlmChat.providers
+
+
+def make_client(server, **options):
+    settings = {"attempt_timeout": 1.0, "hedge_min": 0.001, "hedge_default": 0.1, "breaker_failures": 3, "breaker_cooldown": 0.2}
+    return server.LlmClient([PRIMARY, FALLBACK], **{**settings, **options})
+
+
+def complete(client, deadline: float = 2.0):
+    return asyncio.run(client.complete("system", "plan", deadline))
+
+
+def test_deadline_is_respected_when_every_model_stalls(server, providers):
+    providers.update({PRIMARY: STALLED, FALLBACK: STALLED})
+    client = make_client(server, hedge_default=0.05)
+    start = time.perf_counter()
+    with pytest.raises(server.LlmUnavailable):
+        complete(client, deadline=0.3)
+    assert 0.3 <= time.perf_counter() - start < 0.45
+    assert client.counts[PRIMARY]["timeout"] == 1
+
+
+def test_stalled_primary_is_hedged(server, providers):
+    providers.update({PRIMARY: STALLED, FALLBACK: steady(10)})
+    client = make_client(server, hedge_default=0.05)
+
+    async def scenario():
+        call = asyncio.create_task(client.complete("system", "plan", 2.0))
+        # The first request is in flight and stalled; the duplicate finds the model healthy
+        await asyncio.sleep(0.02)
+        providers[PRIMARY] = steady(10)
+        return await call
+
+    start = time.perf_counter()
+    _, model = asyncio.run(scenario())
+    assert model == PRIMARY
+    assert time.perf_counter() - start < 0.2
+    assert client.counts[PRIMARY]["hedges"] == 1
+    assert FakeLlmChat.calls == {PRIMARY: 2}
+
+
+def test_hedges_are_spaced_by_the_hedge_delay(server, providers):
+    providers.update({PRIMARY: STALLED, FALLBACK: STALLED})
+    # A second hedge would be due at 0.1 s, after the attempt has already timed out
+    client = make_client(server, hedge_default=0.05, hedge_requests=3, attempt_timeout=0.08)
+    with pytest.raises(server.LlmUnavailable):
+        complete(client, deadline=0.08)
+    assert client.counts[PRIMARY]["hedges"] == 1
+    assert FakeLlmChat.calls == {PRIMARY: 2}
+
+
+def test_hedging_off_sends_one_request(server, providers):
+    providers.update({PRIMARY: STALLED, FALLBACK: steady(10)})
+    client = make_client(server, hedge_default=0.01, hedge_requests=1, attempt_timeout=0.1)
+    assert complete(client)[1] == FALLBACK
+    assert FakeLlmChat.calls == {PRIMARY: 1, FALLBACK: 1}
+
+
+@pytest.mark.parametrize("primary", [DOWN, STALLED], ids=["errors", "times_out"])
+def test_fails_over_to_the_fallback_model(server, providers, primary):
+    providers.update({PRIMARY: primary, FALLBACK: steady(10)})
+    client = make_client(server, attempt_timeout=0.1, hedge_default=0.05)
+    response, model = complete(client)
+    assert model == FALLBACK and response.startswith("Day 1")
+
+
+def test_breaker_opens_and_recovers_after_the_cooldown(server, providers):
+    providers.update({PRIMARY: DOWN, FALLBACK: steady(5)})
+    client = make_client(server)
+    for _ in range(3):
+        assert complete(client)[1] == FALLBACK
+    assert client.breakers[PRIMARY].state == "open"
+
+    # Open: the primary is not called at all, even once it has recovered
+    providers[PRIMARY] = steady(5)
+    assert complete(client)[1] == FALLBACK
+    assert FakeLlmChat.calls[PRIMARY] == 3
+    assert client.counts[PRIMARY]["rejected"] == 1
+
+    time.sleep(0.25)
+    assert client.breakers[PRIMARY].state == "half_open"
+    assert complete(client)[1] == PRIMARY
+    assert client.breakers[PRIMARY].state == "closed"
+
+
+def test_failed_probe_reopens_the_breaker(server, clock):
+    breaker = server.CircuitBreaker(threshold=2, cooldown=10.0)
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(False)
+    assert not breaker.allow()
+    clock.advance(10.0)
+    assert breaker.allow()  # the probe
+    assert not breaker.allow()  # only one per cooldown
+    breaker.record(False)
+    assert breaker.state == "open"
+    clock.advance(10.0)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_hedge_delay_tracks_the_slow_requests(server, providers):
+    # 10% of requests take 40 ms, the rest 4 ms: the p95 is a slow request. Hedged attempts
+    # are timed from their first request, so the delay climbs to it instead of staying at
+    # the fast mode and hedging a large share of requests
+    providers.update({PRIMARY: FakeProvider(4.0, 0.0, 0.1, 36.0, 0.0), FALLBACK: steady(4)})
+    client = make_client(server, hedge_default=0.005)
+
+    async def replay(count: int):
+        for _ in range(count):
+            await client.complete("system", "plan", 2.0)
+
+    asyncio.run(replay(300))
+    assert client.hedge_delay(PRIMARY) > 0.03
+    hedges = client.counts[PRIMARY]["hedges"]
+    asyncio.run(replay(200))
+    assert client.counts[PRIMARY]["hedges"] - hedges <= 0.08 * 200
+
+
+def test_api_key_is_looked_up_per_provider(server, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "anthropic-key")
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    monkeypatch.delenv("EMERGENT_LLM_KEY", raising=False)
+    assert server.llm_api_key("anthropic") == "anthropic-key"
+    with pytest.raises(RuntimeError):
+        server.llm_api_key("gemini")
+    monkeypatch.setenv("EMERGENT_LLM_KEY", "universal")
+    assert server.llm_api_key("gemini") == "universal"
+
+
+class Cursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, *args):
+        return self
+
+    async def to_list(self, length):
+        return self.documents
+
+
+@pytest.fixture
+def planner(server, providers, monkeypatch):
+    route = server.RoutePlan(
+        stops=["Freetown", "Tokeh"],
+        total_km=35.0,
+        total_hours=1.0,
+        days=[
+            server.RouteDay(day=1, stops=["Freetown"], legs=[], travel_km=0.0, travel_hours=0.0),
+            server.RouteDay(day=2, stops=["Freetown", "Tokeh"], legs=[], travel_km=35.0, travel_hours=1.0),
+        ],
+    )
+    cards = [
+        {"service_type": "hotel", "id": "h1", "name": "Tokeh Beach Resort", "price": 120.0, "price_unit": "night", "rating": 4.6, "city": "Tokeh"},
+        {"service_type": "tour", "id": "t1", "name": "Banana Islands Day Trip", "price": 45.0, "price_unit": "person", "rating": 4.8, "city": "Freetown"},
+    ]
+
+    async def plan_route(destinations, duration_days, keep_order=False):
+        return route
+
+    monkeypatch.setattr(server, "plan_route", plan_route)
+    monkeypatch.setattr(server, "catalog_db", types.SimpleNamespace(listing_cards=types.SimpleNamespace(find=lambda *args: Cursor(cards))))
+    monkeypatch.setattr(server, "llm_client", make_client(server, attempt_timeout=0.1, hedge_default=0.05))
+    monkeypatch.setattr(server, "LLM_DEADLINE_SECONDS", 0.3)
+    monkeypatch.setattr(server, "trip_plan_cache", {})
+    monkeypatch.setattr(server, "trip_plan_stats", {"llm": 0, "cache": 0, "catalog": 0})
+
+    def generate():
+        return asyncio.run(server.generate_trip_plan("beaches", ["Freetown", "Tokeh"], 2))
+
+    return generate
+
+
+def test_outage_without_a_cached_plan_serves_a_catalog_plan(planner, providers):
+    providers.update({PRIMARY: DOWN, FALLBACK: STALLED})
+    start = time.perf_counter()
+    plan = planner()
+    assert time.perf_counter() - start < 0.5
+    assert plan.itinerary["source"] == "catalog"
+    assert "Tokeh Beach Resort" in plan.itinerary["ai_generated_plan"]
+    assert plan.suggested_hotels == ["h1"] and plan.suggested_tours == ["t1"]
+
+
+def test_outage_serves_the_last_plan_for_the_same_trip(planner, providers):
+    providers.update({PRIMARY: steady(5), FALLBACK: steady(5)})
+    fresh = planner()
+    assert fresh.itinerary["source"] == "llm" and fresh.itinerary["model"] == PRIMARY
+
+    providers.update({PRIMARY: DOWN, FALLBACK: DOWN})
+    degraded = planner()
+    assert degraded.itinerary["source"] == "cache"
+    assert degraded.itinerary["ai_generated_plan"] == fresh.itinerary["ai_generated_plan"]
@@ -0,0 +1,23 @@
+import pytest
+from fastapi import HTTPException
+
+
+def test_stay_may_last_up_to_the_limit(server):
+    start, end = server.parse_stay("2025-01-01", "2025-12-31")
+    assert (end - start).days == 364
+
+
+def test_stays_beyond_the_limit_are_rejected(server):
+    with pytest.raises(HTTPException) as error:
+        server.parse_stay("0001-01-01", "9999-12-31")
+    assert error.value.status_code == 400
+
+
+def test_end_before_start_is_rejected(server):
+    with pytest.raises(HTTPException):
+        server.parse_stay("2025-02-01", "2025-01-01")
+
+
+def test_quotes_need_a_guest(server):
+    with pytest.raises(ValueError):
+        server.QuoteRequest(items=[], start_date="2025-01-01", guests=0)
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+from starlette.responses import PlainTextResponse
+from starlette.testclient import TestClient
+
+
+def consume(backend, key, rule):
+    return asyncio.run(backend.consume(key, rule))
+
+
+def test_bucket_allows_a_burst_then_refills(server, clock):
+    backend = server.InMemoryRateLimitBackend()
+    rule = server.RateLimitRule(capacity=3, refill_per_second=0.5)
+
+    results = [consume(backend, "ip:a", rule) for _ in range(4)]
+    assert [result.allowed for result in results] == [True, True, True, False]
+    assert [result.remaining for result in results] == [2, 1, 0, 0]
+    assert results[2].reset_after == pytest.approx(6.0)
+    assert results[3].retry_after == pytest.approx(2.0)
+
+    clock.advance(2.0)
+    result = consume(backend, "ip:a", rule)
+    assert result.allowed and result.remaining == 0
+    # Other keys have buckets of their own
+    assert consume(backend, "ip:b", rule).remaining == 2
+
+
+def test_bucket_never_holds_more_than_its_capacity(server, clock):
+    backend = server.InMemoryRateLimitBackend()
+    rule = server.RateLimitRule(capacity=2, refill_per_second=1.0)
+    consume(backend, "ip:a", rule)
+    clock.advance(3600)
+    assert consume(backend, "ip:a", rule).remaining == 1
+
+
+def test_full_buckets_are_swept(server, clock):
+    backend = server.InMemoryRateLimitBackend(sweep_interval=10.0)
+    rule = server.RateLimitRule(capacity=2, refill_per_second=1.0)
+    for address in range(100):
+        consume(backend, f"ip:{address}", rule)
+    assert len(backend.buckets) == 100
+
+    # Every bucket is full again after 1 s; the sweep runs on the first request after 10 s
+    clock.advance(10.0)
+    consume(backend, "ip:new", rule)
+    assert list(backend.buckets) == ["ip:new"]
+
+
+def test_swept_bucket_is_not_reset_early(server, clock):
+    backend = server.InMemoryRateLimitBackend(sweep_interval=1.0)
+    rule = server.RateLimitRule(capacity=2, refill_per_second=0.01)
+    consume(backend, "ip:a", rule)
+    consume(backend, "ip:a", rule)
+    clock.advance(5.0)
+    consume(backend, "ip:b", rule)
+    assert not consume(backend, "ip:a", rule).allowed
+
+
+@pytest.fixture
+def limited_client(server, monkeypatch):
+    monkeypatch.setattr(server, "rate_limit_backend", server.InMemoryRateLimitBackend())
+    monkeypatch.setattr(server, "RATE_LIMIT_RULES", {
+        "POST /api/auth/login": [server.RateLimitRule(capacity=2, refill_per_second=0.1)],
+    })
+    return TestClient(server.RateLimitMiddleware(PlainTextResponse("ok")))
+
+
+def test_headers_count_down_then_reject(limited_client, clock):
+    first = limited_client.post("/api/auth/login")
+    assert first.status_code == 200
+    assert first.headers["RateLimit-Limit"] == "2"
+    assert first.headers["RateLimit-Remaining"] == "1"
+    assert first.headers["RateLimit-Reset"] == "10"
+    assert "Retry-After" not in first.headers
+
+    assert limited_client.post("/api/auth/login").headers["RateLimit-Remaining"] == "0"
+
+    rejected = limited_client.post("/api/auth/login")
+    assert rejected.status_code == 429
+    assert rejected.json() == {"detail": "Rate limit exceeded"}
+    assert rejected.headers["Retry-After"] == "10"
+
+    clock.advance(10.0)
+    assert limited_client.post("/api/auth/login").status_code == 200
+
+
+def test_routes_without_rules_are_not_limited(limited_client):
+    response = limited_client.get("/api/hotels")
+    assert response.status_code == 200
+    assert "RateLimit-Limit" not in response.headers
+
+
+@pytest.mark.parametrize("rule", [{"capacity": 0, "refill_per_second": 1.0}, {"capacity": 5, "refill_per_second": 0.0}])
+def test_rules_that_could_never_refill_are_rejected(server, rule):
+    with pytest.raises(ValueError):
+        server.RateLimitRule(**rule)
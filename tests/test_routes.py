@@ -0,0 +1,56 @@
+import asyncio
+import itertools
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+
+def random_hours(seed: int, count: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, 10, size=(count, 2))
+    return np.linalg.norm(points[:, None] - points[None, :], axis=-1)
+
+
+def route_hours(hours: np.ndarray, order) -> float:
+    return float(sum(hours[a, b] for a, b in zip(order, order[1:])))
+
+
+@pytest.mark.parametrize("count", [3, 5, 7])
+def test_exact_order_matches_brute_force(server, count):
+    hours = random_hours(count, count)
+    best = min(route_hours(hours, (0,) + rest) for rest in itertools.permutations(range(1, count)))
+    order = server._exact_order(hours)
+    assert order[0] == 0 and sorted(order) == list(range(count))
+    assert route_hours(hours, order) == pytest.approx(best)
+
+
+def test_two_opt_untangles_a_crossed_route(server):
+    hours = random_hours(7, 40)
+    start = list(range(40))
+    order = server._two_opt(hours, start)
+    assert order[0] == 0 and sorted(order) == start
+    assert route_hours(hours, order) < route_hours(hours, start)
+    # A route 2-opt has already settled is left as it is
+    assert server._two_opt(hours, order) == order
+
+
+def test_plan_days_gives_spare_days_to_the_longest_drives(server):
+    days = server.plan_days(["Freetown", "Tokeh", "Bo"], [0.0, 40.0, 250.0], [0.0, 1.0, 5.0], 5)
+    assert [day["stops"] for day in days] == [["Freetown"], ["Tokeh"], ["Tokeh"], ["Bo"], ["Bo"]]
+    assert days[2]["legs"] == [] and days[3]["legs"] == [{"origin": "Tokeh", "destination": "Bo", "km": 250.0, "hours": 5.0}]
+    assert [day["day"] for day in days] == [1, 2, 3, 4, 5]
+
+
+def test_plan_days_packs_stops_into_fewer_days(server):
+    labels = ["A", "B", "C", "D"]
+    days = server.plan_days(labels, [0.0, 10.0, 10.0, 10.0], [0.0, 1.0, 1.0, 4.0], 2)
+    assert [day["stops"] for day in days] == [["A", "B", "C"], ["D"]]
+    assert [day["travel_hours"] for day in days] == [2.0, 4.0]
+
+
+@pytest.mark.parametrize("destinations, duration_days", [([], 3), (["Freetown"], 0), (["Freetown"], 91), (["Bo"] * 201, 3)])
+def test_plan_route_rejects_out_of_range_requests(server, destinations, duration_days):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.plan_route(destinations, duration_days))
+    assert error.value.status_code == 400
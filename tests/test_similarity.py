@@ -0,0 +1,56 @@
+import sys
+import threading
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from tests.benchmark import ROOT_DIR
+
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+import generate_data  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def hotels():
+    rng = generate_data.stream_rng(42, "hotels")
+    return [document for document, _ in generate_data.generate_hotels(rng, 2000, datetime(2025, 6, 1))]
+
+
+def test_streamed_build_matches_a_single_pass(server, hotels):
+    whole = server.SimilarityIndex("hotel", hotels)
+    scale = server.SimilarityScale("hotel")
+    for start in range(0, len(hotels), 300):
+        scale.update(hotels[start:start + 300])
+    streamed = server.SimilarityIndex("hotel", scale=scale)
+    for start in range(0, len(hotels), 300):
+        streamed.extend(hotels[start:start + 300])
+
+    assert streamed.tags == whole.tags and streamed.categories == whole.categories
+    prices = np.log1p([max(float(hotel.get("price_per_night") or 0.0), 0.0) for hotel in hotels])
+    assert streamed.price_mean == pytest.approx(prices.mean())
+    assert streamed.price_std == pytest.approx(prices.std())
+    for hotel in hotels[:50]:
+        assert streamed.similar(hotel["id"], 6) == whole.similar(hotel["id"], 6)
+
+
+def test_lookups_never_see_a_torn_index(server, hotels):
+    index = server.SimilarityIndex("hotel", hotels[:1000])
+    precompute = threading.Thread(target=index.precompute)
+    precompute.start()
+
+    def churn():
+        for hotel in hotels[1000:]:
+            index.upsert(hotel)
+            index.remove(hotel["id"])
+
+    writer = threading.Thread(target=churn)
+    writer.start()
+    while writer.is_alive():
+        for hotel in hotels[:1000:50]:
+            neighbours = index.similar(hotel["id"], 12)
+            assert neighbours and all(listing_id is not None for listing_id, _ in neighbours)
+            scores = [score for _, score in neighbours]
+            assert scores == sorted(scores, reverse=True)
+    writer.join()
+    precompute.join()
@@ -0,0 +1,13 @@
+import gzip
+
+
+def test_write_snapshots_publishes_plain_and_gzipped_copies(server, tmp_path):
+    snapshots = [(tmp_path / "hotels" / f"{number}.json", f'{{"id": {number}}}'.encode()) for number in range(3)]
+    server.write_snapshots(snapshots)
+    for path, body in snapshots:
+        assert path.read_bytes() == body
+        assert gzip.decompress(path.with_name(path.name + ".gz").read_bytes()) == body
+    # Temporary files are all renamed into place
+    assert sorted(path.name for path in (tmp_path / "hotels").iterdir()) == [
+        "0.json", "0.json.gz", "1.json", "1.json.gz", "2.json", "2.json.gz",
+    ]